@@ -0,0 +1 @@
+"""MKV to MP4 conversion engine, shared by the Tkinter GUI and the headless command line."""
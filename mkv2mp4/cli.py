@@ -0,0 +1,344 @@
+"""Headless command line: python -m mkv2mp4 run|scan|watch.
+
+Uses the same queue, retry levels, probe cache and state file as the GUI but never
+imports Tk, so it starts quickly and can run as a systemd service or cron job.
+Logs go to stdout and, with --log-file, to a file.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import sys
+import threading
+
+from .engine import STATE_FILE, ConversionEngine, ConversionEngineListener
+from .logs import (
+    LOG_DATE_FORMAT,
+    LOG_FORMAT,
+    LOG_LEVELS,
+    CompressingRotatingFileHandler,
+    level_number,
+)
+from .scheduler import SCHEDULING_POLICIES
+
+logger = logging.getLogger("mkv2mp4")
+
+
+class LoggingListener(ConversionEngineListener):
+    """Reports engine events through the logging module."""
+
+    def __init__(self):
+        self.logged_progress_steps = {}  # job_id -> last logged 10% step
+
+    def log(self, message, level):
+        logger.log(level_number(level), message)
+
+    def job_started(self, job):
+        logger.info("Converting %s", job.display_name)
+
+    def job_progress(self, job, value, text=None):
+        # Only every 10% so log files stay readable
+        progress_step = int(value // 10)
+        if text and progress_step > self.logged_progress_steps.get(job.job_id, -1):
+            self.logged_progress_steps[job.job_id] = progress_step
+            logger.info(text)
+
+    def job_finished(self, job):
+        self.logged_progress_steps.pop(job.job_id, None)
+
+    def batch_progress(self, processed_files, total_files):
+        logger.info("Batch progress: %d/%d file(s) processed.", processed_files, total_files)
+
+    def failed_item_added(self, record):
+        logger.warning("Failed: %s", record.path)
+
+    def error(self, title, message):
+        logger.error("%s: %s", title, message.replace("\n", " "))
+
+
+def configure_logging(level_name, log_file=None):
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(CompressingRotatingFileHandler(log_file))
+    logging.basicConfig(
+        level=LOG_LEVELS[level_name],
+        format=LOG_FORMAT,
+        datefmt=LOG_DATE_FORMAT,
+        handlers=handlers,
+    )
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--state-file",
+        default=STATE_FILE,
+        help=f"queue/settings file shared with the GUI (default: {STATE_FILE})",
+    )
+    common.add_argument(
+        "--log-file",
+        help="also append log messages to this file; it is rotated at 5 MB and old segments are gzipped",
+    )
+    common.add_argument(
+        "--log-level",
+        choices=list(LOG_LEVELS),
+        help="default: the level saved in the state file, INFO if none",
+    )
+    common.add_argument(
+        "--save-settings",
+        action="store_true",
+        help="save the settings given on the command line to the state file (by default they apply to this run only)",
+    )
+    common.add_argument(
+        "--jobs", type=int, metavar="N", help="number of files converted in parallel"
+    )
+    common.add_argument(
+        "--adaptive",
+        dest="use_adaptive_concurrency",
+        action="store_true",
+        default=None,
+        help="vary the files converted at once between 1 and --jobs with CPU, memory and disk load",
+    )
+    common.add_argument(
+        "--order",
+        dest="scheduling_policy",
+        choices=list(SCHEDULING_POLICIES),
+        help="order in which queued files are converted (default: the saved setting, fifo)",
+    )
+    common.add_argument(
+        "--profile",
+        dest="encoding_profile",
+        metavar="NAME",
+        help="encoding profile of first conversions (default: the saved setting, else per library and retry level)",
+    )
+    common.add_argument(
+        "--profiles",
+        dest="profiles_file",
+        metavar="FILE",
+        help="load encoding profiles from this .json or .toml file instead of mkv_converter_profiles.json",
+    )
+    common.add_argument(
+        "--segment-jobs",
+        type=int,
+        metavar="N",
+        help="ffmpeg processes per re-encoded file; above 1, long files are split into segments encoded concurrently",
+    )
+    common.add_argument(
+        "--gpu",
+        action="store_true",
+        default=None,
+        help="encode with NVIDIA NVENC instead of libx264",
+    )
+    common.add_argument(
+        "--no-remux",
+        dest="use_fast_remux",
+        action="store_false",
+        default=None,
+        help="always re-encode, even when the streams could be copied",
+    )
+    common.add_argument(
+        "--resumable",
+        dest="use_resumable_encoding",
+        action="store_true",
+        default=None,
+        help="re-encode long files in 5-minute segments, so an interrupted conversion resumes where it stopped",
+    )
+    common.add_argument(
+        "--preflight",
+        dest="use_preflight_check",
+        action="store_true",
+        default=None,
+        help="decode sampled windows of each file first and convert damaged files with the Level 1 profile",
+    )
+    common.add_argument(
+        "--error-limit",
+        type=float,
+        metavar="N",
+        help="stop an encode after more than N decoding errors per minute of media, 0 never (default: the saved setting, 100)",
+    )
+    common.add_argument(
+        "--scratch",
+        metavar="DIR",
+        help="copy each source to this local folder (SSD or tmpfs) and encode there, for libraries on network shares",
+    )
+    common.add_argument(
+        "--scratch-limit",
+        type=float,
+        metavar="GB",
+        help="scratch space used at most by staged sources and their outputs (default: the saved setting, 50)",
+    )
+    common.add_argument(
+        "--no-cache-hints",
+        dest="use_cache_hints",
+        action="store_false",
+        default=None,
+        help="don't read the next file ahead or drop finished files from the page cache (Linux)",
+    )
+    common.add_argument(
+        "--auto-delete",
+        action="store_true",
+        default=None,
+        help="delete originals after their MP4 has been verified",
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="python -m mkv2mp4",
+        description="Convert videos to MP4 without the GUI.",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser(
+        "run",
+        parents=[common],
+        help="add files to the queue and convert the whole queue",
+    )
+    run_parser.add_argument("files", nargs="*", help="files to add before converting")
+
+    scan_parser = subparsers.add_parser(
+        "scan",
+        parents=[common],
+        help="queue the unconverted videos below a folder",
+    )
+    scan_parser.add_argument("directory")
+    scan_parser.add_argument(
+        "--convert", action="store_true", help="convert the queue after scanning"
+    )
+
+    watch_parser = subparsers.add_parser(
+        "watch",
+        parents=[common],
+        help="rescan a folder periodically and convert new files until stopped",
+    )
+    watch_parser.add_argument("directory")
+    watch_parser.add_argument(
+        "--interval",
+        type=int,
+        metavar="MINUTES",
+        help="minutes between scans (default: the saved setting, 10)",
+    )
+    watch_parser.add_argument(
+        "--no-folder-watch",
+        dest="use_folder_watch",
+        action="store_false",
+        default=None,
+        help="only use the periodic scan, not Linux inotify",
+    )
+    return parser
+
+
+def apply_settings(engine, args):
+    """Command line options override the settings loaded from the state file, for
+    this run only unless --save-settings is given."""
+    if args.jobs is not None:
+        engine.max_parallel_jobs = max(1, args.jobs)
+    if args.use_adaptive_concurrency is not None:
+        engine.use_adaptive_concurrency = args.use_adaptive_concurrency
+    if args.scheduling_policy is not None:
+        engine.scheduling_policy = args.scheduling_policy
+    if args.encoding_profile is not None:
+        engine.encoding_profile = args.encoding_profile
+    if args.segment_jobs is not None:
+        engine.segment_parallel_jobs = max(1, args.segment_jobs)
+    if args.gpu is not None:
+        engine.use_gpu_acceleration = args.gpu
+    if args.use_fast_remux is not None:
+        engine.use_fast_remux = args.use_fast_remux
+    if args.use_resumable_encoding is not None:
+        engine.use_resumable_encoding = args.use_resumable_encoding
+    if args.use_preflight_check is not None:
+        engine.use_preflight_check = args.use_preflight_check
+    if args.error_limit is not None:
+        engine.watchdog_errors_per_minute = max(0.0, args.error_limit)
+    if args.scratch is not None:
+        engine.use_scratch_staging = True
+        engine.scratch_directory = os.path.abspath(args.scratch)
+    if args.scratch_limit is not None:
+        engine.scratch_limit_gb = max(1.0, args.scratch_limit)
+    if args.use_cache_hints is not None:
+        engine.use_cache_hints = args.use_cache_hints
+    if args.auto_delete is not None:
+        engine.auto_delete_verified_originals = args.auto_delete
+    if args.log_level is not None:
+        engine.log_level = args.log_level
+    logging.getLogger().setLevel(level_number(engine.log_level))
+
+
+def run_batch(engine, stop_event):
+    """Converts the queue and waits for it. Returns False if any file failed."""
+    error_message = engine.start_batch()
+    if error_message:
+        logger.info(error_message)
+        return True
+    while engine.is_converting and not stop_event.wait(0.5):
+        pass
+    return engine.batch_stats["failed"] == 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level or "INFO", args.log_file)
+
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info("Received signal %d, stopping...", signum)
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    engine = ConversionEngine(LoggingListener(), state_file=args.state_file)
+    engine.load_state()
+    apply_settings(engine, args)
+    if args.profiles_file and not engine.load_profiles(args.profiles_file):
+        return 2
+    if args.encoding_profile and not engine.profile_registry.get(args.encoding_profile):
+        logger.error(
+            "Unknown encoding profile '%s'. Available: %s",
+            args.encoding_profile,
+            ", ".join(engine.profile_registry.names()),
+        )
+        return 2
+    if not engine.check_ffmpeg():
+        logger.error(
+            "FFmpeg not found. Place it in the 'ffmpeg' folder next to the application or add it to PATH."
+        )
+        return 2
+
+    succeeded = True
+    try:
+        if args.command == "run":
+            # The queue database is shared with the GUI, which runs elsewhere
+            engine.add_files([os.path.abspath(path) for path in args.files])
+            succeeded = run_batch(engine, stop_event)
+        elif args.command == "scan":
+            try:
+                _, message = engine.scan_directory_and_add(
+                    os.path.abspath(args.directory)
+                )
+            except ValueError as e:
+                logger.error(str(e))
+                return 2
+            logger.info(message)
+            if args.convert:
+                succeeded = run_batch(engine, stop_event)
+        elif args.command == "watch":
+            engine.plex_media_directory = os.path.abspath(args.directory)
+            if args.interval is not None:
+                engine.plex_scan_interval_minutes = args.interval
+            engine.auto_start_plex_conversions = True
+            if args.use_folder_watch is not None:
+                engine.use_folder_watch = args.use_folder_watch
+            try:
+                engine.start_monitoring()
+            except ValueError as e:
+                logger.error(str(e))
+                return 2
+            while not stop_event.wait(1):
+                pass  # Monitoring and conversions run in background threads
+    finally:
+        engine.shutdown()
+        engine.save_state(keep_saved_settings=not args.save_settings)
+    return 0 if succeeded else 1
@@ -0,0 +1,90 @@
+"""ffmpeg command building for MP4 output."""
+
+# Codecs that can be stored in an MP4 container without re-encoding
+MP4_COPY_VIDEO_CODECS = ("h264",)
+MP4_COPY_AUDIO_CODECS = ("aac",)
+# Text subtitles are converted to mov_text. Image subtitles (PGS, VobSub, DVB)
+# can't be stored in MP4 and are dropped.
+MP4_TEXT_SUBTITLE_CODECS = ("subrip", "srt", "ass", "ssa", "webvtt", "mov_text", "text")
+
+
+def plan_mp4_streams(streams):
+    """Decides per probed stream whether it is copied, re-encoded or dropped for MP4 output.
+
+    Returns None if no usable video stream was probed; the caller then falls back to a full re-encode.
+    """
+    video_stream = None
+    audio_streams = []
+    subtitle_streams = []
+    dropped_streams = []
+    for stream in streams:
+        codec_type = stream.get("codec_type")
+        codec_name = stream.get("codec_name", "unknown")
+        stream_label = f"#{stream.get('index')} {codec_type} ({codec_name})"
+        if codec_type == "video":
+            if stream.get("disposition", {}).get("attached_pic"):
+                dropped_streams.append(stream_label + " cover art")
+            elif video_stream is None:
+                video_stream = stream
+            else:
+                dropped_streams.append(stream_label)
+        elif codec_type == "audio":
+            audio_streams.append(stream)
+        elif codec_type == "subtitle" and codec_name in MP4_TEXT_SUBTITLE_CODECS:
+            subtitle_streams.append(stream)
+        else:  # Image subtitles, attachments (fonts), data streams
+            dropped_streams.append(stream_label)
+
+    if video_stream is None:
+        return None
+    return {
+        "video": (
+            video_stream["index"],
+            video_stream.get("codec_name") in MP4_COPY_VIDEO_CODECS,
+        ),
+        "audio": [
+            (stream["index"], stream.get("codec_name") in MP4_COPY_AUDIO_CODECS)
+            for stream in audio_streams
+        ],
+        "subtitles": [stream["index"] for stream in subtitle_streams],
+        "dropped": dropped_streams,
+    }
+
+
+def build_stream_plan_args(stream_plan, video_encode_args, audio_bitrate="192k"):
+    """Builds the -map/-c ffmpeg output options for a plan from plan_mp4_streams."""
+    video_index, copy_video = stream_plan["video"]
+    args = ["-map", f"0:{video_index}"]
+    args.extend(["-c:v", "copy"] if copy_video else video_encode_args)
+    return args + build_audio_subtitle_args(stream_plan, audio_bitrate)
+
+
+def build_audio_subtitle_args(stream_plan, audio_bitrate="192k"):
+    """The -map/-c options of a plan's audio and subtitle streams, without the video."""
+    args = []
+    for audio_number, (audio_index, copy_audio) in enumerate(stream_plan["audio"]):
+        args.extend(["-map", f"0:{audio_index}"])
+        if copy_audio:
+            args.extend([f"-c:a:{audio_number}", "copy"])
+        else:
+            args.extend(
+                [f"-c:a:{audio_number}", "aac", f"-b:a:{audio_number}", audio_bitrate]
+            )
+    for subtitle_number, subtitle_index in enumerate(stream_plan["subtitles"]):
+        args.extend(["-map", f"0:{subtitle_index}", f"-c:s:{subtitle_number}", "mov_text"])
+    return args
+
+
+def describe_stream_plan(stream_plan):
+    copied_audio = sum(1 for _, copy_audio in stream_plan["audio"] if copy_audio)
+    encoded_audio = len(stream_plan["audio"]) - copied_audio
+    parts = ["video copy" if stream_plan["video"][1] else "video re-encode"]
+    if copied_audio:
+        parts.append(f"{copied_audio} audio copy")
+    if encoded_audio:
+        parts.append(f"{encoded_audio} audio to AAC")
+    if stream_plan["subtitles"]:
+        parts.append(f"{len(stream_plan['subtitles'])} subtitle(s) to mov_text")
+    if stream_plan["dropped"]:
+        parts.append(f"dropped: {', '.join(stream_plan['dropped'])}")
+    return ", ".join(parts)
@@ -0,0 +1,143 @@
+"""Adaptive number of files converted at once, driven by system load and throughput."""
+
+import time
+
+import psutil
+
+SAMPLE_INTERVAL_SECONDS = 10
+SETTLE_SAMPLES = 2  # Samples after a change before its effect is judged
+HOLD_SECONDS = 300  # No new increase for this long after one didn't pay off
+MIN_FPS_GAIN = 1.05  # An extra job has to raise the total fps by 5% to stay
+
+# Default ceilings. At the CPU ceiling no job is added (encoders keep the CPU
+# busy by design); above the memory or disk ceiling one is removed
+CPU_CEILING_PERCENT = 90
+MEMORY_CEILING_PERCENT = 85
+DISK_BUSY_CEILING_PERCENT = 90
+
+
+class SystemSampler:
+    """Reads system CPU, memory and disk load since the previous sample."""
+
+    def __init__(self):
+        psutil.cpu_percent(None)  # The first call only sets the reference point
+        self._last_disk_busy = self._disk_busy_times()
+        self._last_time = time.monotonic()
+
+    @staticmethod
+    def _disk_busy_times():
+        """Busy milliseconds per disk, or None where psutil can't report them (Windows, macOS)."""
+        try:
+            counters = psutil.disk_io_counters(perdisk=True) or {}
+        except (OSError, RuntimeError):
+            return None
+        busy_times = {
+            name: disk.busy_time
+            for name, disk in counters.items()
+            if hasattr(disk, "busy_time") and not name.startswith(("loop", "ram"))
+        }
+        return busy_times or None
+
+    def sample(self):
+        """Returns (cpu_percent, memory_percent, disk_busy_percent); disk_busy_percent
+        is None if unknown. Disk busy is that of the busiest disk."""
+        now = time.monotonic()
+        elapsed_ms = max((now - self._last_time) * 1000, 1)
+        disk_busy_times = self._disk_busy_times()
+        disk_busy_percent = None
+        if disk_busy_times and self._last_disk_busy:
+            disk_busy_percent = max(
+                min((busy - self._last_disk_busy.get(name, busy)) / elapsed_ms * 100, 100)
+                for name, busy in disk_busy_times.items()
+            )
+        self._last_disk_busy = disk_busy_times
+        self._last_time = now
+        return (
+            psutil.cpu_percent(None),
+            psutil.virtual_memory().percent,
+            disk_busy_percent,
+        )
+
+
+class ConcurrencyController:
+    """Hill climbing on the total encode fps, between 1 and max_jobs parallel files.
+
+    update() is called every SAMPLE_INTERVAL_SECONDS. If memory or disk are over
+    their ceilings, one job is removed. Otherwise, while every allowed job is busy
+    and the CPU is below its ceiling, one job is added; if SETTLE_SAMPLES after the
+    added job started the total fps hasn't grown by MIN_FPS_GAIN, the job is removed
+    again and no increase is tried for HOLD_SECONDS. Lowering the limit never stops a running conversion; the
+    batch just starts the next file later.
+    """
+
+    def __init__(
+        self,
+        max_jobs,
+        initial_jobs=1,
+        cpu_ceiling=CPU_CEILING_PERCENT,
+        memory_ceiling=MEMORY_CEILING_PERCENT,
+        disk_busy_ceiling=DISK_BUSY_CEILING_PERCENT,
+    ):
+        self.max_jobs = max(1, max_jobs)
+        self.limit = max(1, min(initial_jobs, self.max_jobs))
+        self.cpu_ceiling = cpu_ceiling
+        self.memory_ceiling = memory_ceiling
+        self.disk_busy_ceiling = disk_busy_ceiling
+        self._baseline_fps = None  # Total fps before the last increase, while judging it
+        self._samples_since_change = 0
+        self._hold_until = 0
+
+    def update(self, load, total_fps, active_jobs, now=None):
+        """Takes one (cpu, memory, disk_busy) sample and the summed fps of the running
+        jobs. Returns the new limit and the reason it changed (None if unchanged)."""
+        now = time.monotonic() if now is None else now
+        cpu_percent, memory_percent, disk_busy_percent = load
+        self._samples_since_change += 1
+        if self._samples_since_change < SETTLE_SAMPLES:
+            return self.limit, None
+
+        overloaded = []
+        if memory_percent >= self.memory_ceiling:
+            overloaded.append(f"memory {memory_percent:.0f}%")
+        if disk_busy_percent is not None and disk_busy_percent >= self.disk_busy_ceiling:
+            overloaded.append(f"disk {disk_busy_percent:.0f}% busy")
+
+        if overloaded and self.limit > 1 and active_jobs >= self.limit:
+            return self._change(-1, "over the ceiling: " + ", ".join(overloaded))
+
+        if self._baseline_fps is not None:  # Judge the last increase
+            if active_jobs < self.limit:  # The added job hasn't started yet
+                self._samples_since_change = 0
+                return self.limit, None
+            baseline_fps = self._baseline_fps
+            self._baseline_fps = None
+            if total_fps < baseline_fps * MIN_FPS_GAIN:
+                self._hold_until = now + HOLD_SECONDS
+                return self._change(
+                    -1,
+                    f"{total_fps:.0f} fps with one more job vs {baseline_fps:.0f} fps before",
+                )
+            self._samples_since_change = 0
+            return self.limit, None
+
+        if (
+            not overloaded
+            and cpu_percent < self.cpu_ceiling
+            and self.limit < self.max_jobs
+            and active_jobs >= self.limit  # Only measurable when every slot is busy
+            and now >= self._hold_until
+            and total_fps > 0
+        ):
+            self._baseline_fps = total_fps
+            return self._change(
+                1,
+                f"headroom at CPU {cpu_percent:.0f}%, memory {memory_percent:.0f}%",
+            )
+        return self.limit, None
+
+    def _change(self, step, reason):
+        if step < 0:
+            self._baseline_fps = None
+        self.limit = max(1, min(self.limit + step, self.max_jobs))
+        self._samples_since_change = 0
+        return self.limit, reason
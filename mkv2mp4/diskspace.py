@@ -0,0 +1,39 @@
+"""Output size estimates for the free-space check before a file is converted."""
+
+import os
+import shutil
+
+SIZE_MARGIN = 1.15  # Estimates are rough, and the MP4 index needs room too
+# Always left free on the output filesystem, for the system, logs and state files
+FREE_SPACE_RESERVE_BYTES = 512 * 1024 * 1024
+ENCODED_AUDIO_BIT_RATE = 192000  # Per audio stream; AAC copies are usually smaller
+# H.264 needs more bits than these codecs for the same picture quality
+VIDEO_CODEC_SIZE_FACTORS = {"hevc": 1.6, "av1": 1.8, "vp9": 1.5}
+
+
+def estimate_output_bytes(media_info, copy_video, size_factor=1.0):
+    """Estimated MP4 size of a conversion, from the probed bitrate and duration.
+    size_factor is the encoding profile's output size relative to the standard one."""
+    source_bytes = media_info.size or os.path.getsize(media_info.path)
+    duration = media_info.duration
+    if copy_video or not duration:
+        # Remuxing keeps the streams; without a duration the source size is the best guess
+        return int(source_bytes * SIZE_MARGIN)
+    video_bit_rate = (
+        media_info.video_bit_rate or media_info.bit_rate or source_bytes * 8 / duration
+    )
+    video_bit_rate *= VIDEO_CODEC_SIZE_FACTORS.get(media_info.video_codec, 1.0)
+    video_bit_rate *= size_factor
+    audio_bit_rate = ENCODED_AUDIO_BIT_RATE * len(media_info.audio_streams)
+    return int((video_bit_rate + audio_bit_rate) * duration / 8 * SIZE_MARGIN)
+
+
+def filesystem_space(directory):
+    """(device id, free bytes) of the filesystem holding directory."""
+    return os.stat(directory).st_dev, shutil.disk_usage(directory).free
+
+
+def format_bytes(size):
+    if size >= 1024**3:
+        return f"{size / 1024**3:.1f} GB"
+    return f"{size / 1024**2:.0f} MB"
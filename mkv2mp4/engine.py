@@ -0,0 +1,2532 @@
+"""Conversion engine shared by the Tkinter GUI and the headless command line.
+
+Owns the queue, the failed list, the retry levels, the batch workers, folder
+monitoring and the state file. It never touches Tk; everything the user should
+see is reported through a ConversionEngineListener.
+"""
+
+import collections
+import itertools
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+import psutil  # For process pause/resume
+
+from .commands import (
+    build_audio_subtitle_args,
+    build_stream_plan_args,
+    describe_stream_plan,
+    plan_mp4_streams,
+)
+from .concurrency import (
+    CPU_CEILING_PERCENT,
+    DISK_BUSY_CEILING_PERCENT,
+    MEMORY_CEILING_PERCENT,
+    SAMPLE_INTERVAL_SECONDS,
+    ConcurrencyController,
+    SystemSampler,
+)
+from .diskspace import (
+    FREE_SPACE_RESERVE_BYTES,
+    estimate_output_bytes,
+    filesystem_space,
+    format_bytes,
+)
+from .failures import (
+    CATEGORY_LABELS,
+    CORRUPT_PACKETS,
+    FIX_DESCRIPTIONS,
+    choose_fix,
+    classify_failure,
+    fix_input_args,
+    fix_output_args,
+    fixed_stream_plan,
+)
+from .ffmpeg_tools import (
+    SUBPROCESS_CREATION_FLAGS,
+    FFmpegProgressParser,
+    check_ffmpeg,
+    collect_stream_lines,
+    format_duration,
+    get_ffmpeg_path,
+    get_ffprobe_path,
+)
+from .iohints import HAS_FADVISE, drop_from_cache, read_ahead
+from .jobstore import ACTIVE, FAILED, QUEUED, JobStore, queue_display_name
+from .logs import LOG_LEVELS, level_number
+from .media import ProbeCache, probe_media
+from .outputs import (
+    STALE_LEFTOVER_SECONDS,
+    commit_output,
+    find_leftovers,
+    leftover_age,
+    output_path_for,
+    remove_leftover,
+    temp_output_path,
+)
+from .preflight import (
+    DEFAULT_WATCHDOG_ERRORS_PER_MINUTE,
+    ErrorRateWatchdog,
+    find_damage,
+)
+from .profiles import ProfileRegistry
+from .scanner import LibraryScanner, is_unconverted_video
+from .scheduler import DEFAULT_POLICY, SCHEDULING_POLICIES, JobScheduler
+from .segments import (
+    WORK_DIR_SUFFIX,
+    SegmentWorkDir,
+    plan_segments,
+    segment_length,
+)
+from .staging import DEFAULT_SCRATCH_LIMIT_GB, ScratchStager, copy_file
+from .verification import VERDICTS_FILE, VerdictLog, verify_output
+from .watcher import FolderWatcher
+
+STATE_FILE = "mkv_converter_state.json"
+PROBE_CACHE_FILE = "mkv_converter_probe_cache.db"  # Next to the state file
+LIBRARY_INDEX_FILE = "mkv_converter_library_index.db"  # Next to the state file
+PROFILES_FILE = "mkv_converter_profiles.json"  # Next to the state file, optional
+QUEUE_DB_FILE = "mkv_converter_queue.db"  # Next to the state file
+# Keys of the state file holding jobs rather than settings
+STATE_LIST_KEYS = (
+    "file_queue",
+    "failed_files_data",
+    "files_for_retry_level_1",
+    "files_for_retry_level_2",
+    "queue_priorities",
+    "queue_profiles",
+)
+OUTPUT_FORMATS = ["MP4 (H.264 + AAC)"]  # Only MP4
+
+
+class ConversionJob:
+    """Runtime state of one file being converted by a batch worker."""
+
+    def __init__(self, job_id, input_path, retry_level=0):
+        self.job_id = job_id
+        self.input_path = input_path
+        self.retry_level = retry_level
+        self.process = None  # subprocess.Popen object of this job's ffmpeg
+        self.psutil_process = None  # psutil.Process object for suspend/resume
+        self.is_paused = False
+        self.cancel_requested = False  # Cancels only this job, not the batch
+        self.media_info = None  # MediaInfo of the source, set by convert_file
+        self.fps = None  # Latest encode fps, summed by the adaptive concurrency controller
+        self.output_bytes = None  # Bytes written so far, counted against its space reservation
+        self.output_path = None  # Final MP4 path, set by convert_file
+        self.temp_output_path = None  # Hidden file ffmpeg writes until the output is verified
+        self.estimated_output_bytes = None  # Output size estimate of the free-space check
+        self.staged_source = None  # StagedSource when ffmpeg works on a scratch copy
+        self.verdict = None  # Verdict of the output, see verification.py
+        self.profile_name = None  # Encoding profile chosen for the file, see profiles.py
+        self.watchdog_message = None  # Why the error-rate watchdog stopped its last ffmpeg
+        # Child jobs of the segments being encoded in parallel, each running its
+        # own ffmpeg; pause, cancel and termination are passed on to them
+        self.segment_jobs = []
+
+    @property
+    def display_name(self):
+        return queue_display_name(self.input_path, self.retry_level)
+
+
+class ConversionEngineListener:
+    """Receives engine events. The default implementation ignores all of them.
+
+    Methods are called from the batch workers and the monitoring thread, so a UI
+    must hand them over to its own thread. Queue and failed-list events carry
+    JobRecords and are sent while the engine's job_lock is held, so they arrive in
+    the same order as the store changes. Records keep changing afterwards; copy
+    the fields you need (job_id, display_name, error) when the event arrives.
+    """
+
+    def log(self, message, level):
+        pass
+
+    def status_changed(self, text):
+        pass
+
+    def queue_item_added(self, record):
+        pass
+
+    def queue_item_removed(self, record):
+        pass
+
+    def queue_item_active(self, record, active):
+        pass
+
+    def queue_item_changed(self, record):
+        pass
+
+    def queue_reset(self, records):
+        pass
+
+    def failed_item_added(self, record):
+        pass
+
+    def failed_reset(self, records):
+        pass
+
+    def batch_started(self, total_files):
+        pass
+
+    def batch_progress(self, processed_files, total_files):
+        pass
+
+    def batch_finished(self, summary_message, cancelled):
+        pass
+
+    def job_started(self, job):
+        pass
+
+    def job_progress(self, job, value, text=None):
+        pass
+
+    def job_paused(self, job, paused):
+        pass
+
+    def job_finished(self, job):
+        pass
+
+    def monitoring_status(self, text):
+        pass
+
+    def error(self, title, message):
+        pass
+
+
+class ConversionEngine:
+    def __init__(self, listener=None, state_file=STATE_FILE):
+        self.listener = listener or ConversionEngineListener()
+        self.state_file = state_file
+
+        # Settings, persisted in the state file
+        self.output_format = OUTPUT_FORMATS[0]
+        self.use_gpu_acceleration = False  # For NVENC
+        self.use_fast_remux = True  # Copy MP4-compatible streams instead of re-encoding them
+        # Profile of first conversions; None uses the library's or the retry level's
+        # profile. Retries always use the retry level's profile
+        self.encoding_profile = None
+        self.auto_delete_verified_originals = False
+        self.max_parallel_jobs = 1
+        self.scheduling_policy = DEFAULT_POLICY  # Order of the batch, see scheduler.py
+        # Vary the files converted at once between 1 and max_parallel_jobs with the
+        # system load, see concurrency.py
+        self.use_adaptive_concurrency = False
+        self.adaptive_cpu_ceiling = CPU_CEILING_PERCENT
+        self.adaptive_memory_ceiling = MEMORY_CEILING_PERCENT
+        self.adaptive_disk_busy_ceiling = DISK_BUSY_CEILING_PERCENT
+        self.plex_media_directory = None  # Root folder scanned by monitoring
+        self.plex_scan_interval_minutes = 10
+        self.auto_start_plex_conversions = False
+        self.use_folder_watch = True  # Queue new files via inotify between scans
+        self.use_resumable_encoding = False  # Re-encode long files in checkpointed segments
+        self.segment_parallel_jobs = 1  # ffmpeg processes per re-encode; >1 encodes segments concurrently
+        # Copy sources to a local scratch folder and encode there, for libraries on
+        # network shares, see staging.py. None is the system's temporary folder
+        self.use_scratch_staging = False
+        self.scratch_directory = None
+        self.scratch_limit_gb = DEFAULT_SCRATCH_LIMIT_GB
+        # Read the next source ahead and drop finished files from the page cache (Linux)
+        self.use_cache_hints = True
+        # Decode sampled windows of each source first and convert damaged ones with
+        # the Level 1 profile; stop encodes whose stderr reports too many decoding
+        # errors per minute of media (0: never), see preflight.py
+        self.use_preflight_check = False
+        self.watchdog_errors_per_minute = DEFAULT_WATCHDOG_ERRORS_PER_MINUTE
+        self.log_level = "INFO"  # Messages below this level are dropped unformatted
+
+        # Queued and failed files with their retry levels, written to the queue
+        # database as they change. Its lock also guards active_jobs and the batch
+        # counters, which are shared between the UI, the batch workers and the scanner
+        try:
+            self.jobs = JobStore(
+                os.path.join(os.path.dirname(self.state_file), QUEUE_DB_FILE),
+                on_error=lambda e: self.log_message(
+                    f"Could not write the queue database, {self.jobs.unsaved_count} change(s) "
+                    f"are only in memory until the next change succeeds: {e}",
+                    "ERROR",
+                ),
+            )
+        except sqlite3.Error as e:
+            self.jobs = JobStore()
+            self.log_message(
+                f"Queue database unavailable, the queue is only saved on exit: {e}",
+                "WARN",
+            )
+        # Without the database the queue is kept in the state file, as before
+        self.queue_in_database = self.jobs.is_persistent
+        self.job_lock = self.jobs.lock
+        self.active_jobs = {}  # job_id -> ConversionJob currently being converted
+        self.job_id_counter = itertools.count(1)
+        self.batch_stats = {"processed": 0, "succeeded": 0, "failed": 0}
+        self.batch_scheduler = None  # JobScheduler of the running batch
+        self.concurrency_limit = 1  # Files the running batch may convert at once
+        # job_id -> (device, estimated output bytes, ConversionJob) of the running jobs
+        self.output_reservations = {}
+        self.scratch_stager = None  # ScratchStager of the running batch, if staging
+
+        self.ffmpeg_exec_path = None
+        self.is_converting = False
+        self.is_paused = False  # True while the whole batch is paused
+        self.cancel_requested = False  # To signal cancellation of the batch
+        self.conversion_thread = None
+        self.is_monitoring_plex = False  # True if Plex monitoring is active
+        self.plex_monitoring_thread = None
+        # Files from the folder watch were queued during a batch; auto-start once it ends
+        self.watch_start_pending = False
+        self.plex_scan_interval_seconds = self.plex_scan_interval_minutes * 60
+
+        try:
+            self.probe_cache = ProbeCache(
+                os.path.join(os.path.dirname(self.state_file), PROBE_CACHE_FILE)
+            )
+        except sqlite3.Error as e:
+            self.probe_cache = None
+            self.log_message(
+                f"Probe cache unavailable, files will be probed every time: {e}",
+                "WARN",
+            )
+        try:
+            self.library_scanner = LibraryScanner(
+                os.path.join(os.path.dirname(self.state_file), LIBRARY_INDEX_FILE)
+            )
+        except (sqlite3.Error, ValueError) as e:
+            self.library_scanner = LibraryScanner()  # Index kept in memory only
+            self.log_message(
+                f"Library index unavailable, the first scan after each start reads every folder: {e}",
+                "WARN",
+            )
+        # One JSON line per verified output
+        try:
+            self.verdict_log = VerdictLog(
+                os.path.join(os.path.dirname(self.state_file), VERDICTS_FILE)
+            )
+        except OSError as e:
+            self.verdict_log = None
+            self.log_message(f"Verdicts file unavailable: {e}", "WARN")
+        self.profile_registry = ProfileRegistry()
+        profiles_path = os.path.join(os.path.dirname(self.state_file), PROFILES_FILE)
+        if os.path.exists(profiles_path):
+            self.load_profiles(profiles_path)
+
+    def load_profiles(self, profiles_path):
+        """Replaces the encoding profiles with the built-in ones plus those of a
+        .json or .toml profiles file. Returns False, keeping the current ones, if
+        the file can't be read or is invalid."""
+        try:
+            self.profile_registry = ProfileRegistry.load(profiles_path)
+        except (OSError, ValueError) as e:
+            self.log_message(
+                f"Could not load encoding profiles from {profiles_path}, keeping the current ones: {e}",
+                "WARN",
+            )
+            return False
+        self.log_message(
+            f"Loaded encoding profiles from {profiles_path}: {', '.join(self.profile_registry.names())}",
+            "INFO",
+        )
+        return True
+
+    def _select_profile(self, profile_name, input_path, retry_level):
+        """The EncodingProfile of a conversion: for a first conversion the file's own
+        profile, else its library's, else encoding_profile; for retries, and when
+        none is set, the profile of the retry level."""
+        registry = self.profile_registry
+        if retry_level == 0:
+            for name in (
+                profile_name,
+                registry.library_profile(input_path),
+                self.encoding_profile,
+            ):
+                if not name:
+                    continue
+                if registry.get(name):
+                    return registry.get(name)
+                self.log_message(
+                    f"Unknown encoding profile '{name}' for {input_path}, using the default.",
+                    "WARN",
+                )
+                break
+        return registry.retry_profile(retry_level, self.use_gpu_acceleration)
+
+    def log_enabled(self, level):
+        """False if messages of this level are suppressed, so callers can skip building them."""
+        return level_number(level) >= level_number(self.log_level)
+
+    def log_message(self, message, level="INFO"):
+        if self.log_enabled(level):
+            self.listener.log(message, level)
+
+    def check_ffmpeg(self):
+        ffmpeg_path = get_ffmpeg_path()
+        self.ffmpeg_exec_path = ffmpeg_path if check_ffmpeg(ffmpeg_path) else None
+        return self.ffmpeg_exec_path is not None
+
+    # --- Queue and failed list ---
+
+    def add_files(self, file_paths):
+        """Appends files that are neither queued nor failed. Returns the list of added paths."""
+        added_file_paths = []
+        with self.job_lock, self.jobs.batch():
+            for file_path in file_paths:
+                record = self.jobs.add(file_path)
+                if record:
+                    self.listener.queue_item_added(record)
+                    added_file_paths.append(file_path)
+        return added_file_paths
+
+    def remove_queued(self, job_id):
+        """Removes a queued file that is not being converted. Returns False if there is none with that id."""
+        with self.job_lock:
+            record = self.jobs.get_by_id(job_id)
+            if not record or record.state != QUEUED:
+                return False
+            self.jobs.remove(record)
+            self.listener.queue_item_removed(record)
+        self._release_staged_sources([record.path])
+        return True
+
+    def set_queue_priority(self, job_id, priority):
+        """Sets the priority of a queued file, used by the priority scheduling policy.
+        Also applies to a running batch. Returns False if there is no such file."""
+        with self.job_lock:
+            record = self.jobs.get_by_id(job_id)
+            if not record or record.state == FAILED:
+                return False
+            self.jobs.set_priority(record, priority)
+            if self.batch_scheduler:
+                self.batch_scheduler.update(record)
+            self.listener.queue_item_changed(record)
+        return True
+
+    def set_queue_profile(self, job_id, profile_name):
+        """Sets the encoding profile of a queued file's first conversion; None clears
+        it. Returns False if there is no such file or profile."""
+        if profile_name and not self.profile_registry.get(profile_name):
+            return False
+        with self.job_lock:
+            record = self.jobs.get_by_id(job_id)
+            if not record or record.state == FAILED:
+                return False
+            self.jobs.set_profile(record, profile_name)
+            self.listener.queue_item_changed(record)
+        return True
+
+    def clear_queue(self):
+        with self.job_lock:
+            removed_paths = [
+                record.path for record in self.jobs.queued() if record.state == QUEUED
+            ]
+            self.jobs.clear_queued()
+            self.listener.queue_reset(self.jobs.queued())  # Files being converted stay
+        self._release_staged_sources(removed_paths)
+
+    def _release_staged_sources(self, source_paths):
+        """Frees the scratch space of files that left the running batch, e.g. a
+        prefetched copy of a file removed from the queue."""
+        stager = self.scratch_stager
+        if not stager:
+            return
+        with self.job_lock:
+            # A file queued again under the same path may be converting already
+            active_paths = {job.input_path for job in self.active_jobs.values()}
+        for source_path in source_paths:
+            if source_path not in active_paths:
+                stager.release(source_path)
+
+    def requeue_failed(self, retry_level=0):
+        """Moves all failed files back to the queue for the given retry level. Returns the number moved."""
+        with self.job_lock, self.jobs.batch():
+            failed_records = self.jobs.failed()
+            for record in failed_records:
+                self.jobs.requeue(record, retry_level)
+                self.listener.queue_item_added(record)
+            self.listener.failed_reset([])
+        return len(failed_records)
+
+    def clear_failed(self):
+        with self.job_lock:
+            self.jobs.clear_failed()
+            self.listener.failed_reset([])
+
+    # --- Batch conversion ---
+
+    def start_batch(self):
+        """Starts converting the queue in a background thread. Returns an error message, or None if started."""
+        with self.job_lock:
+            if self.is_converting:
+                return "A conversion process is already running."
+            if not self.jobs.queued_count():
+                return "The conversion queue is empty. Please add MKV files."
+            if not self.ffmpeg_exec_path:
+                return "FFmpeg not found. Please check setup."
+            self.is_converting = True
+            self.cancel_requested = False  # Reset cancel flag
+            self.is_paused = False  # Reset pause flag
+            total_files = self.jobs.queued_count()
+        self.listener.batch_started(total_files)
+        self.listener.status_changed("Status: Starting batch conversion...")
+        self.conversion_thread = threading.Thread(
+            target=self.process_batch, args=(self.max_parallel_jobs,)
+        )
+        self.conversion_thread.daemon = True
+        self.conversion_thread.start()
+        return None
+
+    def process_batch(self, max_parallel_jobs=1):
+        with self.job_lock:
+            current_batch_records = self.jobs.queued()
+            self.batch_stats = {"processed": 0, "succeeded": 0, "failed": 0}
+        total_files_in_batch = len(current_batch_records)
+        scheduling_policy = self.scheduling_policy
+        if scheduling_policy == "shortest":
+            self.listener.status_changed(
+                "Status: Reading durations for shortest-first scheduling..."
+            )
+        # Shared by all workers; each worker takes the next file in policy order
+        pending_records = JobScheduler(
+            scheduling_policy, current_batch_records, self._probed_duration
+        )
+        with self.job_lock:
+            self.batch_scheduler = pending_records
+        worker_count = max(1, min(max_parallel_jobs, total_files_in_batch))
+        concurrency_controller = None
+        if self.use_adaptive_concurrency and worker_count > 1:
+            concurrency_controller = ConcurrencyController(
+                worker_count,
+                cpu_ceiling=self.adaptive_cpu_ceiling,
+                memory_ceiling=self.adaptive_memory_ceiling,
+                disk_busy_ceiling=self.adaptive_disk_busy_ceiling,
+            )
+        with self.job_lock:
+            self.concurrency_limit = (
+                concurrency_controller.limit if concurrency_controller else worker_count
+            )
+        if self.use_scratch_staging:
+            try:
+                self.scratch_stager = ScratchStager(
+                    self.scratch_directory,
+                    int(self.scratch_limit_gb * 1024**3),
+                    cache_hints=self.use_cache_hints,
+                )
+                self.log_message(
+                    f"Staging sources in {self.scratch_stager.path}, using up to {format_bytes(self.scratch_stager.limit_bytes)}.",
+                    "INFO",
+                )
+            except OSError as e:
+                self.log_message(
+                    f"Could not create a scratch folder in {self.scratch_directory or 'the temporary folder'}, converting files in place: {e}",
+                    "WARN",
+                )
+        self.log_message(
+            f"Starting batch of {total_files_in_batch} file(s) with "
+            + (
+                f"{self.concurrency_limit} to {worker_count} parallel job(s) depending on system load"
+                if concurrency_controller
+                else f"{worker_count} parallel job(s)"
+            )
+            + f", order: {SCHEDULING_POLICIES[pending_records.policy].lower()}.",
+            "INFO",
+        )
+
+        workers = []
+        for worker_number in range(1, worker_count + 1):
+            worker = threading.Thread(
+                target=self._batch_worker_loop,
+                args=(pending_records, total_files_in_batch),
+                name=f"ConversionWorker-{worker_number}",
+            )
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        batch_done = threading.Event()
+        if concurrency_controller:
+            threading.Thread(
+                target=self._adapt_concurrency_loop,
+                args=(concurrency_controller, batch_done),
+                name="ConcurrencyController",
+                daemon=True,
+            ).start()
+        for worker in workers:
+            worker.join()
+        batch_done.set()
+        if self.scratch_stager:
+            self.scratch_stager.close()
+            self.scratch_stager = None
+
+        if self.cancel_requested:
+            self.listener.status_changed("Status: Batch cancelled by user.")
+
+        with self.job_lock:
+            self.is_converting = False
+            self.batch_scheduler = None
+            succeeded_count = self.batch_stats["succeeded"]
+            newly_failed_count = self.batch_stats["failed"]
+            remaining_count = self.jobs.queued_count()
+            total_failed_count = self.jobs.failed_count()
+            deferred_count = pending_records.deferred_count
+            # Nothing is held aside once the batch is over; the files stay queued
+            pending_records.restore_deferred()
+
+        if self.cancel_requested:
+            summary_message = "Batch conversion cancelled."
+            if remaining_count:
+                summary_message += f"\n{remaining_count} file(s) remaining in queue."
+        else:
+            summary_message = f"Batch processing finished.\nSuccessfully converted: {succeeded_count}/{total_files_in_batch}\nFailed this run: {newly_failed_count}"
+            if remaining_count:
+                summary_message += f"\nRemaining in queue: {remaining_count}"
+            if deferred_count:
+                summary_message += f"\nNot started for lack of disk space: {deferred_count}"
+            if total_failed_count:
+                summary_message += f"\nTotal in failed list: {total_failed_count}"
+            self.listener.status_changed("Status: Batch finished. Check summary.")
+
+        self.log_message(
+            summary_message.replace("\n", " | "), "INFO"
+        )  # Log the summary
+        self.listener.batch_finished(summary_message, self.cancel_requested)
+
+    def _batch_worker_loop(self, pending_records, total_files_in_batch):
+        """Runs in each worker thread: converts files from pending_records until it is empty or the batch is cancelled."""
+        while True:
+            while self.is_paused and not self.cancel_requested:
+                time.sleep(0.1)  # Don't start new files while the batch is paused
+            if self.cancel_requested or not self.is_converting:
+                return
+
+            with self.job_lock:
+                # There can be more workers than files the batch may convert at
+                # once, when the adaptive controller lowered the limit
+                must_wait = len(self.active_jobs) >= self.concurrency_limit
+                if not must_wait:
+                    record = pending_records.pop()
+                    if record is None:
+                        # Deferred files were checked again when the last job
+                        # finished; with none running, nothing will free space
+                        if not (pending_records.deferred_count and self.active_jobs):
+                            return
+                        must_wait = True  # Deferred files wait for running jobs to free space
+            if must_wait:
+                time.sleep(0.5)
+                continue
+
+            # Probing for the estimate can take a moment, so it runs unlocked
+            estimated_bytes = self._estimate_output_bytes(record)
+            with self.job_lock:
+                if self.jobs.get(record.path) is not record or record.state != QUEUED:
+                    # Removed from the queue since the batch started; a prefetched
+                    # copy would hold its scratch space until the batch ends
+                    self._release_staged_sources([record.path])
+                    continue
+                if len(self.active_jobs) >= self.concurrency_limit:
+                    pending_records.push_back(record)  # Another worker was faster
+                    continue
+                reservation = self._reserve_output_space(
+                    record, estimated_bytes, pending_records.was_deferred(record)
+                )
+                if reservation is False:
+                    pending_records.defer(record)
+                    # Staged again when it fits; until then the space is free for others
+                    self._release_staged_sources([record.path])
+                    continue
+
+                job = ConversionJob(
+                    next(self.job_id_counter), record.path, record.retry_level
+                )
+                job.estimated_output_bytes = estimated_bytes
+                job.profile_name = record.profile
+                self.active_jobs[job.job_id] = job
+                if reservation:
+                    self.output_reservations[job.job_id] = reservation + (job,)
+                started_number = total_files_in_batch - len(pending_records)
+                self.jobs.set_active(record, True)
+                self.listener.queue_item_active(record, True)
+
+            self.listener.job_started(job)
+            self._prefetch_next_source(pending_records)
+            try:
+                self._process_batch_job(
+                    job, record, started_number, total_files_in_batch
+                )
+            except Exception as e:
+                self.log_message(
+                    f"Unexpected error while processing {record.path}: {e}",
+                    "ERROR",
+                )
+                self._delete_partial_output(job.temp_output_path)
+                with self.job_lock:
+                    # Still marked as converting: move it to the failed list, where
+                    # it can be retried or removed
+                    if self.jobs.get(record.path) is record and record.state == ACTIVE:
+                        self.listener.queue_item_removed(record)
+                        self.jobs.fail(record, f"Unexpected error: {e}")
+                        self.listener.failed_item_added(record)
+                        self.batch_stats["failed"] += 1
+                        self.batch_stats["processed"] += 1
+            finally:
+                with self.job_lock:
+                    self.active_jobs.pop(job.job_id, None)
+                    self.output_reservations.pop(job.job_id, None)
+                    # Whether or not it had a reservation, the job may have freed
+                    # space (a deleted original, a released scratch copy), so the
+                    # deferred files get another look
+                    pending_records.restore_deferred()
+                stager = self.scratch_stager
+                if stager:
+                    stager.release(job.input_path)
+                self.listener.job_finished(job)
+
+    def _staging_bytes(self, source_path, estimated_output_bytes):
+        """Scratch space for a source and its output; the source size stands in for an unknown estimate."""
+        source_bytes = os.path.getsize(source_path)
+        return source_bytes + (estimated_output_bytes or source_bytes)
+
+    def _prefetch_next_source(self, pending_records):
+        """Starts copying the file the batch converts next to the scratch folder or,
+        without staging, reading its start into the page cache."""
+        stager = self.scratch_stager
+        if not stager and not (self.use_cache_hints and HAS_FADVISE):
+            return
+        with self.job_lock:
+            record = pending_records.peek()
+        if record is None:
+            return
+        if not stager:
+            # The hint can block while the reads are queued, e.g. on a network share
+            threading.Thread(
+                target=read_ahead, args=(record.path,), name="ReadAhead", daemon=True
+            ).start()
+            return
+        try:
+            needed_bytes = self._staging_bytes(
+                record.path, self._estimate_output_bytes(record)
+            )
+        except OSError:
+            return  # Missing source, fails once its turn comes
+        if stager.prefetch(record.path, needed_bytes):
+            self.log_message(f"Prefetching {record.path} to the scratch folder.", "DEBUG")
+
+    def _stage_source(self, job, input_mkv):
+        """Copies input_mkv to the scratch folder for job. Returns the path ffmpeg
+        should read, the original when the file isn't staged."""
+        stager = self.scratch_stager
+        self.listener.job_progress(job, 0, f"{job.display_name}: Copying to scratch...")
+        try:
+            staged = stager.stage(
+                input_mkv,
+                self._staging_bytes(input_mkv, job.estimated_output_bytes),
+                should_stop=lambda: self.cancel_requested or job.cancel_requested,
+            )
+        except OSError as e:
+            self.log_message(
+                f"Could not copy {input_mkv} to {stager.path}, converting it in place: {e}",
+                "WARN",
+            )
+            return input_mkv
+        if staged is None:
+            if not (self.cancel_requested or job.cancel_requested):
+                self.log_message(
+                    f"{job.display_name} doesn't fit in the scratch space left, converting it in place.",
+                    "INFO",
+                )
+            return input_mkv
+        job.staged_source = staged
+        return staged.local_path
+
+    def _estimate_output_bytes(self, record):
+        """Space a conversion of record needs on its output filesystem, None if unknown."""
+        try:
+            media_info = self.get_media_info(record.path)
+            profile = self._select_profile(
+                record.profile, record.path, record.retry_level
+            )
+            copy_video = False
+            if profile.remux and self.use_fast_remux:
+                stream_plan = plan_mp4_streams(media_info.streams)
+                copy_video = bool(stream_plan and stream_plan["video"][1])
+            estimated_bytes = estimate_output_bytes(
+                media_info, copy_video, profile.size_factor
+            )
+        except Exception as e:
+            self.log_message(
+                f"Could not estimate the output size of {record.path}: {e}", "DEBUG"
+            )
+            return None
+        if (
+            not copy_video
+            and not profile.error_tolerant
+            and (self.use_resumable_encoding or self.segment_parallel_jobs > 1)
+        ):
+            estimated_bytes *= 2  # Segments and the joined MP4 exist side by side
+        return estimated_bytes
+
+    def _reserve_output_space(self, record, estimated_bytes, repeated_deferral=False):
+        """Checks that estimated_bytes fit on the output filesystem next to what running
+        jobs still need. Returns the (device, bytes) to reserve, None if there is nothing
+        to check, or False if the file has to wait. Called with job_lock held.
+        """
+        if not estimated_bytes:
+            return None
+        output_directory = os.path.dirname(record.path) or "."
+        try:
+            device, free_bytes = filesystem_space(output_directory)
+        except OSError as e:
+            self.log_message(f"Could not read the free space of {output_directory}: {e}", "WARN")
+            return None
+        # Running jobs have already written part of their estimate
+        reserved_bytes = sum(
+            max(reserved - (job.output_bytes or 0), 0)
+            for reserved_device, reserved, job in self.output_reservations.values()
+            if reserved_device == device
+        )
+        available_bytes = free_bytes - reserved_bytes - FREE_SPACE_RESERVE_BYTES
+        if estimated_bytes > available_bytes:
+            self.log_message(
+                f"Deferred {record.display_name}: needs about {format_bytes(estimated_bytes)} in {output_directory}, "
+                f"{format_bytes(max(available_bytes, 0))} available"
+                + (
+                    f" ({format_bytes(reserved_bytes)} reserved for running jobs)"
+                    if reserved_bytes
+                    else ""
+                )
+                + ".",
+                "DEBUG" if repeated_deferral else "WARN",
+            )
+            return False
+        return device, estimated_bytes
+
+    def _adapt_concurrency_loop(self, controller, batch_done):
+        """Runs during a batch: samples the system load and the running jobs' fps and
+        applies the controller's limit, until batch_done is set."""
+        sampler = SystemSampler()
+        while not batch_done.wait(SAMPLE_INTERVAL_SECONDS):
+            load = sampler.sample()
+            if self.is_paused:
+                continue  # Nothing to measure
+            running_jobs = [job for job in self._get_active_jobs() if not job.is_paused]
+            total_fps = sum(job.fps or 0 for job in running_jobs)
+            limit, reason = controller.update(load, total_fps, len(running_jobs))
+            if self.log_enabled("DEBUG"):
+                cpu_percent, memory_percent, disk_busy_percent = load
+                disk_text = (
+                    f"{disk_busy_percent:.0f}%" if disk_busy_percent is not None else "n/a"
+                )
+                self.log_message(
+                    f"Load: CPU {cpu_percent:.0f}%, memory {memory_percent:.0f}%, disk busy {disk_text}, "
+                    f"{len(running_jobs)} job(s) at {total_fps:.0f} fps, limit {limit}",
+                    "DEBUG",
+                )
+            if reason:
+                with self.job_lock:
+                    previous_limit = self.concurrency_limit
+                    self.concurrency_limit = limit
+                self.log_message(
+                    f"Parallel jobs {previous_limit} -> {limit} ({reason}).", "INFO"
+                )
+
+    def _probed_duration(self, input_path):
+        """Duration for scheduling, from the probe cache or a new probe. None if unknown."""
+        try:
+            return self.get_media_info(input_path).duration
+        except Exception as e:
+            self.log_message(f"Could not probe {input_path} for scheduling: {e}", "DEBUG")
+            return None
+
+    def _process_batch_job(self, job, record, started_number, total_files_in_batch):
+        current_file_path = job.input_path
+        current_file_name = os.path.basename(current_file_path)
+
+        self.listener.status_changed(
+            f"Status: Converting {job.display_name} ({started_number}/{total_files_in_batch})..."
+        )
+
+        conversion_result, result_payload = self.convert_file(
+            current_file_path, retry_level=job.retry_level, job=job
+        )
+
+        if self.cancel_requested or job.cancel_requested:
+            if self.cancel_requested:
+                self.log_message("Batch cancelled during conversion of a file.", "INFO")
+            else:
+                self.log_message(
+                    f"Conversion of {job.display_name} cancelled by user. File left in queue.",
+                    "INFO",
+                )
+            self._delete_partial_output(job.temp_output_path)  # Finished or not
+            with self.job_lock:  # File stays in the queue
+                self.jobs.set_active(record, False)
+                self.listener.queue_item_active(record, False)
+            return
+
+        # The output only gets its final name once it is verified
+        if conversion_result:
+            conversion_result, result_payload = self._verify_and_commit_output(
+                job, result_payload
+            )
+
+        with self.job_lock:
+            if self.jobs.get(current_file_path) is record:
+                self.listener.queue_item_removed(record)
+            else:
+                self.log_message(
+                    f"Warning: {current_file_name} not found in live queue for removal after processing.",
+                    "WARN",
+                )
+                record = self.jobs.add(current_file_path)
+
+            if conversion_result:
+                if record:
+                    self.jobs.remove(record)
+                self.batch_stats["succeeded"] += 1
+            else:
+                if record:
+                    self.jobs.fail(record, result_payload)
+                    self.listener.failed_item_added(record)
+                self.batch_stats["failed"] += 1
+            self.batch_stats["processed"] += 1
+            files_processed_in_batch = self.batch_stats["processed"]
+
+        self.listener.batch_progress(files_processed_in_batch, total_files_in_batch)
+
+        if self.use_cache_hints:
+            # Read and written once; keep the cache for what the host uses again
+            drop_from_cache(current_file_path)
+            if conversion_result:
+                drop_from_cache(job.output_path)
+
+        if conversion_result:
+            self._delete_verified_original(current_file_path, job.verdict)
+
+    def _verify_and_commit_output(self, job, finished_output_path):
+        """Verifies a finished temporary output and renames it to job.output_path,
+        after copying it back from the scratch folder if it was staged.
+        Returns (True, output_path), or (False, error_message) after deleting it."""
+        verdict = self._verify_output(job, finished_output_path)
+        if not verdict.passed:
+            self._delete_partial_output(finished_output_path)
+            self.listener.job_progress(job, 0, f"{job.display_name} (Failed)")
+            return False, f"Output verification failed: {verdict.summary()}"
+        if job.staged_source:
+            # One sequential write to the library; the temp name keeps it invisible meanwhile
+            library_temp_path = temp_output_path(job.output_path)
+            self.listener.job_progress(
+                job, 100, f"{job.display_name}: Copying to the library..."
+            )
+            try:
+                copy_file(finished_output_path, library_temp_path)
+                # The verdict is of the scratch copy; the library copy must match it
+                copied_bytes = os.path.getsize(library_temp_path)
+                verified_bytes = os.path.getsize(finished_output_path)
+                if copied_bytes != verified_bytes:
+                    raise OSError(
+                        f"copied {copied_bytes} of {verified_bytes} bytes"
+                    )
+            except OSError as e:
+                self._delete_partial_output(library_temp_path)
+                job.verdict.add("copy", False, str(e))
+                return False, f"Could not copy the output to {job.output_path}: {e}"
+            # The scratch copy goes when the worker releases the staged source
+            finished_output_path = library_temp_path
+        try:
+            commit_output(finished_output_path, job.output_path)
+        except OSError as e:
+            self._delete_partial_output(finished_output_path)
+            return False, f"Could not rename the output to {job.output_path}: {e}"
+        self.log_message(
+            f"Successfully converted and verified: {job.output_path}", "INFO"
+        )
+        return True, job.output_path
+
+    def _verify_output(self, job, output_file_path):
+        """Verifies output_file_path against the job's source (see verification.py).
+        Sets job.verdict, records it in the verdicts file and returns it."""
+        self.listener.job_progress(job, 100, f"{job.display_name}: Verifying...")
+        verdict = verify_output(
+            self.ffmpeg_exec_path,
+            get_ffprobe_path(self.ffmpeg_exec_path),
+            output_file_path,
+            job.media_info,
+            job.input_path,
+        )
+        verdict.output_path = job.output_path  # Recorded under its final name
+        job.verdict = verdict
+        if self.verdict_log:
+            try:
+                self.verdict_log.record(verdict)
+            except OSError as e:
+                self.log_message(
+                    f"Could not record the verdict of {job.input_path}: {e}", "WARN"
+                )
+        if verdict.passed:
+            self.log_message(f"Verified {job.output_path}: {verdict.summary()}", "INFO")
+        else:
+            self.log_message(
+                f"Verification FAILED for {job.output_path}: {verdict.summary()}", "WARN"
+            )
+            self.listener.status_changed(
+                f"Status: Verified {os.path.basename(job.output_path)} - FAILED."
+            )
+        return verdict
+
+    def _delete_verified_original(self, current_file_path, verdict):
+        """Deletes the source of a verified conversion if auto-delete is on and the
+        verdict of its output passed."""
+        current_file_path_normalized = os.path.normpath(current_file_path)
+        if self.auto_delete_verified_originals and not (verdict and verdict.passed):
+            self.log_message(
+                f"Original file not deleted, its output has no passed verification: {current_file_path_normalized}",
+                "WARN",
+            )
+        elif self.auto_delete_verified_originals:
+            try:
+                self.log_message(
+                    f"Attempting to delete original file: {current_file_path_normalized}",
+                    "INFO",
+                )
+                os.remove(
+                    current_file_path_normalized
+                )  # Use normalized path for consistency
+                self.log_message(
+                    f"Successfully deleted original file: {current_file_path_normalized}",
+                    "INFO",
+                )
+                self.listener.status_changed(
+                    f"Status: Deleted original {os.path.basename(current_file_path_normalized)}."
+                )
+            except OSError as e:
+                self.log_message(
+                    f"Error deleting original file {current_file_path_normalized}: {e}",
+                    "ERROR",
+                )
+                self.listener.error(
+                    "Deletion Error",
+                    f"Could not delete original file: {current_file_path_normalized}\nError: {e}",
+                )
+                self.listener.status_changed(
+                    f"Status: Error deleting {os.path.basename(current_file_path_normalized)}."
+                )
+        else:
+            self.log_message(
+                f"Original file not deleted (auto-delete is off): {current_file_path_normalized}",
+                "INFO",
+            )
+            self.listener.status_changed(
+                "Status: Original not deleted (auto-delete off)."
+            )
+
+    def convert_file(self, input_mkv, retry_level=0, job=None):
+        """Converts a single file. Returns (True, output_path) on success, (False, error_message) on failure."""
+        if job is None:
+            job = ConversionJob(next(self.job_id_counter), input_mkv, retry_level)
+        if not self.ffmpeg_exec_path:
+            return False, "FFmpeg path is not set."
+        if (
+            self.cancel_requested or job.cancel_requested
+        ):  # Check at the very start of conversion attempt
+            return False, "Conversion cancelled by user."
+
+        # Step 1: Probe duration, streams and codecs once using ffprobe (part of FFmpeg)
+        duration_seconds = 0
+        media_info = None
+        try:
+            self.listener.job_progress(job, 0, f"{job.display_name}: Probing...")
+            media_info = self.get_media_info(input_mkv)
+            job.media_info = media_info
+            if self.log_enabled("DEBUG"):
+                self.log_message(f"Probed {input_mkv}: {media_info.summary()}", "DEBUG")
+            duration_seconds = media_info.duration
+            if duration_seconds <= 0:
+                self.log_message(
+                    f"Warning: Could not determine valid duration for {input_mkv}. Individual progress may be inaccurate.",
+                    "WARN",
+                )
+                duration_seconds = (
+                    0  # Progress falls back to the frame count, if it is known
+                )
+        except Exception as e:
+            self.log_message(
+                f"Error probing {input_mkv}: {e}. Individual progress may be inaccurate.",
+                "ERROR",
+            )
+            # Proceed without duration, progress will be indeterminate or jumpy for this file
+            duration_seconds = 0
+        total_frames = media_info.frame_count if media_info else None
+
+        # Step 2: Copy the source to the local scratch folder, if staging is on
+        ffmpeg_input = input_mkv
+        if self.scratch_stager:
+            ffmpeg_input = self._stage_source(job, input_mkv)
+            if self.cancel_requested or job.cancel_requested:
+                return False, "Conversion cancelled by user."
+
+        # Set before the try, the exception handler reports it
+        error_prefix = f"(Retry Level {retry_level}) " if retry_level else ""
+
+        try:
+            output_format_selected = self.output_format
+            output_file_path = ""
+            profile = self._select_profile(job.profile_name, input_mkv, retry_level)
+            # Step 3: Sampled decode of the source, so a damaged file is converted
+            # error-tolerantly from the start instead of failing near the end
+            if (
+                self.use_preflight_check
+                and not profile.error_tolerant
+                and duration_seconds
+            ):
+                profile = self._preflight_profile(
+                    job, ffmpeg_input, duration_seconds, profile
+                )
+                if self.cancel_requested or job.cancel_requested:
+                    return False, "Conversion cancelled by user."
+
+            # Video encoder options of a re-encode that can be segmented
+            segment_video_args = None
+            if output_format_selected == "MP4 (H.264 + AAC)":
+                job.output_path = output_path_for(input_mkv, retry_level)
+                output_file_path = (
+                    job.staged_source.output_path
+                    if job.staged_source
+                    else temp_output_path(job.output_path)
+                )
+                job.temp_output_path = output_file_path
+
+                # Recovery profiles re-encode everything; others copy whatever
+                # streams MP4 can hold as-is
+                stream_plan = None
+                if profile.remux and self.use_fast_remux:
+                    stream_plan = plan_mp4_streams(
+                        media_info.streams if media_info else []
+                    )
+                    if stream_plan:
+                        self.log_message(
+                            f"Stream plan for {input_mkv}: {describe_stream_plan(stream_plan)}",
+                            "INFO",
+                        )
+
+                if stream_plan and stream_plan["video"][1]:
+                    # Video is copied, so the profile's encoder doesn't apply
+                    self.log_message(
+                        f"Remuxing {input_mkv} without re-encoding video", "INFO"
+                    )
+                else:
+                    self.log_message(
+                        f"Encoding {input_mkv} with profile '{profile.name}' ({profile.describe()})",
+                        "INFO",
+                    )
+                    if not profile.error_tolerant:  # Damaged files aren't split
+                        segment_video_args = profile.video_args()
+            else:
+                return (
+                    False,
+                    f"{error_prefix}Invalid output format selected or no format handler for '{output_format_selected}'.",
+                )
+
+            current_file_display_name = job.display_name
+
+            if (
+                segment_video_args is not None
+                and (self.use_resumable_encoding or self.segment_parallel_jobs > 1)
+                and duration_seconds
+                > segment_length(duration_seconds, self.segment_parallel_jobs) * 1.5
+            ):
+                return self._convert_segmented(
+                    job,
+                    input_mkv,
+                    output_file_path,
+                    segment_video_args,
+                    stream_plan,
+                    media_info,
+                    profile,
+                )
+
+            # A failed run is retried with the cheapest fix for what went wrong,
+            # each fix at most once (see failures.py)
+            applied_fixes = []
+            while True:
+                ffmpeg_cmd = self._build_ffmpeg_cmd(
+                    ffmpeg_input, output_file_path, profile, stream_plan, applied_fixes
+                )
+                self.listener.job_progress(
+                    job, 0, f"{current_file_display_name}: Converting..."
+                )
+                return_code, error_output_lines = self._run_ffmpeg(
+                    job,
+                    ffmpeg_cmd,
+                    lambda progress: self._report_ffmpeg_progress(
+                        job, progress, duration_seconds, total_frames
+                    ),
+                )
+                if return_code is None:  # Cancelled
+                    # Clean up partially converted file if it exists
+                    self._delete_partial_output(output_file_path)
+                    return False, error_output_lines[0]
+
+                if return_code == 0:
+                    if applied_fixes:
+                        self.log_message(
+                            f"Converted {input_mkv} with {self._describe_fixes(applied_fixes)}.",
+                            "INFO",
+                        )
+                    self.listener.job_progress(
+                        job, 100, f"{current_file_display_name} (Completed)"
+                    )
+                    return True, output_file_path
+
+                self._delete_partial_output(output_file_path)
+                failure_category, failure_line = classify_failure(
+                    error_output_lines, media_info.streams if media_info else None
+                )
+                if job.watchdog_message and failure_category == CORRUPT_PACKETS:
+                    break  # Skipping corrupt packets would hit the same errors
+                fix = choose_fix(
+                    failure_category, applied_fixes, stream_plan, profile.error_tolerant
+                )
+                if fix is None:
+                    break
+                self.log_message(
+                    f"FFmpeg failed on {input_mkv}: {CATEGORY_LABELS[failure_category].lower()}"
+                    + (f" ({failure_line})" if failure_line else "")
+                    + f". Retrying with {FIX_DESCRIPTIONS[fix]}.",
+                    "WARN",
+                )
+                applied_fixes.append(fix)
+
+            concise_error = (
+                "\n".join(error_output_lines[-5:])
+                if error_output_lines
+                else "Unknown FFmpeg error"
+            )
+            self.listener.job_progress(job, 0, f"{current_file_display_name} (Failed)")
+            return (
+                False,
+                f"{error_prefix}[{CATEGORY_LABELS[failure_category]}] FFmpeg failed (code {return_code})"
+                + (
+                    f" also with {self._describe_fixes(applied_fixes)}"
+                    if applied_fixes
+                    else ""
+                )
+                + f". Error: ...{concise_error}",
+            )
+
+        except Exception as e:
+            current_file_display_name = (
+                job.display_name
+            )  # Ensure suffix for error message
+            self.listener.job_progress(job, 0, f"{current_file_display_name} (Error)")
+            return False, f"{error_prefix}Exception during conversion: {str(e)}"
+        finally:
+            job.is_paused = False
+
+    def _preflight_profile(self, job, ffmpeg_input, duration_seconds, profile):
+        """profile if the sampled windows of the source decode cleanly, else the
+        Level 1 profile."""
+        self.listener.job_progress(job, 0, f"{job.display_name}: Checking source...")
+        started = time.monotonic()
+        damage = find_damage(
+            self.ffmpeg_exec_path,
+            ffmpeg_input,
+            duration_seconds,
+            lambda: self.cancel_requested or job.cancel_requested,
+        )
+        if damage is None:
+            if self.log_enabled("DEBUG"):
+                self.log_message(
+                    f"Pre-flight check of {job.input_path} passed in {time.monotonic() - started:.1f}s.",
+                    "DEBUG",
+                )
+            return profile
+        damage_start, error_line = damage
+        tolerant_profile = self.profile_registry.retry_profile(
+            1, self.use_gpu_acceleration
+        )
+        self.log_message(
+            f"Pre-flight check found damage in {job.input_path} at {format_duration(damage_start)} "
+            f"({error_line}); converting with profile '{tolerant_profile.name}'.",
+            "WARN",
+        )
+        return tolerant_profile
+
+    def _build_ffmpeg_cmd(
+        self, ffmpeg_input, output_file_path, profile, stream_plan, fixes=()
+    ):
+        """The single-pass ffmpeg command of a conversion with a profile, a stream
+        plan (None re-encodes with ffmpeg's default streams) and failure fixes."""
+        # Machine-readable progress on stdout instead of the stderr stats line
+        ffmpeg_cmd = [self.ffmpeg_exec_path, "-nostats", "-progress", "pipe:1"]
+        # Input related flags that can help with problematic files (especially for retries)
+        ffmpeg_cmd.extend(profile.input_args)
+        ffmpeg_cmd.extend(fix_input_args(fixes))
+        ffmpeg_cmd.extend(["-i", ffmpeg_input])
+        stream_plan = fixed_stream_plan(stream_plan, fixes)
+        if stream_plan and stream_plan["video"][1]:
+            ffmpeg_cmd.extend(
+                build_stream_plan_args(stream_plan, [], profile.audio_bitrate)
+            )
+        elif stream_plan:  # Copy compatible audio/subtitle streams
+            ffmpeg_cmd.extend(
+                build_stream_plan_args(
+                    stream_plan, profile.video_args(), profile.audio_bitrate
+                )
+            )
+        else:
+            ffmpeg_cmd.extend(profile.video_args())
+            ffmpeg_cmd.extend(["-c:a", "aac", "-b:a", profile.audio_bitrate])
+        ffmpeg_cmd.extend(fix_output_args(fixes, stream_plan))
+        ffmpeg_cmd.extend(profile.error_args())
+        ffmpeg_cmd.extend(["-y", output_file_path])
+        return ffmpeg_cmd
+
+    @staticmethod
+    def _describe_fixes(fixes):
+        return ", ".join(FIX_DESCRIPTIONS[fix] for fix in fixes)
+
+    def _run_ffmpeg(self, job, ffmpeg_cmd, on_progress):
+        """Runs one ffmpeg process for a job, handling per-job and batch pause and cancel.
+
+        on_progress(progress) gets each -progress snapshot. Returns (return_code,
+        last_stderr_lines); return_code is None if the job or the batch was cancelled,
+        and the only line is the reason. If the error-rate watchdog stops ffmpeg, the
+        reason is the last line and also kept in job.watchdog_message.
+        """
+        job.watchdog_message = None
+        watchdog = (
+            ErrorRateWatchdog(self.watchdog_errors_per_minute)
+            if self.watchdog_errors_per_minute > 0
+            else None
+        )
+        job.process = subprocess.Popen(
+            ffmpeg_cmd,
+            stdin=subprocess.PIPE,  # For sending pause/resume commands
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            creationflags=SUBPROCESS_CREATION_FLAGS,
+        )
+        try:
+            # stderr only carries warnings/errors now (-nostats). It is drained by a
+            # helper thread and only the last lines are kept for the error message.
+            error_output_lines = collections.deque(maxlen=200)
+            stderr_thread = threading.Thread(
+                target=collect_stream_lines,
+                args=(
+                    job.process.stderr,
+                    error_output_lines,
+                    watchdog.feed_line if watchdog else None,
+                ),
+                daemon=True,
+            )
+            stderr_thread.start()
+            progress_parser = FFmpegProgressParser()
+
+            while True:
+                if self.cancel_requested or job.cancel_requested:
+                    self.log_message(
+                        f"Cancellation requested during active conversion of {job.input_path}.",
+                        "INFO",
+                    )
+                    self._terminate_job_process(job, "cancellation")
+                    return None, ["Conversion cancelled by user."]
+
+                # This is the GUI-level pause check; psutil pause is handled by
+                # toggle_job_pause/toggle_pause_resume, which also set job.is_paused.
+                while job.is_paused:
+                    if (
+                        self.cancel_requested or job.cancel_requested
+                    ):  # Re-check cancel during this inner pause loop
+                        self.log_message(
+                            f"Cancellation requested during pause for {job.input_path}.",
+                            "INFO",
+                        )
+                        self._resume_job(job)
+                        self._terminate_job_process(job, "cancellation during pause")
+                        return None, ["Conversion cancelled during pause."]
+                    time.sleep(0.1)
+
+                line = job.process.stdout.readline()
+                if not line:
+                    break  # EOF: ffmpeg exited
+                progress = progress_parser.feed_line(line)
+                if progress is None:
+                    continue  # Block not complete yet
+                on_progress(progress)
+                if progress["ended"]:
+                    break
+                if watchdog and watchdog.tripped(progress["out_time_us"]):
+                    job.watchdog_message = (
+                        f"Stopped by the error watchdog: {watchdog.describe(progress['out_time_us'])}"
+                    )
+                    self.log_message(f"{job.input_path}: {job.watchdog_message}", "WARN")
+                    self._terminate_job_process(job, "error watchdog")
+                    stderr_thread.join(timeout=5)
+                    return job.process.wait() or 1, list(error_output_lines) + [
+                        job.watchdog_message
+                    ]
+
+            return_code = job.process.wait()
+            stderr_thread.join(timeout=5)  # Collect the remaining stderr output
+            return return_code, list(error_output_lines)
+        finally:
+            if job.process.poll() is None:  # Ensure Popen process is cleaned up
+                if job.psutil_process:
+                    # A suspended process can't handle SIGTERM, so resume it first
+                    self._resume_job(job)
+                self._terminate_job_process(job, "finally block", timeout=2)
+            job.process = None
+            job.psutil_process = None
+
+    def _convert_segmented(
+        self,
+        job,
+        input_mkv,
+        output_file_path,
+        video_encode_args,
+        stream_plan,
+        media_info,
+        profile,
+    ):
+        """Encodes the video in segments and muxes them into the MP4 (see segments.py).
+
+        Up to segment_parallel_jobs segments are encoded at once, each by its own
+        ffmpeg process. With resumable encoding, segments finished by an earlier,
+        interrupted attempt are reused and the work folder is kept on cancel; it is
+        removed on failure and success.
+        """
+        duration_seconds = media_info.duration
+        parallel_segments = max(1, self.segment_parallel_jobs)
+        segment_seconds = segment_length(duration_seconds, parallel_segments)
+        work_dir = SegmentWorkDir(
+            job.output_path,  # Stable across attempts, unlike the temporary output
+            {
+                "source": ProbeCache.fingerprint(input_mkv),
+                "video_args": video_encode_args,
+                "input_args": profile.input_args,
+                "audio_bitrate": profile.audio_bitrate,
+                "stream_plan": stream_plan,
+                "segment_seconds": segment_seconds,
+            },
+        )
+        reused_count = work_dir.open()
+        segments = plan_segments(duration_seconds, segment_seconds)
+        parallel_segments = min(parallel_segments, len(segments))
+        self.log_message(
+            f"Segmented encoding of {input_mkv}: {len(segments)} segment(s) of up to {format_duration(segment_seconds)}, "
+            f"{parallel_segments} at a time, in {work_dir.path}"
+            + (f", {reused_count} part(s) finished earlier" if reused_count else ""),
+            "INFO",
+        )
+
+        base_cmd = [self.ffmpeg_exec_path, "-nostats", "-progress", "pipe:1"]
+        base_cmd.extend(profile.input_args)
+        if stream_plan:
+            video_map = f"0:{stream_plan['video'][0]}"
+            audio_subtitle_args = build_audio_subtitle_args(
+                stream_plan, profile.audio_bitrate
+            )
+        else:  # Same streams as a single-pass conversion without a plan
+            video_map = "0:v:0"
+            audio_subtitle_args = (
+                ["-vn", "-c:a", "aac", "-b:a", profile.audio_bitrate]
+                if media_info.audio_streams
+                else []
+            )
+        # Software encoders size their thread pool for the whole machine; split the
+        # cores between the concurrent processes instead of oversubscribing them
+        thread_args = []
+        if parallel_segments > 1 and not profile.is_hardware:
+            thread_args = [
+                "-threads",
+                str(max(1, (os.cpu_count() or 1) // parallel_segments)),
+            ]
+
+        # Audio and subtitles are converted once for the whole file, so there
+        # are no gaps or overlaps at the segment boundaries
+        parts = collections.deque()
+        ffmpeg_input = job.staged_source.local_path if job.staged_source else input_mkv
+        if audio_subtitle_args:
+            parts.append(
+                (
+                    "audio",
+                    base_cmd
+                    + ["-i", ffmpeg_input]
+                    + audio_subtitle_args
+                    + ["-y", work_dir.part_path("audio")],
+                    "Converting audio and subtitles",
+                )
+            )
+        for segment_number, (start, length) in enumerate(segments):
+            segment_cmd = base_cmd + ["-ss", f"{start:.3f}", "-i", ffmpeg_input]
+            if length is not None:
+                segment_cmd.extend(["-t", f"{length:.3f}"])
+            segment_cmd.extend(["-map", video_map] + video_encode_args + thread_args)
+            segment_cmd.extend(
+                ["-an", "-sn", "-dn", "-y", work_dir.part_path(segment_number)]
+            )
+            parts.append(
+                (
+                    segment_number,
+                    segment_cmd,
+                    f"Segment {segment_number + 1}/{len(segments)}",
+                )
+            )
+
+        def part_seconds(segment_number):
+            start, length = segments[segment_number]
+            return length if length is not None else max(duration_seconds - start, 0)
+
+        for part in list(parts):
+            if work_dir.is_done(part[0]):
+                parts.remove(part)
+        # Shared by the segment workers, guarded by parts_lock
+        parts_lock = threading.Lock()
+        done_seconds = sum(
+            part_seconds(segment_number)
+            for segment_number in range(len(segments))
+            if work_dir.is_done(segment_number)
+        )
+        running_progress = {}  # Segment number -> latest -progress snapshot
+        failures = []  # (part_label, return_code, stderr lines) of a failed or cancelled part
+
+        def report_combined_progress():
+            with parts_lock:
+                snapshots = list(running_progress.values())
+                out_seconds = done_seconds
+            out_us = out_seconds * 1000000 + sum(
+                snapshot["out_time_us"] or 0 for snapshot in snapshots
+            )
+            # The processes run side by side, so their throughput adds up
+            combined = {
+                "out_time_us": out_us,
+                "fps": sum(snapshot["fps"] or 0 for snapshot in snapshots),
+                "speed": sum(snapshot["speed"] or 0 for snapshot in snapshots),
+                "total_size": None,
+                "frame": None,
+                "ended": False,
+            }
+            self._report_ffmpeg_progress(job, combined, duration_seconds, None)
+
+        def encode_parts():
+            """Segment worker: encodes parts until none are left, one fails or the job is cancelled."""
+            nonlocal done_seconds
+            while True:
+                with parts_lock:
+                    if not parts or failures:
+                        return
+                    part_name, part_cmd, part_label = parts.popleft()
+                part_job = ConversionJob(job.job_id, job.input_path, job.retry_level)
+                with self.job_lock:
+                    job.segment_jobs.append(part_job)
+                    # cancel_job sets the flag before it walks segment_jobs
+                    part_job.cancel_requested = job.cancel_requested
+                while job.is_paused and not (
+                    self.cancel_requested or part_job.cancel_requested
+                ):
+                    time.sleep(0.1)  # Don't start a segment while the job is paused
+                if parallel_segments == 1:
+                    self.listener.job_progress(
+                        job,
+                        done_seconds / duration_seconds * 100,
+                        f"{job.display_name}: {part_label}...",
+                    )
+
+                def report_part_progress(progress):
+                    if part_name == "audio":
+                        return  # Only the video segments count towards the percentage
+                    with parts_lock:
+                        running_progress[part_name] = progress
+                    report_combined_progress()
+
+                try:
+                    return_code, error_output_lines = self._run_ffmpeg(
+                        part_job, part_cmd, report_part_progress
+                    )
+                finally:
+                    with self.job_lock:
+                        job.segment_jobs.remove(part_job)
+                if return_code != 0:
+                    with parts_lock:
+                        failures.append((part_label, return_code, error_output_lines))
+                    self._delete_partial_output(work_dir.part_path(part_name))
+                    # One broken segment makes the file fail; stop the other segments
+                    with self.job_lock:
+                        for other_job in job.segment_jobs:
+                            other_job.cancel_requested = True
+                    return
+                try:
+                    work_dir.mark_done(part_name)
+                except OSError as e:  # The part is kept, only resuming can't reuse it
+                    self.log_message(
+                        f"Could not record {part_label.lower()} of {job.display_name} in the manifest: {e}",
+                        "WARN",
+                    )
+                with parts_lock:
+                    running_progress.pop(part_name, None)
+                    if part_name != "audio":
+                        done_seconds += part_seconds(part_name)
+
+        if parallel_segments == 1:
+            encode_parts()
+        else:
+            self.listener.job_progress(
+                job,
+                done_seconds / duration_seconds * 100,
+                f"{job.display_name}: Encoding {len(parts)} part(s), {parallel_segments} at a time...",
+            )
+            segment_workers = [
+                threading.Thread(
+                    target=encode_parts,
+                    name=f"SegmentWorker-{job.job_id}-{worker_number}",
+                    daemon=True,
+                )
+                for worker_number in range(1, parallel_segments + 1)
+            ]
+            for segment_worker in segment_workers:
+                segment_worker.start()
+            for segment_worker in segment_workers:
+                segment_worker.join()
+
+        if self.cancel_requested or job.cancel_requested:
+            if self.use_resumable_encoding:
+                self.log_message(
+                    f"Kept {len(work_dir.completed)} finished part(s) of {job.display_name} in {work_dir.path}; the next attempt resumes there.",
+                    "INFO",
+                )
+            else:
+                work_dir.remove()
+            return False, "Conversion cancelled by user."
+        if failures:
+            work_dir.remove()
+            # The first failure is the cause; the others were stopped because of it
+            part_label, return_code, error_output_lines = failures[0]
+            concise_error = "\n".join(error_output_lines[-5:]) or "Unknown FFmpeg error"
+            self.listener.job_progress(job, 0, f"{job.display_name} (Failed)")
+            failure_category, _ = classify_failure(
+                error_output_lines, job.media_info.streams if job.media_info else None
+            )
+            return (
+                False,
+                f"[{CATEGORY_LABELS[failure_category]}] FFmpeg failed on {part_label.lower()} (code {return_code}). Error: ...{concise_error}",
+            )
+
+        # Lossless join of the segments, muxed with the audio and subtitles
+        self.listener.job_progress(job, 100, f"{job.display_name}: Joining segments...")
+        mux_cmd = base_cmd + [
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            work_dir.write_concat_list(len(segments)),
+        ]
+        if audio_subtitle_args:
+            mux_cmd.extend(["-i", work_dir.part_path("audio"), "-map", "0:v", "-map", "1"])
+        mux_cmd.extend(
+            ["-c", "copy", "-movflags", "+faststart", "-y", output_file_path]
+        )
+        return_code, error_output_lines = self._run_ffmpeg(job, mux_cmd, lambda p: None)
+        if return_code is None:  # Cancelled
+            self._delete_partial_output(output_file_path)
+            if not self.use_resumable_encoding:
+                work_dir.remove()
+            return False, error_output_lines[0]
+        if return_code != 0:
+            concise_error = "\n".join(error_output_lines[-5:]) or "Unknown FFmpeg error"
+            self._delete_partial_output(output_file_path)
+            self.listener.job_progress(job, 0, f"{job.display_name} (Failed)")
+            failure_category, _ = classify_failure(
+                error_output_lines, job.media_info.streams if job.media_info else None
+            )
+            return (
+                False,
+                f"[{CATEGORY_LABELS[failure_category]}] FFmpeg failed joining the segments (code {return_code}). Error: ...{concise_error}",
+            )
+        work_dir.remove()
+        self.listener.job_progress(job, 100, f"{job.display_name} (Completed)")
+        return True, output_file_path
+
+    def _report_ffmpeg_progress(self, job, progress, duration_seconds, total_frames):
+        """Turns one -progress snapshot into the job row's percentage, throughput and ETA."""
+        out_seconds = (progress["out_time_us"] or 0) / 1000000
+        frame = progress["frame"]
+        fps = progress["fps"]
+        speed = progress["speed"]
+        job.fps = fps
+        if progress["total_size"]:
+            job.output_bytes = progress["total_size"]
+
+        progress_percent = None
+        eta_seconds = None
+        if duration_seconds > 0:
+            progress_percent = min(out_seconds / duration_seconds * 100, 100)
+            if speed:
+                eta_seconds = max(duration_seconds - out_seconds, 0) / speed
+        elif total_frames and frame is not None:  # No duration, use the probed frame count
+            progress_percent = min(frame / total_frames * 100, 100)
+            if fps:
+                eta_seconds = max(total_frames - frame, 0) / fps
+
+        details = []
+        if progress_percent is not None:
+            details.append(f"{progress_percent:.1f}%")
+        else:
+            details.append(f"at {format_duration(out_seconds)}")
+        if fps:
+            details.append(f"{fps:.0f} fps")
+        if speed:
+            details.append(f"{speed:.2f}x")
+        if progress["total_size"]:
+            details.append(f"{progress['total_size'] / (1024 * 1024):.0f} MB")
+        if eta_seconds is not None:
+            details.append(f"ETA {format_duration(eta_seconds)}")
+        self.listener.job_progress(
+            job,
+            progress_percent if progress_percent is not None else 0,
+            f"{job.display_name} ({', '.join(details)})",
+        )
+
+    def get_media_info(self, input_path):
+        """Returns the MediaInfo of input_path, running ffprobe only if the probe cache has no current entry."""
+        fingerprint = ProbeCache.fingerprint(input_path)
+        if self.probe_cache:
+            try:
+                media_info = self.probe_cache.get(input_path, fingerprint)
+                if media_info:
+                    return media_info
+            except sqlite3.Error as e:
+                self.log_message(f"Probe cache read error for {input_path}: {e}", "WARN")
+        media_info = probe_media(get_ffprobe_path(self.ffmpeg_exec_path), input_path)
+        if self.probe_cache:
+            try:
+                self.probe_cache.put(media_info, fingerprint)
+            except sqlite3.Error as e:
+                self.log_message(
+                    f"Probe cache write error for {input_path}: {e}", "WARN"
+                )
+        return media_info
+
+    def _terminate_job_process(self, job, context, timeout=1):
+        """Terminates the job's ffmpeg process if it is still running, killing it if it doesn't exit in time."""
+        with self.job_lock:
+            segment_jobs = list(job.segment_jobs)
+        for segment_job in segment_jobs:
+            self._terminate_job_process(segment_job, context, timeout)
+        process = job.process
+        if not process:
+            return
+        try:
+            if process.poll() is None:  # If still running
+                self.log_message(
+                    f"Terminating FFmpeg process {process.pid} for {job.input_path} ({context}).",
+                    "INFO",
+                )
+                process.terminate()
+                try:
+                    process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    self.log_message(
+                        f"FFmpeg process {process.pid} did not terminate, killing.",
+                        "WARN",
+                    )
+                    process.kill()
+                    process.wait(timeout=timeout)
+        except OSError as e:
+            self.log_message(
+                f"OSError while terminating/killing FFmpeg ({context}): {e}", "ERROR"
+            )
+        except Exception as e:  # Catch any other potential errors
+            self.log_message(
+                f"Exception while terminating/killing FFmpeg ({context}): {e}", "ERROR"
+            )
+
+    def _delete_partial_output(self, output_file_path):
+        if output_file_path and os.path.exists(output_file_path):
+            try:
+                os.remove(output_file_path)
+                self.log_message(
+                    f"Deleted partially converted file: {output_file_path}",
+                    "INFO",
+                )
+            except OSError as e:
+                self.log_message(
+                    f"Error deleting partial file {output_file_path}: {e}",
+                    "ERROR",
+                )
+
+    def _suspend_job(self, job):
+        """Suspends the job's ffmpeg process. Returns True if it is now paused."""
+        with self.job_lock:
+            segment_jobs = list(job.segment_jobs)
+        if segment_jobs:  # Segments encoded by several processes
+            suspended = [self._suspend_job(segment_job) for segment_job in segment_jobs]
+            job.is_paused = any(suspended)
+            return job.is_paused
+        if not job.process or not job.process.pid:
+            return False
+        try:
+            if not job.psutil_process:  # Create if it doesn't exist or was cleared
+                job.psutil_process = psutil.Process(job.process.pid)
+            if job.psutil_process.status() in (
+                psutil.STATUS_RUNNING,
+                psutil.STATUS_SLEEPING,
+            ):
+                job.psutil_process.suspend()
+                job.is_paused = True
+                self.log_message(
+                    f"FFmpeg process {job.process.pid} ({job.display_name}) suspended.",
+                    "INFO",
+                )
+                return True
+            self.log_message(
+                f"FFmpeg process for {job.display_name} is not in a running/suspendable state ({job.psutil_process.status()}).",
+                "WARN",
+            )
+        except psutil.NoSuchProcess:
+            self.log_message(
+                f"FFmpeg process for {job.display_name} not found. It might have finished or crashed.",
+                "WARN",
+            )
+            job.psutil_process = None
+        except Exception as e:
+            self.log_message(f"Error suspending process: {e}", "ERROR")
+        return False
+
+    def _resume_job(self, job):
+        """Resumes the job's ffmpeg process if it is suspended. Returns True if it is no longer paused."""
+        with self.job_lock:
+            segment_jobs = list(job.segment_jobs)
+        if segment_jobs:
+            for segment_job in segment_jobs:
+                self._resume_job(segment_job)
+            job.is_paused = False
+            return True
+        if not job.psutil_process:
+            job.is_paused = False
+            return True
+        try:
+            if (
+                job.psutil_process.status() == psutil.STATUS_STOPPED
+            ):  # STATUS_STOPPED is what psutil uses for suspended
+                job.psutil_process.resume()
+                self.log_message(
+                    f"FFmpeg process {job.psutil_process.pid} ({job.display_name}) resumed.",
+                    "INFO",
+                )
+            job.is_paused = False
+            return True
+        except psutil.NoSuchProcess:
+            self.log_message(
+                f"FFmpeg process for {job.display_name} not found while resuming.",
+                "WARN",
+            )
+            job.psutil_process = None
+            job.is_paused = False
+            return True
+        except Exception as e:
+            self.log_message(f"Error resuming process: {e}", "ERROR")
+        return False
+
+    def _get_active_jobs(self):
+        with self.job_lock:
+            return list(self.active_jobs.values())
+
+    # --- Pause, cancel and shutdown ---
+
+    def toggle_job_pause(self, job_id):
+        """Pauses or resumes one active job. Returns False if the job could not be paused."""
+        with self.job_lock:
+            job = self.active_jobs.get(job_id)
+        if not job:
+            return True
+        if not job.is_paused:
+            if not self._suspend_job(job):
+                return False
+            self.listener.job_paused(job, True)
+        elif self._resume_job(job):
+            self.listener.job_paused(job, False)
+        return True
+
+    def cancel_job(self, job_id):
+        """Cancels one active job. The file stays in the queue."""
+        with self.job_lock:
+            job = self.active_jobs.get(job_id)
+        if not job:
+            return False
+        job.cancel_requested = True
+        with self.job_lock:
+            for segment_job in job.segment_jobs:
+                segment_job.cancel_requested = True
+        if job.is_paused:  # If paused by psutil, resume first so it can be terminated
+            self._resume_job(job)
+        return True
+
+    def pause_batch(self):
+        """Suspends all active jobs; workers don't start new files while the batch is paused. Returns the number of suspended processes."""
+        self.is_paused = True
+        suspended_count = 0
+        for job in self._get_active_jobs():
+            if job.is_paused or self._suspend_job(job):
+                suspended_count += 1
+                self.listener.job_paused(job, True)
+        return suspended_count
+
+    def resume_batch(self):
+        for job in self._get_active_jobs():
+            if job.is_paused and self._resume_job(job):
+                self.listener.job_paused(job, False)
+        self.is_paused = False
+
+    def cancel_batch(self):
+        self.cancel_requested = True
+        for job in self._get_active_jobs():
+            if job.is_paused:  # If paused by psutil, resume first
+                self._resume_job(job)
+                self.log_message(
+                    f"Resumed {job.display_name} before cancelling.", "INFO"
+                )
+        self.is_paused = False  # Ensure not stuck in a paused state
+        # The convert_file loops will check cancel_requested and terminate their Popen processes.
+
+    def shutdown(self, timeout=5):
+        """Stops monitoring, cancels a running batch and waits for the threads to finish."""
+        self.is_monitoring_plex = False  # Stop monitoring thread as well
+        if self.is_converting:
+            self.cancel_requested = True
+            for job in self._get_active_jobs():
+                if job.is_paused:  # If paused by psutil, resume first
+                    self.log_message(
+                        f"Attempting to resume {job.display_name} before closing app.",
+                        "INFO",
+                    )
+                    self._resume_job(job)
+                self._terminate_job_process(job, "closing app", timeout=timeout)
+            self.is_paused = False  # Ensure not stuck paused
+
+            if self.conversion_thread and self.conversion_thread.is_alive():
+                self.log_message(
+                    "Waiting for conversion thread to join on closing app.", "INFO"
+                )
+                self.conversion_thread.join(timeout=timeout)  # Wait for thread to finish
+                if self.conversion_thread.is_alive():
+                    self.log_message(
+                        "Conversion thread did not join in time on closing app.",
+                        "WARN",
+                    )
+
+        if self.plex_monitoring_thread and self.plex_monitoring_thread.is_alive():
+            self.log_message(
+                "Waiting for Plex monitoring thread to join on closing app.", "INFO"
+            )
+            self.plex_monitoring_thread.join(timeout=timeout)
+            if self.plex_monitoring_thread.is_alive():
+                self.log_message(
+                    "Plex monitoring thread did not join in time on closing app.",
+                    "WARN",
+                )
+
+        if self.probe_cache:
+            self.probe_cache.close()
+            self.probe_cache = None
+        self.library_scanner.close()
+        if self.verdict_log:
+            self.verdict_log.close()
+        self.jobs.close()  # The in-memory queue can still be saved to the state file
+
+    # --- Folder scanning and monitoring ---
+
+    def find_unconverted_files(self, directory):
+        """Returns the videos below directory that have no MP4 version next to them yet."""
+        files_found_to_convert = self.library_scanner.find_unconverted_files(
+            directory,
+            on_error=lambda path, e: self.log_message(
+                f"Plex Scan: Could not read '{path}': {e}", "WARN"
+            ),
+        )
+        scan_stats = self.library_scanner.last_scan_stats
+        self._remove_stale_leftovers(self.library_scanner.last_scan_leftovers)
+        if self.log_enabled("DEBUG"):
+            self.log_message(
+                f"Plex Scan: {scan_stats['listed']} folder(s) read, {scan_stats['reused']} unchanged folder(s) taken from the index, {scan_stats['unconverted']} unconverted file(s).",
+                "DEBUG",
+            )
+        return files_found_to_convert
+
+    def scan_directory_and_add(self, directory=None):
+        """Queues the unconverted videos below directory (default: the monitored folder).
+
+        Returns (added_count, message). Raises ValueError if the folder is not valid.
+        """
+        target_dir = directory or self.plex_media_directory
+        if not target_dir or not os.path.isdir(target_dir):
+            raise ValueError(
+                f"Invalid or inaccessible media folder. Path checked: '{target_dir}'"
+            )
+
+        files_found_to_convert = self.find_unconverted_files(target_dir)
+        if not files_found_to_convert:
+            return (
+                0,
+                f"Plex Scan: No non-MP4 files found in {os.path.basename(target_dir)}.",
+            )
+
+        added_file_paths = self.add_files(files_found_to_convert)
+        self._warm_probe_cache(added_file_paths)
+        if added_file_paths:
+            return (
+                len(added_file_paths),
+                f"Plex Scan: Added {len(added_file_paths)} file(s) to queue from {os.path.basename(target_dir)}.",
+            )
+        return (
+            0,
+            f"Plex Scan: No new files to add from {os.path.basename(target_dir)}.",
+        )
+
+    def _remove_stale_leftovers(self, leftover_paths):
+        """Removes temporary outputs and segment work folders left by interrupted
+        runs. Leftovers of running or queued conversions are kept, as are recently
+        written ones, which may belong to another instance."""
+        if not leftover_paths:
+            return
+        with self.job_lock:
+            in_use = set()
+            for job in self.active_jobs.values():
+                if job.temp_output_path:
+                    in_use.add(os.path.normpath(job.temp_output_path))
+                if job.output_path:
+                    in_use.add(os.path.normpath(job.output_path + WORK_DIR_SUFFIX))
+            # Work folders of queued files can still resume their conversion
+            for record in self.jobs.queued():
+                in_use.add(
+                    os.path.normpath(
+                        output_path_for(record.path, record.retry_level)
+                        + WORK_DIR_SUFFIX
+                    )
+                )
+        now = time.time()
+        for path in leftover_paths:
+            if os.path.normpath(path) in in_use:
+                continue
+            try:
+                age = leftover_age(path, now)
+                if age is None or age < STALE_LEFTOVER_SECONDS:
+                    continue
+                remove_leftover(path)
+                self.log_message(
+                    f"Removed leftover of an interrupted conversion: {path}", "INFO"
+                )
+            except OSError as e:
+                self.log_message(f"Could not remove leftover {path}: {e}", "WARN")
+
+    def _sweep_leftovers_of_known_files(self):
+        """Looks for leftovers next to the queued and failed files."""
+        with self.job_lock:
+            directories = {
+                os.path.dirname(record.path)
+                for record in self.jobs.queued() + self.jobs.failed()
+            }
+        leftover_paths = []
+        for directory in directories:
+            try:
+                leftover_paths.extend(find_leftovers(directory))
+            except OSError:
+                continue  # Folder gone or unreadable; the file will fail on its own
+        self._remove_stale_leftovers(leftover_paths)
+
+    def _warm_probe_cache(self, file_paths):
+        """Probes newly queued files ahead of conversion. Unchanged files are served from the probe cache."""
+        if not self.ffmpeg_exec_path or not self.probe_cache:
+            return
+        for file_path in file_paths:
+            if not self.is_monitoring_plex and self.plex_monitoring_thread:
+                break  # Monitoring was stopped mid-scan
+            try:
+                self.get_media_info(file_path)
+            except Exception as e:
+                self.log_message(f"Plex Scan: Could not probe '{file_path}': {e}", "WARN")
+        if self.log_enabled("DEBUG"):
+            self.log_message(
+                f"Probe cache: {self.probe_cache.hits} hit(s), {self.probe_cache.misses} miss(es) this session.",
+                "DEBUG",
+            )
+
+    def start_monitoring(self):
+        """Starts rescanning plex_media_directory every plex_scan_interval_minutes. Raises ValueError for invalid settings."""
+        if not self.plex_media_directory or not os.path.isdir(
+            self.plex_media_directory
+        ):
+            raise ValueError(
+                "Please select a valid media folder before starting monitoring."
+            )
+        if self.plex_scan_interval_minutes <= 0:
+            raise ValueError("Scan interval must be a positive number of minutes.")
+        self.plex_scan_interval_seconds = self.plex_scan_interval_minutes * 60
+
+        self.is_monitoring_plex = True
+        if self.plex_monitoring_thread and self.plex_monitoring_thread.is_alive():
+            self.log_message(
+                "Plex monitoring thread already active. Interval possibly updated.",
+                "INFO",
+            )
+        else:
+            self.plex_monitoring_thread = threading.Thread(
+                target=self.plex_monitoring_loop
+            )
+            self.plex_monitoring_thread.daemon = True
+            self.plex_monitoring_thread.start()
+            self.log_message("Plex monitoring thread started.", "INFO")
+
+    def stop_monitoring(self):
+        self.is_monitoring_plex = False
+        self.log_message("Plex monitoring stopping...", "INFO")
+
+    def plex_monitoring_loop(self):
+        self.log_message(
+            f"Plex monitoring loop started. Interval: {self.plex_scan_interval_seconds}s",
+            "INFO",
+        )
+        # Initial short delay before first scan to allow UI to update
+        time.sleep(2)
+
+        # Set up before the first scan so files arriving during it are not missed
+        watcher = self._start_folder_watcher()
+        try:
+            while self.is_monitoring_plex:
+                current_scan_interval = (
+                    self.plex_scan_interval_seconds
+                )  # Use the potentially updated value
+                if self.is_converting:
+                    status_msg = "Plex scan paused (conversion active)."
+                    self.log_message(status_msg, "DEBUG")
+                    self.listener.monitoring_status(status_msg)
+                    # Wait a shorter time if converting, then re-check
+                    wait_interval = min(60, current_scan_interval)
+                elif not self.plex_media_directory:
+                    status_msg = "Plex scan paused (directory not set)."
+                    self.log_message(status_msg, "DEBUG")
+                    self.listener.monitoring_status(status_msg)
+                    wait_interval = min(60, current_scan_interval)
+                else:
+                    scan_status_msg = f"Plex: Scanning {os.path.basename(self.plex_media_directory)}..."
+                    self.log_message(scan_status_msg, "INFO")
+                    self.listener.monitoring_status(scan_status_msg)
+                    try:
+                        added_count, final_message = self.scan_directory_and_add()
+                        self.log_message(final_message, "INFO")
+                        if added_count > 0 and self.auto_start_plex_conversions:
+                            self.log_message(
+                                f"Plex Scan: {added_count} file(s) added. Auto-starting conversion.",
+                                "INFO",
+                            )
+                            self._check_and_start_conversion_after_scan()
+                    except ValueError as e:
+                        self.log_message(f"Scan Plex Dir Error: {e}", "ERROR")
+                    # After scan, immediately start countdown for next scan
+                    wait_interval = current_scan_interval
+
+                # Countdown loop for the wait_interval or until monitoring is stopped
+                for i in range(wait_interval):
+                    if not self.is_monitoring_plex:
+                        break
+                    remaining_time = wait_interval - i
+                    minutes, seconds = divmod(remaining_time, 60)
+                    countdown_msg = f"Plex: Next scan in {minutes}m {seconds}s."
+                    if watcher:
+                        countdown_msg = f"Plex: Watching for new files. Next full scan in {minutes}m {seconds}s."
+                    # Log less frequently for countdown to avoid spamming logs
+                    if self.log_enabled("DEBUG") and (
+                        i % 30 == 0 or i == wait_interval - 1
+                    ):  # Log every 30s or last second before new state
+                        self.log_message(
+                            f"Plex monitoring countdown: {remaining_time}s remaining.",
+                            "DEBUG",
+                        )
+
+                    if self.is_converting:
+                        countdown_msg = f"Plex: Monitoring paused (conversion active). Next check in {minutes}m {seconds}s."
+                    elif not self.plex_media_directory:
+                        countdown_msg = f"Plex: Monitoring paused (directory not set). Next check in {minutes}m {seconds}s."
+
+                    self.listener.monitoring_status(countdown_msg)
+                    if not watcher:
+                        time.sleep(1)
+                    elif self._wait_for_folder_events(watcher, 1):
+                        self.log_message(
+                            "Folder watch lost events, rescanning the media folder.",
+                            "WARN",
+                        )
+                        break
+        finally:
+            if watcher:
+                watcher.close()
+
+        self.log_message("Plex monitoring loop finished.", "INFO")
+        self.listener.monitoring_status("Plex monitoring stopped.")
+
+    def _start_folder_watcher(self):
+        """Returns a FolderWatcher on the media folder, or None if only periodic scans can be used."""
+        if not self.use_folder_watch or not self.plex_media_directory:
+            return None
+        try:
+            watcher = FolderWatcher(self.plex_media_directory)
+        except OSError as e:
+            self.log_message(
+                f"Folder watch unavailable, new files are found by the periodic scan only: {e}",
+                "INFO",
+            )
+            return None
+        self.log_message(
+            f"Watching {len(watcher.watch_paths)} folder(s) below {self.plex_media_directory} for new files.",
+            "INFO",
+        )
+        return watcher
+
+    def _wait_for_folder_events(self, watcher, timeout):
+        """Queues the files reported by the watch for up to timeout seconds. Returns True if a rescan is needed."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.watch_start_pending and not self.is_converting:
+                self.watch_start_pending = False
+                if self.auto_start_plex_conversions:
+                    self._check_and_start_conversion_after_scan()
+            remaining_time = deadline - time.monotonic()
+            if remaining_time <= 0 or not self.is_monitoring_plex:
+                return False
+            try:
+                file_paths, rescan_needed = watcher.read_events(remaining_time)
+            except OSError as e:
+                self.log_message(f"Folder watch error: {e}", "ERROR")
+                time.sleep(remaining_time)
+                return False
+            if file_paths:
+                # Queued right away, also during a batch; only the start waits
+                self._queue_watched_files(file_paths)
+            if rescan_needed:
+                return True
+
+    def _queue_watched_files(self, file_paths):
+        added_file_paths = self.add_files(
+            [path for path in file_paths if is_unconverted_video(path)]
+        )
+        if not added_file_paths:
+            return
+        self._warm_probe_cache(added_file_paths)
+        self.log_message(
+            f"Plex Watch: Added {len(added_file_paths)} new file(s) to queue.", "INFO"
+        )
+        if not self.auto_start_plex_conversions:
+            return
+        if self.is_converting:
+            # The running batch converts the files it started with
+            self.watch_start_pending = True
+            self.log_message(
+                "Plex Watch: Conversion of the new file(s) starts when the running batch finishes.",
+                "INFO",
+            )
+        else:
+            self._check_and_start_conversion_after_scan()
+
+    def _check_and_start_conversion_after_scan(self):
+        if not self.is_converting and self.jobs.queued_count():
+            self.log_message("Auto-starting batch conversion from Plex scan.", "INFO")
+            error_message = self.start_batch()
+            if error_message:
+                self.log_message(f"Auto-start failed: {error_message}", "WARN")
+        elif self.is_converting:
+            self.log_message(
+                "Auto-start skipped: Conversion already in progress.", "INFO"
+            )
+        elif not self.jobs.queued_count():
+            self.log_message(
+                "Auto-start skipped: Queue is empty after Plex scan (unexpected).",
+                "WARN",
+            )
+
+    # --- State file ---
+
+    def _saved_settings(self):
+        """Settings in the state file as it is on disk, without the job lists."""
+        try:
+            with open(self.state_file, "r") as f:
+                saved_data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (IOError, ValueError) as e:
+            self.log_message(
+                f"Could not read the settings in {self.state_file}: {e}", "WARN"
+            )
+            return {}
+        if not isinstance(saved_data, dict):
+            return {}
+        return {
+            key: value
+            for key, value in saved_data.items()
+            if key not in STATE_LIST_KEYS
+        }
+
+    def save_state(self, keep_saved_settings=False):
+        """Writes the settings and, without the queue database, the job lists to
+        the state file. keep_saved_settings keeps the settings already in the file,
+        so one-off overrides (command line options) are not saved."""
+        with self.job_lock:
+            state_data = {
+                "plex_media_directory": self.plex_media_directory or "Not Set",
+                "auto_delete_verified_originals": self.auto_delete_verified_originals,
+                "plex_scan_interval_minutes": str(self.plex_scan_interval_minutes),
+                "auto_start_plex_conversions": self.auto_start_plex_conversions,
+                "use_gpu_acceleration": self.use_gpu_acceleration,  # Save GPU setting
+                "max_parallel_jobs": str(self.max_parallel_jobs),
+                "scheduling_policy": self.scheduling_policy,
+                "use_adaptive_concurrency": self.use_adaptive_concurrency,
+                "adaptive_ceilings": {
+                    "cpu_percent": self.adaptive_cpu_ceiling,
+                    "memory_percent": self.adaptive_memory_ceiling,
+                    "disk_busy_percent": self.adaptive_disk_busy_ceiling,
+                },
+                "use_fast_remux": self.use_fast_remux,
+                "use_folder_watch": self.use_folder_watch,
+                "use_resumable_encoding": self.use_resumable_encoding,
+                "segment_parallel_jobs": str(self.segment_parallel_jobs),
+                "use_scratch_staging": self.use_scratch_staging,
+                "scratch_directory": self.scratch_directory or "",
+                "scratch_limit_gb": self.scratch_limit_gb,
+                "use_cache_hints": self.use_cache_hints,
+                "use_preflight_check": self.use_preflight_check,
+                "watchdog_errors_per_minute": self.watchdog_errors_per_minute,
+                "encoding_profile": self.encoding_profile or "",
+                "log_level": self.log_level,
+            }
+            if not self.queue_in_database:
+                queued_records = self.jobs.queued()
+                state_data.update(
+                    {
+                        "file_queue": [record.path for record in queued_records],
+                        "failed_files_data": [
+                            (record.path, record.error) for record in self.jobs.failed()
+                        ],
+                        "files_for_retry_level_1": [
+                            record.path
+                            for record in queued_records
+                            if record.retry_level == 1
+                        ],
+                        "files_for_retry_level_2": [
+                            record.path
+                            for record in queued_records
+                            if record.retry_level == 2
+                        ],
+                        "queue_priorities": {
+                            record.path: record.priority
+                            for record in queued_records
+                            if record.priority
+                        },
+                        "queue_profiles": {
+                            record.path: record.profile
+                            for record in queued_records
+                            if record.profile
+                        },
+                    }
+                )
+        if keep_saved_settings:
+            job_lists = {
+                key: value for key, value in state_data.items() if key in STATE_LIST_KEYS
+            }
+            state_data = dict(self._saved_settings(), **job_lists)
+        try:
+            # Written next to the old file and swapped in, so a crash mid-save
+            # leaves either the old or the new state, never a truncated one
+            temp_state_file = self.state_file + ".tmp"
+            with open(temp_state_file, "w") as f:
+                json.dump(state_data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_state_file, self.state_file)
+            self.log_message(f"Application state saved to {self.state_file}", "INFO")
+        except IOError as e:
+            self.log_message(
+                f"Error saving application state to {self.state_file}: {e}", "ERROR"
+            )
+        except Exception as e:
+            self.log_message(
+                f"An unexpected error occurred while saving state: {e}", "ERROR"
+            )
+
+    def _import_state_lists(self, state_data):
+        with self.jobs.batch():
+            self.jobs.clear_queued()
+            self.jobs.clear_failed()
+            retry_levels = dict.fromkeys(
+                state_data.get("files_for_retry_level_2", []), 2
+            )
+            retry_levels.update(
+                dict.fromkeys(state_data.get("files_for_retry_level_1", []), 1)
+            )
+            priorities = state_data.get("queue_priorities", {})
+            profiles = state_data.get("queue_profiles", {})
+            for path in state_data.get("file_queue", []):
+                record = self.jobs.add(path, retry_levels.get(path, 0))
+                if record and priorities.get(path):
+                    self.jobs.set_priority(record, int(priorities[path]))
+                if record and profiles.get(path):
+                    self.jobs.set_profile(record, profiles[path])
+            for path, reason in state_data.get("failed_files_data", []):
+                record = self.jobs.add(path)
+                if record:  # A path is either queued or failed, never both
+                    self.jobs.fail(record, reason)
+
+    def _publish_jobs(self):
+        with self.job_lock:
+            self.listener.queue_reset(self.jobs.queued())
+            self.listener.failed_reset(self.jobs.failed())
+
+    def load_state(self):
+        """Restores settings from the state file, and the queue and failed list from
+        the queue database (or, without one, the state file). Returns True if a
+        state file was loaded."""
+        try:
+            if not os.path.exists(self.state_file):
+                self.log_message("No previous application state file found.", "INFO")
+                self._publish_jobs()
+                return False
+            with open(self.state_file, "r") as f:
+                state_data = json.load(f)
+
+            # Ensure we don't load " (Monitoring Active)" if app was closed while monitoring
+            plex_dir = (
+                state_data.get("plex_media_directory", "Not Set")
+                .replace(" (Monitoring Active)", "")
+                .strip()
+            )
+            self.plex_media_directory = (
+                plex_dir if plex_dir != "Not Set" and os.path.isdir(plex_dir) else None
+            )
+            self.auto_delete_verified_originals = bool(
+                state_data.get("auto_delete_verified_originals", False)
+            )
+            try:
+                self.plex_scan_interval_minutes = int(
+                    state_data.get("plex_scan_interval_minutes", "10")
+                )
+            except ValueError:
+                self.plex_scan_interval_minutes = 10
+            self.auto_start_plex_conversions = bool(
+                state_data.get("auto_start_plex_conversions", False)
+            )
+            self.use_gpu_acceleration = bool(
+                state_data.get("use_gpu_acceleration", False)
+            )  # Load GPU setting, default to False
+            try:
+                self.max_parallel_jobs = max(
+                    1, int(state_data.get("max_parallel_jobs", "1"))
+                )
+            except ValueError:
+                self.max_parallel_jobs = 1
+            self.use_fast_remux = bool(state_data.get("use_fast_remux", True))
+            self.use_adaptive_concurrency = bool(
+                state_data.get("use_adaptive_concurrency", False)
+            )
+            adaptive_ceilings = state_data.get("adaptive_ceilings", {})
+            try:
+                self.adaptive_cpu_ceiling = float(
+                    adaptive_ceilings.get("cpu_percent", CPU_CEILING_PERCENT)
+                )
+                self.adaptive_memory_ceiling = float(
+                    adaptive_ceilings.get("memory_percent", MEMORY_CEILING_PERCENT)
+                )
+                self.adaptive_disk_busy_ceiling = float(
+                    adaptive_ceilings.get(
+                        "disk_busy_percent", DISK_BUSY_CEILING_PERCENT
+                    )
+                )
+            except (TypeError, ValueError):
+                self.log_message(
+                    "Invalid adaptive_ceilings in the state file, using the defaults.",
+                    "WARN",
+                )
+            scheduling_policy = state_data.get("scheduling_policy", DEFAULT_POLICY)
+            self.scheduling_policy = (
+                scheduling_policy
+                if scheduling_policy in SCHEDULING_POLICIES
+                else DEFAULT_POLICY
+            )
+            self.use_folder_watch = bool(state_data.get("use_folder_watch", True))
+            self.use_resumable_encoding = bool(
+                state_data.get("use_resumable_encoding", False)
+            )
+            try:
+                self.segment_parallel_jobs = max(
+                    1, int(state_data.get("segment_parallel_jobs", "1"))
+                )
+            except ValueError:
+                self.segment_parallel_jobs = 1
+            self.use_scratch_staging = bool(state_data.get("use_scratch_staging", False))
+            self.scratch_directory = state_data.get("scratch_directory") or None
+            try:
+                self.scratch_limit_gb = max(
+                    1.0,
+                    float(state_data.get("scratch_limit_gb", DEFAULT_SCRATCH_LIMIT_GB)),
+                )
+            except (TypeError, ValueError):
+                self.scratch_limit_gb = DEFAULT_SCRATCH_LIMIT_GB
+            self.use_cache_hints = bool(state_data.get("use_cache_hints", True))
+            self.use_preflight_check = bool(state_data.get("use_preflight_check", False))
+            try:
+                self.watchdog_errors_per_minute = max(
+                    0.0,
+                    float(
+                        state_data.get(
+                            "watchdog_errors_per_minute",
+                            DEFAULT_WATCHDOG_ERRORS_PER_MINUTE,
+                        )
+                    ),
+                )
+            except (TypeError, ValueError):
+                self.watchdog_errors_per_minute = DEFAULT_WATCHDOG_ERRORS_PER_MINUTE
+            self.encoding_profile = state_data.get("encoding_profile") or None
+            log_level = str(state_data.get("log_level", "INFO")).upper()
+            self.log_level = log_level if log_level in LOG_LEVELS else "INFO"
+
+            state_lists_imported = False
+            with self.job_lock:
+                # A state file from before the queue database, or one written
+                # without it: its lists are imported once into an empty store
+                if "file_queue" in state_data and not (
+                    self.queue_in_database
+                    and (self.jobs.queued_count() or self.jobs.failed_count())
+                ):
+                    self._import_state_lists(state_data)
+                    state_lists_imported = self.queue_in_database
+            self._publish_jobs()
+            threading.Thread(
+                target=self._sweep_leftovers_of_known_files,
+                name="LeftoverSweep",
+                daemon=True,
+            ).start()
+            if state_lists_imported:
+                self.log_message(
+                    f"Moved the queue from {self.state_file} to {QUEUE_DB_FILE}.",
+                    "INFO",
+                )
+                self.save_state()  # Drops the lists so they aren't imported again
+
+            self.log_message(
+                f"Application state loaded from {self.state_file}", "INFO"
+            )
+            return True
+        except IOError as e:
+            self.log_message(
+                f"Error loading application state from {self.state_file}: {e}", "ERROR"
+            )
+            # Don't halt app, just start fresh
+        except json.JSONDecodeError as e:
+            self.log_message(
+                f"Error decoding state file {self.state_file}: {e}. Starting fresh.",
+                "ERROR",
+            )
+        except Exception as e:
+            self.log_message(
+                f"An unexpected error occurred while loading state: {e}. Starting fresh.",
+                "ERROR",
+            )
+        return False
@@ -0,0 +1,190 @@
+"""Classification of ffmpeg failures from stderr, and the cheapest fix for each kind.
+
+A failed conversion is retried at once with the smallest change to its command
+that addresses what went wrong, e.g. dropping the subtitles or re-encoding only
+the audio, instead of waiting for a full Level 1/2 re-encode by the user.
+"""
+
+import copy
+import re
+
+CORRUPT_PACKETS = "corrupt_packets"
+SUBTITLE_CODEC = "subtitle_codec"
+AUDIO_CODEC = "audio_codec"
+UNSUPPORTED_CODEC = "unsupported_codec"
+TIMESTAMPS = "timestamps"
+IO_ERROR = "io_error"
+OUT_OF_SPACE = "out_of_space"
+UNKNOWN = "unknown"
+
+CATEGORY_LABELS = {
+    CORRUPT_PACKETS: "Corrupt packets",
+    SUBTITLE_CODEC: "Unsupported subtitles",
+    AUDIO_CODEC: "Audio codec problem",
+    UNSUPPORTED_CODEC: "Unsupported codec",
+    TIMESTAMPS: "Timestamp problem",
+    IO_ERROR: "I/O error",
+    OUT_OF_SPACE: "Out of disk space",
+    UNKNOWN: "Unknown error",
+}
+
+# "Could not find tag for codec X in stream #N": the muxer can't hold codec X. The
+# category depends on the kind of stream X is (see _codec_tag_category)
+_CODEC_TAG = "codec_tag"
+# Codec names by kind, for codecs the probed source streams don't list
+_SUBTITLE_CODEC_NAMES = re.compile(
+    r"\w*subtitle|ass|ssa|subrip|srt|webvtt|text|mov_text|microdvd|eia_608"
+)
+_AUDIO_CODEC_NAMES = re.compile(
+    r"aac|ac3|eac3|dts|truehd|mlp|mp[123]|opus|vorbis|flac|alac|cook|pcm_\w+"
+    r"|adpcm_\w+|wma\w*|amr_?\w*"
+)
+
+# Checked in this order, so a specific cause wins over decoder warnings that
+# accompany it. The first pattern that matches any stderr line decides.
+_PATTERNS = [
+    (OUT_OF_SPACE, r"no space left on device|disk quota exceeded|file too large"),
+    (
+        IO_ERROR,
+        r"input/output error|i/o error|stale file handle|connection (?:reset|refused|timed out)"
+        r"|broken pipe|permission denied|no such file or directory",
+    ),
+    (_CODEC_TAG, r"could not find tag for codec (\S+)"),
+    (
+        SUBTITLE_CODEC,
+        r"subtitle encoding currently only possible|subtitle codec \d+ is not supported"
+        r"|error (?:while )?(?:decoding|initializing) subtitle",
+    ),
+    (
+        AUDIO_CODEC,
+        r"channel layout|too many channels"
+        r"|error (?:while opening encoder|initializing output stream).*#?\d+:[1-9]"
+        r"|audio (?:codec|sample rate).*not supported",
+    ),
+    (
+        TIMESTAMPS,
+        r"non[- ]?monoton|invalid (?:dts|pts)|timestamps are unset|pts has no value"
+        r"|out of order",
+    ),
+    (
+        CORRUPT_PACKETS,
+        r"invalid data found when processing input|error while decoding|corrupt"
+        r"|invalid nal unit|error splitting the input into nal units|missing reference picture"
+        r"|decode_slice_header error|concealing \d+|header missing",
+    ),
+]
+_COMPILED_PATTERNS = [(category, re.compile(pattern)) for category, pattern in _PATTERNS]
+
+# Fix -> description for the log
+DROP_SUBTITLES = "drop_subtitles"
+ENCODE_AUDIO = "encode_audio"
+DOWNMIX_AUDIO = "downmix_audio"
+GENERATE_TIMESTAMPS = "generate_timestamps"
+SKIP_CORRUPT = "skip_corrupt"
+RETRY_UNCHANGED = "retry_unchanged"
+FIX_DESCRIPTIONS = {
+    DROP_SUBTITLES: "subtitles dropped",
+    ENCODE_AUDIO: "audio re-encoded to AAC",
+    DOWNMIX_AUDIO: "audio downmixed to stereo",
+    GENERATE_TIMESTAMPS: "timestamps regenerated",
+    SKIP_CORRUPT: "corrupt packets skipped",
+    RETRY_UNCHANGED: "unchanged settings",
+}
+
+
+def _codec_tag_category(codec_name, streams):
+    """Category of a codec the muxer can't hold: by the type of the source streams
+    with that codec (ffprobe stream dicts), else guessed from its name."""
+    codec_types = {
+        stream.get("codec_type")
+        for stream in streams or ()
+        if stream.get("codec_name") == codec_name
+    }
+    if len(codec_types) == 1:
+        codec_type = codec_types.pop()
+    elif _SUBTITLE_CODEC_NAMES.fullmatch(codec_name):
+        codec_type = "subtitle"
+    elif _AUDIO_CODEC_NAMES.fullmatch(codec_name):
+        codec_type = "audio"
+    else:
+        codec_type = None
+    # A video or data stream isn't fixed by dropping subtitles or re-encoding audio
+    return {"subtitle": SUBTITLE_CODEC, "audio": AUDIO_CODEC}.get(
+        codec_type, UNSUPPORTED_CODEC
+    )
+
+
+def classify_failure(stderr_lines, streams=None):
+    """Returns (category, the stderr line that decided it, or None). streams, the
+    source's probed streams, tell what kind of codec the muxer rejected."""
+    lowered_lines = [line.lower() for line in stderr_lines]
+    for category, pattern in _COMPILED_PATTERNS:
+        for line, lowered_line in zip(stderr_lines, lowered_lines):
+            match = pattern.search(lowered_line)
+            if match and category == _CODEC_TAG:
+                return _codec_tag_category(match.group(1), streams), line.strip()
+            if match:
+                return category, line.strip()
+    return UNKNOWN, None
+
+
+def choose_fix(category, applied_fixes, stream_plan, error_tolerant=False):
+    """The cheapest fix for a failure of this category that hasn't been tried yet,
+    or None if there is nothing left to try (or nothing a retry could fix)."""
+    if category == SUBTITLE_CODEC:
+        # A plan without subtitles can't fail on them
+        candidates = [DROP_SUBTITLES] if not stream_plan or stream_plan["subtitles"] else []
+    elif category == AUDIO_CODEC:
+        copies_audio = stream_plan and any(copy_audio for _, copy_audio in stream_plan["audio"])
+        candidates = [ENCODE_AUDIO, DOWNMIX_AUDIO] if copies_audio else [DOWNMIX_AUDIO]
+    elif category == TIMESTAMPS and not error_tolerant:  # Those already regenerate them
+        candidates = [GENERATE_TIMESTAMPS]
+    elif category == CORRUPT_PACKETS and not error_tolerant:
+        candidates = [SKIP_CORRUPT]
+    elif category == IO_ERROR:  # Often a network share hiccup
+        candidates = [RETRY_UNCHANGED]
+    else:
+        candidates = []
+    for fix in candidates:
+        if fix not in applied_fixes:
+            return fix
+    return None
+
+
+def fixed_stream_plan(stream_plan, fixes):
+    """Copy of a plan from plan_mp4_streams with the fixes applied, or None."""
+    if not stream_plan:
+        return stream_plan
+    stream_plan = copy.deepcopy(stream_plan)
+    if DROP_SUBTITLES in fixes:
+        stream_plan["subtitles"] = []
+    if ENCODE_AUDIO in fixes:
+        stream_plan["audio"] = [(audio_index, False) for audio_index, _ in stream_plan["audio"]]
+    return stream_plan
+
+
+def fix_input_args(fixes):
+    """ffmpeg options placed before -i."""
+    args = []
+    if SKIP_CORRUPT in fixes:
+        args.extend(["-err_detect", "ignore_err"])
+    flags = ""
+    if GENERATE_TIMESTAMPS in fixes:
+        flags += "+genpts"
+    if SKIP_CORRUPT in fixes:
+        flags += "+discardcorrupt"
+    if flags:
+        args.extend(["-fflags", flags])
+    return args
+
+
+def fix_output_args(fixes, stream_plan):
+    """ffmpeg output options; without a stream plan, ffmpeg's default stream selection applies."""
+    args = []
+    if DROP_SUBTITLES in fixes and not stream_plan:
+        args.append("-sn")
+    if DOWNMIX_AUDIO in fixes:
+        args.extend(["-ac", "2"])
+    if GENERATE_TIMESTAMPS in fixes:
+        args.extend(["-avoid_negative_ts", "make_zero"])
+    return args
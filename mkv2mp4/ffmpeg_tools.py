@@ -0,0 +1,121 @@
+"""Locating and running the ffmpeg/ffprobe executables, and parsing their output."""
+
+import os
+import subprocess
+import sys
+
+# Keeps ffmpeg/ffprobe from opening a console window on Windows
+SUBPROCESS_CREATION_FLAGS = subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0
+
+
+def get_application_path():
+    """Folder holding the application files (and the optional local 'ffmpeg' folder)."""
+    if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
+        return sys._MEIPASS  # PyInstaller temporary path
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_ffmpeg_path():
+    local_ffmpeg_dir = os.path.join(get_application_path(), "ffmpeg")
+    if os.name == "nt":
+        ffmpeg_exe = os.path.join(local_ffmpeg_dir, "bin", "ffmpeg.exe")
+        if not os.path.exists(ffmpeg_exe):
+            ffmpeg_exe = os.path.join(local_ffmpeg_dir, "ffmpeg.exe")
+    else:
+        ffmpeg_exe = os.path.join(local_ffmpeg_dir, "ffmpeg")
+        if not os.path.exists(ffmpeg_exe):
+            ffmpeg_exe_alt = os.path.join(local_ffmpeg_dir, "bin", "ffmpeg")
+            if os.path.exists(ffmpeg_exe_alt):
+                ffmpeg_exe = ffmpeg_exe_alt
+    if os.path.exists(ffmpeg_exe) and os.access(ffmpeg_exe, os.X_OK):
+        return ffmpeg_exe
+    return "ffmpeg"
+
+
+def check_ffmpeg(ffmpeg_exec_path):
+    """Returns True if ffmpeg_exec_path can be executed."""
+    try:
+        subprocess.run(
+            [ffmpeg_exec_path, "-version"],
+            check=True,
+            capture_output=True,
+            creationflags=SUBPROCESS_CREATION_FLAGS,
+        )
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
+
+
+def get_ffprobe_path(ffmpeg_exec_path):
+    """Derives the ffprobe executable from the ffmpeg one (both ship in the same folder)."""
+    if os.name == "nt" and not ffmpeg_exec_path.endswith(".exe"):
+        # if ffmpeg_exec_path is just "ffmpeg" on windows, ffprobe should be "ffprobe"
+        if ffmpeg_exec_path == "ffmpeg":
+            return "ffprobe"
+        return ffmpeg_exec_path.replace("ffmpeg", "ffprobe") + ".exe"
+    elif ffmpeg_exec_path.endswith(".exe"):
+        return ffmpeg_exec_path.replace("ffmpeg.exe", "ffprobe.exe")
+    # Basic replacement, might need smarter logic if paths are complex
+    return ffmpeg_exec_path.replace("ffmpeg", "ffprobe")
+
+
+def parse_number(value, number_type=float):
+    """Converts ffmpeg/ffprobe values to numbers. Returns None for 'N/A' and other invalid values."""
+    try:
+        return number_type(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class FFmpegProgressParser:
+    """Streaming parser for the key=value blocks ffmpeg writes with -progress.
+
+    feed_line() collects keys until the 'progress=continue|end' line that closes a
+    block and then returns a snapshot dict with out_time_us, fps, speed, total_size,
+    frame and ended. Values ffmpeg reports as N/A are None.
+    """
+
+    def __init__(self):
+        self.block = {}
+
+    def feed_line(self, line):
+        key, separator, value = line.strip().partition("=")
+        if not separator:
+            return None
+        if key != "progress":
+            self.block[key] = value
+            return None
+        block, self.block = self.block, {}
+        # out_time_ms is also in microseconds (long-standing ffmpeg quirk)
+        out_time_us = parse_number(block.get("out_time_us"), int)
+        if out_time_us is None:
+            out_time_us = parse_number(block.get("out_time_ms"), int)
+        return {
+            "out_time_us": out_time_us,
+            "fps": parse_number(block.get("fps")),
+            "speed": parse_number(block.get("speed", "").rstrip("x")),
+            "total_size": parse_number(block.get("total_size"), int),
+            "frame": parse_number(block.get("frame"), int),
+            "ended": value == "end",
+        }
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s"
+
+
+def collect_stream_lines(stream, lines, on_line=None):
+    """Thread target: reads a pipe until EOF so ffmpeg never blocks on a full stderr buffer.
+    on_line(line) sees every line, also those that no longer fit into lines."""
+    try:
+        for line in stream:
+            line = line.rstrip()
+            lines.append(line)
+            if on_line:
+                on_line(line)
+    except (OSError, ValueError):
+        pass  # Pipe closed while the process was being terminated
@@ -0,0 +1,65 @@
+"""Page-cache hints for the media files a conversion streams through once (Linux).
+
+A conversion reads its source and writes its output once, so caching their pages
+only evicts data other programs on the host need hot, like the Plex server's
+database. The start of the next queued source is read into the cache ahead of
+time, and finished sources and outputs are dropped from it. Where os.posix_fadvise
+is missing (Windows, macOS) every hint is a no-op.
+"""
+
+import os
+
+HAS_FADVISE = hasattr(os, "posix_fadvise")
+# Enough for ffmpeg to probe and start; from there the kernel's readahead keeps up
+READ_AHEAD_BYTES = 64 * 1024 * 1024
+
+
+def advise_sequential(file_descriptor):
+    """Widens the kernel's readahead for this open file, which is read front to back."""
+    if HAS_FADVISE:
+        try:
+            os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def drop_cached_pages(file_descriptor):
+    """Evicts the file's clean pages from the page cache. Dirty pages stay until written back."""
+    if HAS_FADVISE:
+        try:
+            os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+
+def read_ahead(path, length=READ_AHEAD_BYTES):
+    """Starts reading the first length bytes of path into the page cache. Returns
+    True if the hint was given. Can block while the reads are queued."""
+    if not HAS_FADVISE:
+        return False
+    try:
+        file_descriptor = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        os.posix_fadvise(file_descriptor, 0, length, os.POSIX_FADV_WILLNEED)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(file_descriptor)
+
+
+def drop_from_cache(path):
+    """Evicts path's pages from the page cache. Returns True if the hint was given."""
+    if not HAS_FADVISE:
+        return False
+    try:
+        file_descriptor = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False  # Deleted or never written
+    try:
+        drop_cached_pages(file_descriptor)
+        return True
+    finally:
+        os.close(file_descriptor)
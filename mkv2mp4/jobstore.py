@@ -0,0 +1,335 @@
+"""Thread-safe store of the queued and failed files, optionally persisted in SQLite."""
+
+import collections
+import contextlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+QUEUED = "queued"
+ACTIVE = "active"  # Being converted; still shown in the queue
+FAILED = "failed"
+
+
+def queue_display_name(file_path, retry_level=0):
+    name = os.path.basename(file_path)
+    if retry_level == 1:
+        name += " (Level 1)"
+    elif retry_level == 2:
+        name += " (Level 2)"
+    return name
+
+
+class JobRecord:
+    """One file known to the store. Fields are only changed by the JobStore, under its lock."""
+
+    __slots__ = (
+        "job_id",
+        "path",
+        "retry_level",
+        "state",
+        "error",
+        "priority",
+        "queued_at",
+        "profile",
+    )
+
+    def __init__(self, job_id, path, retry_level=0):
+        self.job_id = job_id
+        self.path = path
+        self.retry_level = retry_level
+        self.state = QUEUED
+        self.error = None
+        self.priority = 0  # Higher is converted earlier by the priority scheduler
+        self.queued_at = time.time()  # When it was (re)queued, for priority aging
+        self.profile = None  # Encoding profile chosen for this file; None picks it by library/setting
+
+    @property
+    def display_name(self):
+        return queue_display_name(self.path, self.retry_level)
+
+
+class JobStore:
+    """Queue and failed list in FIFO order, with O(1) lookup by path or job id,
+    O(1) state changes and O(1) removal.
+
+    A path is in the store at most once, either queued/active or failed. All methods
+    can be called from any thread; callers that need several calls to be atomic hold
+    the store's lock (an RLock) around them.
+
+    With db_path, every change is also written to an SQLite database in WAL mode as
+    one small transaction (or one per batch()), and the records in it are loaded
+    on creation, so a crash loses nothing that was committed. The active state is
+    not persisted: files that were being converted come back as queued.
+    Database errors are reported to on_error(exception); the in-memory store stays
+    correct. The transaction is rolled back and its statements are kept, and they
+    are written again, in order, before the next change (or on close()).
+    unsaved_count tells how many statements the database is behind.
+    """
+
+    def __init__(self, db_path=None, on_error=None):
+        self.lock = threading.RLock()
+        self._records_by_path = {}
+        self._queued = collections.OrderedDict()  # job_id -> JobRecord, FIFO
+        self._failed = collections.OrderedDict()  # job_id -> JobRecord, FIFO
+        self.on_error = on_error
+        self.connection = None
+        self._batch_depth = 0
+        self._pending = []  # (sql, params) not committed yet, oldest first
+        last_job_id = last_position = 0
+        if db_path:
+            self.connection = sqlite3.connect(
+                db_path, timeout=10, check_same_thread=False
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=FULL")  # Durable on power loss
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    "job_id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, "
+                    "retry_level INTEGER NOT NULL, state TEXT NOT NULL, error TEXT, "
+                    "position INTEGER NOT NULL, priority INTEGER NOT NULL DEFAULT 0, "
+                    "queued_at REAL, profile TEXT)"
+                )
+                # Databases written before scheduling policies or encoding profiles
+                # lack the last columns
+                columns = {
+                    row[1] for row in self.connection.execute("PRAGMA table_info(jobs)")
+                }
+                if "priority" not in columns:
+                    self.connection.execute(
+                        "ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0"
+                    )
+                if "queued_at" not in columns:
+                    self.connection.execute("ALTER TABLE jobs ADD COLUMN queued_at REAL")
+                if "profile" not in columns:
+                    self.connection.execute("ALTER TABLE jobs ADD COLUMN profile TEXT")
+            for (
+                job_id,
+                path,
+                retry_level,
+                state,
+                error,
+                position,
+                priority,
+                queued_at,
+                profile,
+            ) in self.connection.execute(
+                "SELECT job_id, path, retry_level, state, error, position, priority, "
+                "queued_at, profile FROM jobs ORDER BY position"
+            ):
+                record = JobRecord(job_id, path, retry_level)
+                record.error = error
+                record.priority = priority
+                if queued_at is not None:
+                    record.queued_at = queued_at
+                record.profile = profile
+                self._records_by_path[path] = record
+                if state == FAILED:
+                    record.state = FAILED
+                    self._failed[job_id] = record
+                else:
+                    self._queued[job_id] = record
+                last_job_id = max(last_job_id, job_id)
+                last_position = max(last_position, position)
+        self._job_ids = itertools.count(last_job_id + 1)
+        self._positions = itertools.count(last_position + 1)  # Order in the database
+
+    @property
+    def is_persistent(self):
+        return self.connection is not None
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Commits all changes made inside the block as one transaction."""
+        with self.lock:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._commit()
+
+    @property
+    def unsaved_count(self):
+        with self.lock:
+            return len(self._pending)
+
+    def _write(self, sql, params):
+        if not self.connection:
+            return
+        self._pending.append((sql, params))
+        if not self._batch_depth:
+            self._commit()
+
+    def _commit(self):
+        """Writes the pending statements in one transaction. On failure they stay
+        pending, so the database never gets part of a change."""
+        if not self.connection or not self._pending:
+            return
+        try:
+            for sql, params in self._pending:
+                self.connection.execute(sql, params)
+            self.connection.commit()
+        except sqlite3.Error as e:
+            try:
+                self.connection.rollback()
+            except sqlite3.Error:
+                pass
+            self._report_error(e)
+            return
+        self._pending.clear()
+
+    def _report_error(self, exception):
+        if self.on_error:
+            self.on_error(exception)
+
+    def __contains__(self, path):
+        with self.lock:
+            return path in self._records_by_path
+
+    def get(self, path):
+        with self.lock:
+            return self._records_by_path.get(path)
+
+    def get_by_id(self, job_id):
+        with self.lock:
+            return self._queued.get(job_id) or self._failed.get(job_id)
+
+    def queued_count(self):
+        with self.lock:
+            return len(self._queued)
+
+    def failed_count(self):
+        with self.lock:
+            return len(self._failed)
+
+    def queued(self):
+        """Snapshot of the queued and active records in queue order."""
+        with self.lock:
+            return list(self._queued.values())
+
+    def failed(self):
+        with self.lock:
+            return list(self._failed.values())
+
+    def add(self, path, retry_level=0):
+        """Queues path. Returns the new record, or None if the path is already queued or failed."""
+        with self.lock:
+            if path in self._records_by_path:
+                return None
+            record = JobRecord(next(self._job_ids), path, retry_level)
+            self._records_by_path[path] = record
+            self._queued[record.job_id] = record
+            self._write(
+                "INSERT OR REPLACE INTO jobs (job_id, path, retry_level, state, "
+                "position, queued_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    record.job_id,
+                    path,
+                    retry_level,
+                    QUEUED,
+                    next(self._positions),
+                    record.queued_at,
+                ),
+            )
+            return record
+
+    def remove(self, record):
+        """Forgets a queued or failed record. Returns False if it was not in the store."""
+        with self.lock:
+            if self._records_by_path.get(record.path) is not record:
+                return False
+            del self._records_by_path[record.path]
+            self._queued.pop(record.job_id, None)
+            self._failed.pop(record.job_id, None)
+            self._write("DELETE FROM jobs WHERE job_id = ?", (record.job_id,))
+            return True
+
+    def set_active(self, record, active):
+        with self.lock:
+            if record.job_id in self._queued:
+                record.state = ACTIVE if active else QUEUED
+
+    def set_priority(self, record, priority):
+        with self.lock:
+            if self._records_by_path.get(record.path) is not record:
+                return
+            record.priority = priority
+            self._write(
+                "UPDATE jobs SET priority = ? WHERE job_id = ?",
+                (priority, record.job_id),
+            )
+
+    def set_profile(self, record, profile):
+        with self.lock:
+            if self._records_by_path.get(record.path) is not record:
+                return
+            record.profile = profile
+            self._write(
+                "UPDATE jobs SET profile = ? WHERE job_id = ?",
+                (profile, record.job_id),
+            )
+
+    def fail(self, record, error):
+        """Moves a queued record to the end of the failed list. Its retry level is
+        cleared; requeueing sets a new one."""
+        with self.lock:
+            self._queued.pop(record.job_id, None)
+            record.state = FAILED
+            record.error = error
+            record.retry_level = 0
+            self._failed[record.job_id] = record
+            self._write(
+                "UPDATE jobs SET state = ?, error = ?, retry_level = 0, position = ? "
+                "WHERE job_id = ?",
+                (FAILED, error, next(self._positions), record.job_id),
+            )
+
+    def requeue(self, record, retry_level=0):
+        """Moves a failed record to the end of the queue with the given retry level."""
+        with self.lock:
+            self._failed.pop(record.job_id, None)
+            record.state = QUEUED
+            record.error = None
+            record.retry_level = retry_level
+            record.queued_at = time.time()
+            self._queued[record.job_id] = record
+            self._write(
+                "UPDATE jobs SET state = ?, error = NULL, retry_level = ?, position = ?, "
+                "queued_at = ? WHERE job_id = ?",
+                (
+                    QUEUED,
+                    retry_level,
+                    next(self._positions),
+                    record.queued_at,
+                    record.job_id,
+                ),
+            )
+
+    def clear_queued(self):
+        """Removes all queued records that are not being converted. Returns them."""
+        with self.batch():
+            removed_records = [
+                record for record in self._queued.values() if record.state == QUEUED
+            ]
+            for record in removed_records:
+                self.remove(record)
+            return removed_records
+
+    def clear_failed(self):
+        with self.batch():
+            removed_records = list(self._failed.values())
+            for record in removed_records:
+                self.remove(record)
+            return removed_records
+
+    def close(self):
+        with self.lock:
+            if self.connection:
+                self._commit()
+                self.connection.close()
+                self.connection = None
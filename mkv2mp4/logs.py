@@ -0,0 +1,52 @@
+"""Log levels and the size-rotated log file shared by the GUI and the command line."""
+
+import gzip
+import logging
+import logging.handlers
+import os
+import shutil
+
+LOG_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARN": logging.WARNING,
+    "ERROR": logging.ERROR,
+}
+LOG_FILE = "mkv_converter.log"  # Next to the state file
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 5  # mkv_converter.log.1.gz ... mkv_converter.log.5.gz
+LOG_FORMAT = "[%(asctime)s] [%(levelname)s] %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+MAX_LOG_VIEW_LINES = 5000  # Lines kept for the GUI's Logs tab
+
+
+def level_number(level_name):
+    return LOG_LEVELS.get(level_name.upper(), logging.INFO)
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as source_file, gzip.open(dest, "wb") as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that optionally gzips the rotated segments."""
+
+    def __init__(
+        self,
+        filename,
+        max_bytes=LOG_FILE_MAX_BYTES,
+        backup_count=LOG_FILE_BACKUPS,
+        compress=True,
+    ):
+        super().__init__(
+            filename,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,  # Don't create the file until something is logged
+        )
+        if compress:
+            self.namer = lambda name: name + ".gz"
+            self.rotator = _gzip_rotator
@@ -0,0 +1,273 @@
+"""Probing source files with ffprobe, and the persistent probe cache."""
+
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+from .ffmpeg_tools import SUBPROCESS_CREATION_FLAGS, parse_number
+
+# Seconds of packets read by the probe to measure the keyframe interval
+KEYFRAME_PROBE_SECONDS = 12
+
+
+def _parse_frame_rate(rate_text):
+    """Parses ffprobe rates like '24000/1001'. Returns None for '0/0' or invalid values."""
+    if not rate_text or "/" not in rate_text:
+        return parse_number(rate_text)
+    numerator, denominator = rate_text.split("/", 1)
+    numerator = parse_number(numerator)
+    denominator = parse_number(denominator)
+    if not numerator or not denominator:
+        return None
+    return numerator / denominator
+
+
+def _stream_tag(stream, name):
+    """Reads a stream tag, also accepting mkvmerge's per-language variants like 'BPS-eng'."""
+    tags = stream.get("tags", {})
+    for key, value in tags.items():
+        if key.upper() == name or key.upper().startswith(name + "-"):
+            return value
+    return None
+
+
+def _keyframe_interval(packets, video_index):
+    """Median distance in seconds between video keyframes in the probed packets."""
+    keyframe_times = sorted(
+        pts_time
+        for pts_time in (
+            parse_number(packet.get("pts_time"))
+            for packet in packets
+            if packet.get("stream_index") == video_index
+            and "K" in packet.get("flags", "")
+        )
+        if pts_time is not None
+    )
+    gaps = [
+        later - earlier
+        for earlier, later in zip(keyframe_times, keyframe_times[1:])
+        if later > earlier
+    ]
+    if not gaps:
+        return None
+    return gaps[len(gaps) // 2]
+
+
+class MediaInfo:
+    """Result of a single ffprobe run, reused by command building, progress tracking and verification."""
+
+    def __init__(self, path, probe_data):
+        self.path = path
+        # Only the parts that are needed later are kept, the packet list is reduced
+        # to the keyframe interval so the object stays small
+        self.probe_data = {
+            "format": probe_data.get("format", {}),
+            "streams": probe_data.get("streams", []),
+        }
+        format_data = self.probe_data["format"]
+        self.streams = self.probe_data["streams"]
+        self.format_name = format_data.get("format_name", "")
+        self.duration = parse_number(format_data.get("duration")) or 0
+        self.size = parse_number(format_data.get("size"), int)
+        self.bit_rate = parse_number(format_data.get("bit_rate"), int)
+
+        self.video_stream = next(
+            (
+                stream
+                for stream in self.streams
+                if stream.get("codec_type") == "video"
+                and not stream.get("disposition", {}).get("attached_pic")
+            ),
+            None,
+        )
+        self.audio_streams = [
+            stream for stream in self.streams if stream.get("codec_type") == "audio"
+        ]
+        self.subtitle_streams = [
+            stream for stream in self.streams if stream.get("codec_type") == "subtitle"
+        ]
+
+        video = self.video_stream or {}
+        self.video_codec = video.get("codec_name")
+        self.pix_fmt = video.get("pix_fmt")
+        self.width = video.get("width")
+        self.height = video.get("height")
+        self.frame_rate = _parse_frame_rate(video.get("avg_frame_rate"))
+        self.frame_count = parse_number(video.get("nb_frames"), int) or parse_number(
+            _stream_tag(video, "NUMBER_OF_FRAMES"), int
+        )
+        if not self.frame_count and self.frame_rate and self.duration:
+            self.frame_count = int(self.frame_rate * self.duration)
+        self.video_bit_rate = parse_number(video.get("bit_rate"), int) or parse_number(
+            _stream_tag(video, "BPS"), int
+        )
+        self.audio_codecs = [stream.get("codec_name") for stream in self.audio_streams]
+        self.audio_languages = [
+            stream.get("tags", {}).get("language", "und") for stream in self.audio_streams
+        ]
+        self.subtitle_languages = [
+            stream.get("tags", {}).get("language", "und")
+            for stream in self.subtitle_streams
+        ]
+
+        if "keyframe_interval" in probe_data:
+            self.keyframe_interval = probe_data["keyframe_interval"]
+        else:
+            self.keyframe_interval = _keyframe_interval(
+                probe_data.get("packets", []), video.get("index")
+            )
+        self.probe_data["keyframe_interval"] = self.keyframe_interval
+
+    def summary(self):
+        parts = [
+            f"{self.duration:.1f}s",
+            f"video {self.video_codec or 'none'}"
+            + (f" {self.width}x{self.height}" if self.width else "")
+            + (f" {self.pix_fmt}" if self.pix_fmt else ""),
+        ]
+        if self.audio_streams:
+            parts.append(
+                "audio "
+                + ", ".join(
+                    f"{codec}/{language}"
+                    for codec, language in zip(self.audio_codecs, self.audio_languages)
+                )
+            )
+        if self.subtitle_streams:
+            parts.append(f"{len(self.subtitle_streams)} subtitle(s)")
+        if self.bit_rate:
+            parts.append(f"{self.bit_rate // 1000} kb/s")
+        if self.keyframe_interval:
+            parts.append(f"keyframe every {self.keyframe_interval:.2f}s")
+        return ", ".join(parts)
+
+
+def probe_media(ffprobe_path, input_path):
+    """Runs one ffprobe pass over input_path and returns a MediaInfo. Raises on ffprobe or parse errors."""
+    ffprobe_cmd = [
+        ffprobe_path,
+        "-v",
+        "error",
+        "-show_format",
+        "-show_streams",
+        # Packets of the first seconds only, to measure the keyframe interval
+        "-show_entries",
+        "packet=stream_index,pts_time,flags",
+        "-read_intervals",
+        f"%+{KEYFRAME_PROBE_SECONDS}",
+        "-of",
+        "json",
+        input_path,
+    ]
+    probe_process = subprocess.run(
+        ffprobe_cmd,
+        capture_output=True,
+        text=True,
+        check=True,
+        creationflags=SUBPROCESS_CREATION_FLAGS,
+    )
+    return MediaInfo(input_path, json.loads(probe_process.stdout or "{}"))
+
+
+class ProbeCache:
+    """SQLite cache of ffprobe results keyed by path.
+
+    An entry is only used while the file's size, mtime and inode still match, and the
+    least recently used entries are evicted once the cached probe data exceeds max_bytes.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, db_path, max_bytes=64 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS probe_cache ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, "
+                "probe_json TEXT, last_used REAL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS probe_cache_last_used ON probe_cache (last_used)"
+            )
+        self.total_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(probe_json)), 0) FROM probe_cache"
+        ).fetchone()[0]
+
+    @staticmethod
+    def fingerprint(path):
+        """(size, mtime_ns, inode) of a file. Raises OSError if it doesn't exist."""
+        stat_result = os.stat(path)
+        return stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino
+
+    def get(self, path, fingerprint):
+        """Returns the cached MediaInfo for path, or None if missing or stale."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, inode, probe_json FROM probe_cache WHERE path = ?",
+                (path,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if tuple(row[:3]) != tuple(fingerprint):  # File changed since it was probed
+                self._delete(path, len(row[3]))
+                self.misses += 1
+                return None
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE probe_cache SET last_used = ? WHERE path = ?",
+                    (time.time(), path),
+                )
+            self.hits += 1
+        try:
+            return MediaInfo(path, json.loads(row[3]))
+        except ValueError:
+            return None
+
+    def put(self, media_info, fingerprint):
+        probe_json = json.dumps(media_info.probe_data, separators=(",", ":"))
+        with self.lock:
+            old_row = self.connection.execute(
+                "SELECT LENGTH(probe_json) FROM probe_cache WHERE path = ?",
+                (media_info.path,),
+            ).fetchone()
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO probe_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (media_info.path, *fingerprint, probe_json, time.time()),
+                )
+            self.total_bytes += len(probe_json) - (old_row[0] if old_row else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _delete(self, path, entry_bytes):
+        with self.connection:
+            self.connection.execute("DELETE FROM probe_cache WHERE path = ?", (path,))
+        self.total_bytes -= entry_bytes
+
+    def _evict(self):
+        """Drops least recently used entries until the cache is at 90% of max_bytes."""
+        target_bytes = int(self.max_bytes * 0.9)
+        evicted_paths = []
+        for path, entry_bytes in self.connection.execute(
+            "SELECT path, LENGTH(probe_json) FROM probe_cache ORDER BY last_used"
+        ).fetchall():
+            if self.total_bytes <= target_bytes:
+                break
+            evicted_paths.append((path,))
+            self.total_bytes -= entry_bytes
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM probe_cache WHERE path = ?", evicted_paths
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
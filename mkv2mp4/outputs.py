@@ -0,0 +1,110 @@
+"""Hidden temporary outputs, renamed to their final name once the conversion is verified.
+
+An MP4 only appears under its final name when it is complete, so a crash or a
+killed process can never leave a truncated Movie.mp4 that the folder scan would
+take for a finished conversion. Leftover temporary outputs and segment work
+folders of interrupted runs are found by the startup sweep and the folder scan
+and removed once they are stale.
+"""
+
+import os
+import shutil
+
+from .segments import MANIFEST_FILE, WORK_DIR_SUFFIX
+
+TEMP_OUTPUT_PREFIX = "."  # Hidden on Linux/macOS, ignored by Plex
+TEMP_OUTPUT_SUFFIX = ".partial.mp4"  # Still .mp4, so ffmpeg picks the MP4 muxer
+# Leftovers touched more recently may belong to a conversion that is still
+# running, e.g. in a second instance using another state file
+STALE_LEFTOVER_SECONDS = 15 * 60
+
+
+# Final output name by retry level, so retried outputs don't overwrite earlier ones
+RETRY_OUTPUT_SUFFIXES = {0: "", 1: "_retry1", 2: "_retry2"}
+
+
+def output_path_for(source_path, retry_level=0):
+    """Movie.mkv -> Movie.mp4, or Movie_retry1.mp4 / Movie_retry2.mp4 when retried."""
+    return (
+        os.path.splitext(source_path)[0]
+        + RETRY_OUTPUT_SUFFIXES.get(retry_level, "")
+        + ".mp4"
+    )
+
+
+def temp_output_path(output_path):
+    """Movie.mp4 -> .Movie.partial.mp4 in the same folder, so the final rename is atomic."""
+    directory, name = os.path.split(output_path)
+    return os.path.join(
+        directory, TEMP_OUTPUT_PREFIX + os.path.splitext(name)[0] + TEMP_OUTPUT_SUFFIX
+    )
+
+
+def is_temp_output_name(name):
+    return name.startswith(TEMP_OUTPUT_PREFIX) and name.endswith(TEMP_OUTPUT_SUFFIX)
+
+
+def find_leftovers_in_listing(directory, file_names, subdirectory_names):
+    """Paths of temporary outputs and segment work folders in a directory listing."""
+    leftover_paths = [
+        os.path.join(directory, name) for name in file_names if is_temp_output_name(name)
+    ]
+    leftover_paths.extend(
+        os.path.join(directory, name)
+        for name in subdirectory_names
+        if name.endswith(WORK_DIR_SUFFIX)
+    )
+    return leftover_paths
+
+
+def find_leftovers(directory):
+    """Lists directory and returns its leftovers. Raises OSError if it can't be read."""
+    file_names = []
+    subdirectory_names = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if is_temp_output_name(entry.name):
+                file_names.append(entry.name)
+            elif entry.name.endswith(WORK_DIR_SUFFIX) and entry.is_dir(follow_symlinks=False):
+                subdirectory_names.append(entry.name)
+    return find_leftovers_in_listing(directory, file_names, subdirectory_names)
+
+
+def leftover_age(path, now):
+    """Seconds since a leftover was last written. A work folder counts as written
+    when its manifest was; folders without a manifest are not ours (None)."""
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+    return now - os.stat(path).st_mtime
+
+
+def remove_leftover(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def commit_output(temp_path, output_path):
+    """Flushes the finished temporary output to disk and renames it to output_path,
+    replacing an existing file. Raises OSError."""
+    file_descriptor = os.open(temp_path, os.O_RDONLY)
+    try:
+        os.fsync(file_descriptor)
+    except OSError:
+        pass  # Not supported for read-only handles on every platform
+    finally:
+        os.close(file_descriptor)
+    os.replace(temp_path, output_path)
+    if hasattr(os, "O_DIRECTORY"):  # Makes the rename itself durable (POSIX)
+        directory_descriptor = os.open(
+            os.path.dirname(output_path) or ".", os.O_RDONLY | os.O_DIRECTORY
+        )
+        try:
+            os.fsync(directory_descriptor)
+        except OSError:
+            pass
+        finally:
+            os.close(directory_descriptor)
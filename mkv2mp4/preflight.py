@@ -0,0 +1,124 @@
+"""Early detection of damaged sources: a sampled decode before a conversion, and
+an error-rate watchdog while one runs.
+
+Corruption often only shows near the end of a long encode. The pre-flight check
+decodes a few short windows (start, middle, end and random GOPs) with -xerror,
+which takes seconds, so a damaged file goes straight to an error-tolerant profile.
+"""
+
+import random
+import re
+import subprocess
+
+from .ffmpeg_tools import SUBPROCESS_CREATION_FLAGS
+
+PREFLIGHT_WINDOW_SECONDS = 10
+PREFLIGHT_RANDOM_WINDOWS = 2
+PREFLIGHT_WINDOW_TIMEOUT = 120  # A window that takes longer than this counts as damaged
+# The watchdog acts after this many decoding errors, once they exceed the rate
+WATCHDOG_MIN_ERRORS = 200
+DEFAULT_WATCHDOG_ERRORS_PER_MINUTE = 100  # Per minute of media; 0 turns the watchdog off
+
+# stderr lines of decoders and demuxers that report damaged data
+_DECODE_ERROR_PATTERN = re.compile(
+    r"error while decoding|invalid data found|corrupt|invalid nal unit"
+    r"|error splitting the input into nal units|missing reference picture"
+    r"|decode_slice_header error|concealing \d+|header missing"
+    r"|co located pocs unavailable|left block unavailable",
+    re.IGNORECASE,
+)
+# Timestamp complaints of the muxer, routine when remuxing; not damage
+_TIMESTAMP_WARNING_PATTERN = re.compile(
+    r"non[- ]?monoton|invalid (?:dts|pts)|timestamps are unset|pts has no value",
+    re.IGNORECASE,
+)
+
+
+def sample_windows(
+    path,
+    duration_seconds,
+    window_seconds=PREFLIGHT_WINDOW_SECONDS,
+    random_windows=PREFLIGHT_RANDOM_WINDOWS,
+):
+    """Start times of the windows to decode: first, middle, last and random ones.
+    The random starts depend on the path, so a file is always sampled the same way."""
+    last_start = max(0.0, duration_seconds - window_seconds)
+    starts = {0.0, round(last_start / 2, 1), round(last_start, 1)}
+    rng = random.Random(path)
+    for _ in range(random_windows):
+        starts.add(round(rng.uniform(0, last_start), 1))
+    return sorted(starts)
+
+
+def find_damage(
+    ffmpeg_path,
+    path,
+    duration_seconds,
+    should_stop=None,
+    window_seconds=PREFLIGHT_WINDOW_SECONDS,
+    random_windows=PREFLIGHT_RANDOM_WINDOWS,
+):
+    """Decodes the sampled windows of path (-ss before -i seeks to the GOP before
+    each start). Returns None if they decoded cleanly or should_stop() turned true,
+    else (window start in seconds, first error line)."""
+    for start in sample_windows(path, duration_seconds, window_seconds, random_windows):
+        if should_stop and should_stop():
+            return None
+        # Only errors are printed, and -xerror stops at the first one
+        cmd = [ffmpeg_path, "-nostdin", "-v", "error", "-xerror"]
+        cmd.extend(["-ss", f"{start:g}", "-t", str(window_seconds), "-i", path])
+        cmd.extend(["-map", "0:v:0?", "-map", "0:a?", "-f", "null", "-"])
+        try:
+            result = subprocess.run(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                timeout=PREFLIGHT_WINDOW_TIMEOUT,
+                creationflags=SUBPROCESS_CREATION_FLAGS,
+            )
+        except subprocess.TimeoutExpired:
+            return start, f"decoding took longer than {PREFLIGHT_WINDOW_TIMEOUT}s"
+        except OSError as e:
+            return start, str(e)
+        error_lines = [
+            line.strip() for line in result.stderr.splitlines() if line.strip()
+        ]
+        damage_lines = [
+            line for line in error_lines if not _TIMESTAMP_WARNING_PATTERN.search(line)
+        ]
+        if damage_lines:
+            return start, damage_lines[0]
+        if result.returncode != 0 and not error_lines:
+            return start, f"ffmpeg exited with code {result.returncode}"
+    return None
+
+
+class ErrorRateWatchdog:
+    """Counts decoding errors on a running ffmpeg's stderr. feed_line() is called
+    from the thread draining stderr, tripped() from the one reading progress."""
+
+    def __init__(self, errors_per_minute, min_errors=WATCHDOG_MIN_ERRORS):
+        self.errors_per_minute = errors_per_minute
+        self.min_errors = min_errors
+        self.error_count = 0
+
+    def feed_line(self, line):
+        if _DECODE_ERROR_PATTERN.search(line):
+            self.error_count += 1
+
+    def tripped(self, out_time_us):
+        """True once the errors per minute of media encoded so far exceed the limit."""
+        if self.error_count < self.min_errors:
+            return False
+        media_minutes = max(out_time_us or 0, 0) / 60_000_000
+        # Before the first minute, the rate is taken over one minute
+        return self.error_count > self.errors_per_minute * max(media_minutes, 1.0)
+
+    def describe(self, out_time_us):
+        return (
+            f"{self.error_count} decoding errors in the first "
+            f"{max(out_time_us or 0, 0) / 60_000_000:.1f} minute(s), above the limit "
+            f"of {self.errors_per_minute:g} per minute (corrupt source)"
+        )
@@ -0,0 +1,263 @@
+"""Named encoder settings, built in or loaded from a JSON or TOML profiles file.
+
+A profiles file can add profiles (optionally based on another one), override
+built-in ones, map the retry levels to profiles and pick the profile of each
+library folder:
+
+    {
+        "profiles": {
+            "fast": {"extends": "standard", "preset": "veryfast", "crf": 24},
+            "anime": {"extends": "standard", "preset": "slow", "crf": 20,
+                      "extra_video_args": ["-tune", "animation"]}
+        },
+        "retry_levels": {
+            "cpu": ["standard", "recovery", "lax"],
+            "gpu": ["standard_gpu", "recovery_gpu", "lax_gpu"]
+        },
+        "libraries": {"/media/Anime": "anime"}
+    }
+"""
+
+import json
+import os
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    tomllib = None
+
+# Setting -> (accepted types, default). None means the encoder's own default
+PROFILE_FIELDS = {
+    "label": (str, ""),
+    "encoder": (str, "libx264"),  # ffmpeg video encoder, e.g. libx265 or h264_nvenc
+    "profile": (str, None),  # Codec profile, -profile:v
+    "preset": (str, None),
+    "crf": ((int, float), None),  # Constant rate factor of libx264/libx265
+    "cq": ((int, float), None),  # Constant quality of NVENC
+    "pix_fmt": (str, None),
+    "extra_video_args": (list, []),
+    "audio_bitrate": (str, "192k"),  # For audio that is re-encoded to AAC
+    "input_args": (list, []),  # Placed before -i
+    # Decode past corrupt packets and regenerate timestamps, for damaged sources
+    "error_tolerant": (bool, False),
+    # Copy streams MP4 can hold as-is (with fast remux on); False always re-encodes
+    "remux": (bool, True),
+}
+ERROR_TOLERANCE_ARGS = ["-err_detect", "ignore_err", "-fflags", "+genpts+discardcorrupt"]
+RETRY_INPUT_ARGS = ["-analyzeduration", "20M", "-probesize", "20M"]
+HARDWARE_ENCODER_SUFFIXES = ("_nvenc", "_qsv", "_vaapi", "_amf", "_videotoolbox")
+# Output size relative to libx264 at the same quality setting
+ENCODER_SIZE_FACTORS = {"libx265": 0.6, "hevc_nvenc": 0.6, "libsvtav1": 0.5, "av1_nvenc": 0.5}
+DEFAULT_QUALITY = 23  # libx264's default CRF
+
+BUILTIN_PROFILES = {
+    "standard": {"label": "Standard (H.264 High)", "profile": "high"},
+    "recovery": {
+        "label": "Recovery (balanced)",
+        "profile": "main",
+        "preset": "medium",
+        "crf": 23,
+        "pix_fmt": "yuv420p",
+        "audio_bitrate": "128k",
+        "input_args": RETRY_INPUT_ARGS,
+        "error_tolerant": True,
+        "remux": False,
+    },
+    "lax": {
+        "label": "Recovery (lax)",
+        "profile": "baseline",
+        "preset": "ultrafast",
+        "crf": 28,
+        "pix_fmt": "yuv420p",
+        "audio_bitrate": "96k",
+        "input_args": RETRY_INPUT_ARGS,
+        "error_tolerant": True,
+        "remux": False,
+    },
+    "standard_gpu": {
+        "label": "Standard (NVENC)",
+        "encoder": "h264_nvenc",
+        "pix_fmt": "yuv420p",
+        "preset": "p5",
+        "cq": 23,
+    },
+    "recovery_gpu": {
+        "label": "Recovery (balanced, NVENC)",
+        "encoder": "h264_nvenc",
+        "pix_fmt": "yuv420p",
+        "preset": "p4",
+        "cq": 25,
+        "audio_bitrate": "128k",
+        "input_args": RETRY_INPUT_ARGS,
+        "error_tolerant": True,
+        "remux": False,
+    },
+    "lax_gpu": {
+        "label": "Recovery (lax, NVENC)",
+        "encoder": "h264_nvenc",
+        "pix_fmt": "yuv420p",
+        "preset": "p1",
+        "cq": 28,
+        "audio_bitrate": "96k",
+        "input_args": RETRY_INPUT_ARGS,
+        "error_tolerant": True,
+        "remux": False,
+    },
+}
+# Profile of each retry level (0, 1, 2), with CPU and with GPU encoding
+BUILTIN_RETRY_LEVELS = {
+    "cpu": ["standard", "recovery", "lax"],
+    "gpu": ["standard_gpu", "recovery_gpu", "lax_gpu"],
+}
+
+
+class EncodingProfile:
+    """One validated set of encoder settings. Raises ValueError for invalid settings."""
+
+    def __init__(self, name, settings):
+        self.name = name
+        for key, value in settings.items():
+            if key not in PROFILE_FIELDS:
+                raise ValueError(f"Profile '{name}': unknown setting '{key}'")
+            accepted_types = PROFILE_FIELDS[key][0]
+            if value is not None and (
+                not isinstance(value, accepted_types)
+                or (isinstance(value, bool) and accepted_types is not bool)
+            ):
+                raise ValueError(f"Profile '{name}': invalid value for '{key}': {value!r}")
+            if accepted_types is list and not all(isinstance(arg, str) for arg in value):
+                raise ValueError(f"Profile '{name}': '{key}' must be a list of strings")
+        for key, (_, default) in PROFILE_FIELDS.items():
+            value = settings.get(key, default)
+            setattr(self, key, list(value) if isinstance(value, list) else value)
+
+    @property
+    def is_hardware(self):
+        return self.encoder.endswith(HARDWARE_ENCODER_SUFFIXES)
+
+    @property
+    def size_factor(self):
+        """Expected output size relative to the standard profile, for disk space estimates.
+        Six CRF/CQ steps roughly halve the bitrate."""
+        quality = self.crf if self.crf is not None else self.cq
+        if quality is None:
+            quality = DEFAULT_QUALITY
+        return ENCODER_SIZE_FACTORS.get(self.encoder, 1.0) * 2 ** (
+            (DEFAULT_QUALITY - quality) / 6
+        )
+
+    def video_args(self):
+        """ffmpeg options of the video encoder."""
+        args = ["-c:v", self.encoder]
+        if self.profile:
+            args.extend(["-profile:v", self.profile])
+        if self.preset:
+            args.extend(["-preset", self.preset])
+        if self.crf is not None:
+            args.extend(["-crf", f"{self.crf:g}"])
+        if self.cq is not None:
+            args.extend(["-cq", f"{self.cq:g}"])
+        if self.pix_fmt:
+            args.extend(["-pix_fmt", self.pix_fmt])
+        return args + self.extra_video_args
+
+    def error_args(self):
+        return list(ERROR_TOLERANCE_ARGS) if self.error_tolerant else []
+
+    def describe(self):
+        parts = [self.encoder]
+        if self.preset:
+            parts.append(f"preset {self.preset}")
+        if self.crf is not None:
+            parts.append(f"CRF {self.crf:g}")
+        if self.cq is not None:
+            parts.append(f"CQ {self.cq:g}")
+        parts.append(f"AAC {self.audio_bitrate}")
+        if self.error_tolerant:
+            parts.append("error-tolerant")
+        return ", ".join(parts)
+
+
+class ProfileRegistry:
+    """The built-in profiles plus those of a profiles file, the profile of each
+    retry level and the profiles chosen per library folder."""
+
+    def __init__(self, profile_settings=None, retry_levels=None, libraries=None):
+        raw_settings = dict(BUILTIN_PROFILES)
+        raw_settings.update(profile_settings or {})
+        self.profiles = {
+            name: EncodingProfile(name, self._resolve(name, raw_settings, []))
+            for name in raw_settings
+        }
+        self.retry_levels = dict(BUILTIN_RETRY_LEVELS)
+        for encoding, names in (retry_levels or {}).items():
+            if encoding not in BUILTIN_RETRY_LEVELS:
+                raise ValueError(f"retry_levels: unknown key '{encoding}', use 'cpu' or 'gpu'")
+            if not isinstance(names, list) or len(names) != 3:
+                raise ValueError(f"retry_levels.{encoding}: expected 3 profile names (levels 0-2)")
+            self.retry_levels[encoding] = names
+        # Longest folder first, so the most specific library wins
+        self.libraries = sorted(
+            (
+                (os.path.normcase(os.path.normpath(folder)), name)
+                for folder, name in (libraries or {}).items()
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        for name in [
+            name for names in self.retry_levels.values() for name in names
+        ] + [name for _, name in self.libraries]:
+            if name not in self.profiles:
+                raise ValueError(f"Unknown profile '{name}'")
+
+    @classmethod
+    def load(cls, path):
+        """Reads a .json or .toml profiles file. Raises OSError or ValueError."""
+        if path.endswith(".toml"):
+            if tomllib is None:
+                raise ValueError("TOML profiles files need Python 3.11 or newer")
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        else:
+            with open(path, "r") as f:
+                data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("Expected an object with 'profiles', 'retry_levels' and 'libraries'")
+        return cls(data.get("profiles"), data.get("retry_levels"), data.get("libraries"))
+
+    @staticmethod
+    def _resolve(name, raw_settings, chain):
+        """Settings of a profile merged over those of the profile it extends."""
+        if name in chain:
+            raise ValueError(f"Profile '{name}' extends itself: {' -> '.join(chain + [name])}")
+        if name not in raw_settings:
+            raise ValueError(f"Unknown profile '{name}'")
+        settings = raw_settings[name]
+        if not isinstance(settings, dict):
+            raise ValueError(f"Profile '{name}' must be a table of settings")
+        settings = dict(settings)
+        parent_name = settings.pop("extends", None)
+        if parent_name is None:
+            return settings
+        merged = ProfileRegistry._resolve(parent_name, raw_settings, chain + [name])
+        merged.update(settings)
+        return merged
+
+    def names(self):
+        return list(self.profiles)
+
+    def get(self, name):
+        return self.profiles.get(name)
+
+    def retry_profile(self, retry_level, use_gpu=False):
+        names = self.retry_levels["gpu" if use_gpu else "cpu"]
+        return self.profiles[names[min(retry_level, len(names) - 1)]]
+
+    def library_profile(self, path):
+        """Name of the profile set for the library folder holding path, or None."""
+        path = os.path.normcase(os.path.normpath(path))
+        for folder, name in self.libraries:
+            if path.startswith(folder.rstrip(os.sep) + os.sep):
+                return name
+        return None
@@ -0,0 +1,210 @@
+"""Incremental library scanner backed by a persistent directory index."""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .outputs import find_leftovers_in_listing
+
+VIDEO_EXTENSIONS_TO_SCAN = (
+    ".mkv",
+    ".avi",
+    ".mov",
+    ".flv",
+    ".wmv",
+    ".mpeg",
+    ".mpg",
+    ".ts",
+    ".m2ts",
+)
+# Outputs of a standard conversion and of the two retry levels
+CONVERTED_SUFFIXES = (".mp4", "_retry1.mp4", "_retry2.mp4")
+# A directory modified this recently may change again within the same mtime tick
+# (2s on FAT/SMB), so its listing is not trusted on the next scan
+RACY_MTIME_NS = 2 * 1000 * 1000 * 1000
+
+
+def find_unconverted_in_listing(directory, file_names):
+    """Returns the paths of the videos in a directory listing that have no MP4 version next to them."""
+    normalized_names = {os.path.normcase(name) for name in file_names}
+    unconverted_paths = []
+    for name in file_names:
+        if not name.lower().endswith(VIDEO_EXTENSIONS_TO_SCAN):
+            continue
+        base_name = os.path.normcase(os.path.splitext(name)[0])
+        if not any(base_name + suffix in normalized_names for suffix in CONVERTED_SUFFIXES):
+            unconverted_paths.append(os.path.join(directory, name))
+    return unconverted_paths
+
+
+def is_unconverted_video(file_path):
+    """True if file_path is a video that has no MP4 version next to it. Checks a single file found by the folder watch."""
+    if not file_path.lower().endswith(VIDEO_EXTENSIONS_TO_SCAN):
+        return False
+    base_name = os.path.splitext(file_path)[0]
+    return os.path.isfile(file_path) and not any(
+        os.path.exists(base_name + suffix) for suffix in CONVERTED_SUFFIXES
+    )
+
+
+class LibraryScanner:
+    """Finds unconverted videos below a folder without re-reading unchanged directories.
+
+    The index maps each directory to its mtime and its file and subdirectory names.
+    A directory whose mtime is unchanged is not listed again; only its subdirectories
+    are stat'ed, so a scan of an unchanged library costs one stat per directory.
+    The index is kept in SQLite at db_path so it survives restarts; with db_path None
+    it only lives for this process.
+    """
+
+    def __init__(self, db_path=None):
+        self.lock = threading.Lock()
+        self.entries = {}  # directory -> (mtime_ns, file_names, subdirectory_names)
+        self.connection = None
+        if db_path:
+            self.connection = sqlite3.connect(
+                db_path, timeout=10, check_same_thread=False
+            )
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS directory_index ("
+                    "path TEXT PRIMARY KEY, mtime_ns INTEGER, files_json TEXT, "
+                    "subdirs_json TEXT)"
+                )
+            for path, mtime_ns, files_json, subdirs_json in self.connection.execute(
+                "SELECT path, mtime_ns, files_json, subdirs_json FROM directory_index"
+            ):
+                self.entries[path] = (
+                    mtime_ns,
+                    json.loads(files_json),
+                    json.loads(subdirs_json),
+                )
+        self.last_scan_stats = {"listed": 0, "reused": 0, "unconverted": 0}
+        # Temporary outputs and segment work folders seen by the last scan
+        self.last_scan_leftovers = []
+
+    def find_unconverted_files(self, root, on_error=None):
+        """Returns the videos below root that have no MP4 version next to them yet.
+
+        on_error(path, exception) is called for directories that can't be read; they are skipped.
+        """
+        root = os.path.normpath(root)
+        scan_started_ns = time.time_ns()
+        unconverted_paths = []
+        leftover_paths = []
+        changed_entries = {}
+        visited_directories = set()
+        stats = {"listed": 0, "reused": 0, "unconverted": 0}
+
+        with self.lock:
+            pending_directories = [root]
+            while pending_directories:
+                directory = pending_directories.pop()
+                try:
+                    mtime_ns = os.stat(directory).st_mtime_ns
+                except OSError as e:
+                    if on_error:
+                        on_error(directory, e)
+                    continue
+                visited_directories.add(directory)
+
+                cached_entry = self.entries.get(directory)
+                if cached_entry and cached_entry[0] == mtime_ns:
+                    _, file_names, subdirectory_names = cached_entry
+                    stats["reused"] += 1
+                else:
+                    try:
+                        file_names, subdirectory_names = self._list_directory(directory)
+                    except OSError as e:
+                        if on_error:
+                            on_error(directory, e)
+                        continue
+                    stats["listed"] += 1
+                    if scan_started_ns - mtime_ns < RACY_MTIME_NS:
+                        mtime_ns = -1  # Forces a new listing on the next scan
+                    changed_entries[directory] = (
+                        mtime_ns,
+                        file_names,
+                        subdirectory_names,
+                    )
+
+                unconverted_paths.extend(
+                    find_unconverted_in_listing(directory, file_names)
+                )
+                leftover_paths.extend(
+                    find_leftovers_in_listing(directory, file_names, subdirectory_names)
+                )
+                pending_directories.extend(
+                    os.path.join(directory, name)
+                    for name in reversed(subdirectory_names)
+                )
+
+            # Directories below root that were not reached no longer exist
+            root_prefix = os.path.join(root, "")
+            removed_directories = [
+                path
+                for path in self.entries
+                if (path == root or path.startswith(root_prefix))
+                and path not in visited_directories
+            ]
+            for path in removed_directories:
+                del self.entries[path]
+            self.entries.update(changed_entries)
+            try:
+                self._persist(changed_entries, removed_directories)
+            except sqlite3.Error as e:  # The in-memory index is still up to date
+                if on_error:
+                    on_error("directory index", e)
+
+        stats["unconverted"] = len(unconverted_paths)
+        self.last_scan_stats = stats
+        self.last_scan_leftovers = leftover_paths
+        return unconverted_paths
+
+    @staticmethod
+    def _list_directory(directory):
+        """(file names, subdirectory names) of a directory. Symlinked directories are not followed, like os.walk."""
+        file_names = []
+        subdirectory_names = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    is_directory = entry.is_dir()
+                except OSError:
+                    is_directory = False
+                if not is_directory:
+                    file_names.append(entry.name)
+                elif not entry.is_symlink():
+                    subdirectory_names.append(entry.name)
+        file_names.sort()
+        subdirectory_names.sort()
+        return file_names, subdirectory_names
+
+    def _persist(self, changed_entries, removed_directories):
+        if not self.connection or not (changed_entries or removed_directories):
+            return
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM directory_index WHERE path = ?",
+                [(path,) for path in removed_directories],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO directory_index VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        path,
+                        mtime_ns,
+                        json.dumps(file_names, separators=(",", ":")),
+                        json.dumps(subdirectory_names, separators=(",", ":")),
+                    )
+                    for path, (mtime_ns, file_names, subdirectory_names) in changed_entries.items()
+                ],
+            )
+
+    def close(self):
+        with self.lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
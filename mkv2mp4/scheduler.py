@@ -0,0 +1,135 @@
+"""Order in which the batch workers take files from the queue."""
+
+import heapq
+import itertools
+import os
+
+# Policy name -> label shown in the GUI
+SCHEDULING_POLICIES = {
+    "fifo": "Queue order",
+    "shortest": "Shortest duration first",
+    "smallest": "Smallest file first",
+    "newest": "Newest file first",
+    "priority": "Priority",
+}
+DEFAULT_POLICY = "fifo"
+# With the priority policy, a waiting file gains one priority level per this many
+# seconds, so low-priority files are not starved by a stream of new ones
+PRIORITY_AGING_SECONDS = 15 * 60
+
+_LAST = float("inf")  # Sort key of files whose duration, size or date is unknown
+
+
+class JobScheduler:
+    """Hands out the records of one batch in the order of a scheduling policy.
+
+    The records are kept in a heap, so taking the next one costs O(log n) even for
+    a very large queue. Keys are computed once per record: the source's duration
+    (via duration_of(path), which should use the probe cache), size or modification
+    time. The priority key is queued_at - priority * PRIORITY_AGING_SECONDS, which
+    orders by priority plus waiting time without changing as time passes. When a
+    waiting record's priority changes, update() adds it again with the new key and
+    the old heap entry is skipped when it comes up. Ties keep queue order.
+    Records that can't start yet are set aside with defer() and come back in their
+    old place with restore_deferred(). Not thread-safe; callers hold the job lock.
+    """
+
+    def __init__(self, policy, records, duration_of=None):
+        self.policy = policy if policy in SCHEDULING_POLICIES else DEFAULT_POLICY
+        self.duration_of = duration_of
+        self._order = itertools.count()  # Queue order, the tie-breaker
+        self._entry_numbers = itertools.count()  # Records themselves are never compared
+        self._heap = []
+        self._orders = {}  # job_id -> queue order
+        self._waiting = set()  # job_ids of the records not handed out yet
+        self._deferred = []
+        self._ever_deferred = set()  # job_ids
+        self._source_keys = {}  # job_id -> key of the duration/size/date policies
+        for record in records:
+            self._orders[record.job_id] = next(self._order)
+            self.push_back(record)
+
+    def __len__(self):
+        return len(self._waiting)
+
+    @property
+    def deferred_count(self):
+        return len(self._deferred)
+
+    def push_back(self, record):
+        """Returns a record handed out by pop() to its place in the order."""
+        self._waiting.add(record.job_id)
+        self._push(record)
+
+    def defer(self, record):
+        """Keeps a record handed out by pop() aside until restore_deferred()."""
+        self._deferred.append(record)
+        self._ever_deferred.add(record.job_id)
+
+    def was_deferred(self, record):
+        return record.job_id in self._ever_deferred
+
+    def restore_deferred(self):
+        deferred_records = self._deferred
+        self._deferred = []
+        for record in deferred_records:
+            self.push_back(record)
+
+    def update(self, record):
+        """Re-sorts a waiting record after its priority changed."""
+        if self.policy == "priority" and record.job_id in self._waiting:
+            self._push(record)
+
+    def pop(self):
+        """Returns the next record, or None when the batch has none left."""
+        while self._heap:
+            key, _, _, record = heapq.heappop(self._heap)
+            if record.job_id not in self._waiting:
+                continue  # Handed out through a newer entry
+            if self.policy == "priority" and key != self._key(record):
+                continue  # Superseded by the entry update() added
+            self._waiting.discard(record.job_id)
+            return record
+        return None
+
+    def peek(self):
+        """Returns the record pop() would return next, without handing it out."""
+        while self._heap:
+            key, _, _, record = self._heap[0]
+            if record.job_id in self._waiting and not (
+                self.policy == "priority" and key != self._key(record)
+            ):
+                return record
+            heapq.heappop(self._heap)  # Stale entry, see pop()
+        return None
+
+    def _push(self, record):
+        heapq.heappush(
+            self._heap,
+            (
+                self._key(record),
+                self._orders[record.job_id],
+                next(self._entry_numbers),
+                record,
+            ),
+        )
+
+    def _key(self, record):
+        if self.policy == "priority":
+            return record.queued_at - record.priority * PRIORITY_AGING_SECONDS
+        if record.job_id not in self._source_keys:
+            self._source_keys[record.job_id] = self._source_key(record)
+        return self._source_keys[record.job_id]
+
+    def _source_key(self, record):
+        if self.policy == "shortest":
+            duration = self.duration_of(record.path) if self.duration_of else None
+            return duration if duration else _LAST
+        try:
+            if self.policy == "smallest":
+                return os.path.getsize(record.path)
+            if self.policy == "newest":
+                return -os.path.getmtime(record.path)
+        except OSError:  # Missing files fail quickly, at the end
+            return _LAST
+        return 0  # fifo: queue order only
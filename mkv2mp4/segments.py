@@ -0,0 +1,117 @@
+"""Work folder of a segmented (resumable) conversion.
+
+The video is encoded in independent time ranges, each written to its own file in
+a work folder next to the output. The ranges can be encoded one after another or
+by several ffmpeg processes at once. A finished segment is recorded in the folder's
+manifest, so a conversion that is cancelled, crashes or is interrupted by closing
+the app picks up at the first unfinished segment. Audio and subtitles are
+converted once for the whole file. The final step concatenates the video segments
+and muxes them with the audio and subtitles into the MP4.
+"""
+
+import json
+import os
+import shutil
+import threading
+
+SEGMENT_SECONDS = 300  # Length of a video segment; at most this much work is lost
+MIN_SEGMENT_SECONDS = 60  # Shortest segment when a short file is split for parallel encoding
+WORK_DIR_SUFFIX = ".parts"  # Movie.mp4 -> Movie.mp4.parts/
+MANIFEST_FILE = "manifest.json"
+AUDIO_SUBTITLES_FILE = "audio_subtitles.mp4"
+CONCAT_LIST_FILE = "video_segments.txt"
+
+
+def segment_length(duration_seconds, parallel_segments=1):
+    """Segment length for a file. Parallel encoding shortens the segments of short
+    files so every process gets one, but never below MIN_SEGMENT_SECONDS. Long files
+    keep SEGMENT_SECONDS, so changing the number of processes doesn't invalidate
+    the segments of an interrupted conversion.
+    """
+    if parallel_segments <= 1:
+        return SEGMENT_SECONDS
+    return max(
+        MIN_SEGMENT_SECONDS,
+        min(SEGMENT_SECONDS, int(duration_seconds / parallel_segments)),
+    )
+
+
+def plan_segments(duration_seconds, segment_seconds=SEGMENT_SECONDS):
+    """(start, length) of each segment. The last segment has no length, so it runs to the end of the file."""
+    segments = []
+    start = 0.0
+    while duration_seconds - start > segment_seconds * 1.5:
+        segments.append((start, float(segment_seconds)))
+        start += segment_seconds
+    segments.append((start, None))  # Absorbs rounding in the probed duration
+    return segments
+
+
+class SegmentWorkDir:
+    """Work folder and manifest of one output file.
+
+    signature identifies the source file and the encoding settings. If the
+    manifest was written for a different signature, the folder is emptied, so
+    segments are never mixed across a changed source or changed settings.
+    mark_done() and is_done() may be called from several segment workers at once.
+    """
+
+    def __init__(self, output_file_path, signature):
+        self.path = output_file_path + WORK_DIR_SUFFIX
+        self.signature = json.loads(json.dumps(signature))  # As read back from the manifest
+        self.completed = set()  # Names of the finished parts: segment numbers and "audio"
+        self._manifest_lock = threading.Lock()  # One manifest write at a time
+
+    def open(self):
+        """Creates the folder or loads its manifest. Returns the number of finished parts that are reused."""
+        manifest = None
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE), "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if manifest and manifest.get("signature") == self.signature:
+            self.completed = set(manifest.get("completed", []))
+            # Only parts whose file survived count as finished
+            self.completed = {
+                name for name in self.completed if os.path.exists(self.part_path(name))
+            }
+        else:
+            self.remove()
+            self.completed = set()
+        os.makedirs(self.path, exist_ok=True)
+        return len(self.completed)
+
+    def part_path(self, name):
+        if name == "audio":
+            return os.path.join(self.path, AUDIO_SUBTITLES_FILE)
+        return os.path.join(self.path, f"segment_{int(name):05d}.mp4")
+
+    def is_done(self, name):
+        with self._manifest_lock:
+            return str(name) in self.completed
+
+    def mark_done(self, name):
+        """Records a finished part. The manifest is replaced atomically, so a crash leaves the old or the new one."""
+        with self._manifest_lock:
+            self.completed.add(str(name))
+            completed = sorted(self.completed)
+            manifest_path = os.path.join(self.path, MANIFEST_FILE)
+            temp_manifest_path = manifest_path + ".tmp"
+            with open(temp_manifest_path, "w") as f:
+                json.dump({"signature": self.signature, "completed": completed}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_manifest_path, manifest_path)
+
+    def write_concat_list(self, segment_count):
+        """Writes the concat demuxer list of the video segments. Returns its path."""
+        list_path = os.path.join(self.path, CONCAT_LIST_FILE)
+        with open(list_path, "w", encoding="utf-8") as f:
+            for segment_number in range(segment_count):
+                segment_name = os.path.basename(self.part_path(segment_number))
+                f.write(f"file '{segment_name}'\n")  # Relative to the list file
+        return list_path
+
+    def remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
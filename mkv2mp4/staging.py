@@ -0,0 +1,193 @@
+"""Local scratch copies of sources on network shares, see ScratchStager."""
+
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+
+from .iohints import advise_sequential, drop_cached_pages
+
+COPY_BUFFER_BYTES = 16 * 1024 * 1024  # Few, large sequential requests over NFS/SMB
+DEFAULT_SCRATCH_LIMIT_GB = 50
+
+
+def copy_file(source_path, target_path, should_stop=None, drop_source=False):
+    """Copies source_path to target_path in COPY_BUFFER_BYTES chunks. Returns False,
+    leaving target_path partly written, once should_stop() is true. With drop_source,
+    the source's pages are evicted from the page cache after a full copy.
+    Raises OSError."""
+    buffer = bytearray(COPY_BUFFER_BYTES)
+    view = memoryview(buffer)
+    with open(source_path, "rb", buffering=0) as source, open(
+        target_path, "wb", buffering=0
+    ) as target:
+        advise_sequential(source.fileno())
+        while True:
+            if should_stop and should_stop():
+                return False
+            read_bytes = source.readinto(buffer)
+            if not read_bytes:
+                if drop_source:
+                    drop_cached_pages(source.fileno())
+                return True
+            written_bytes = 0
+            while written_bytes < read_bytes:
+                written_bytes += target.write(view[written_bytes:read_bytes])
+
+
+def _source_signature(path):
+    stat_result = os.stat(path)
+    return stat_result.st_size, stat_result.st_mtime_ns
+
+
+class StagedSource:
+    """Local copy of one source, and the local path its output is written to."""
+
+    def __init__(self, source_path, local_path, reserved_bytes):
+        self.source_path = source_path
+        self.local_path = local_path
+        self.output_path = os.path.splitext(local_path)[0] + ".partial.mp4"
+        self.reserved_bytes = reserved_bytes
+        self.signature = None  # (size, mtime) of the source when it was copied
+        self.copied = False
+        self.error = None  # OSError of a failed copy
+        self.released = False  # Set by release(); stops a copy still running
+        self.done = threading.Event()  # Set when the copy finished, failed or stopped
+
+
+class ScratchStager:
+    """Copies sources to a private folder on a local scratch disk (SSD or tmpfs).
+
+    ffmpeg then reads and seeks locally and writes its output locally too, so the
+    network only sees one sequential read of each source and one sequential write
+    of the verified MP4. Each staged file reserves its source size plus the estimated
+    output size; together they stay below limit_bytes, and files that don't fit
+    are converted in place. prefetch() copies the next queued file in the background
+    while the current ones encode, one at a time. Thread-safe.
+    """
+
+    def __init__(self, directory, limit_bytes, cache_hints=False):
+        # Private folder, so leftovers of other runs or instances are never touched
+        self.path = tempfile.mkdtemp(prefix="mkv2mp4-scratch-", dir=directory or None)
+        # Never plan on more than the disk has free right now
+        self.limit_bytes = min(limit_bytes, shutil.disk_usage(self.path).free)
+        # Sources are only read for the copy, so their pages are dropped after it
+        self.cache_hints = cache_hints
+        self._lock = threading.Lock()
+        self._staged = {}  # source path -> StagedSource
+        self._reserved_bytes = 0
+        self._prefetching = None  # StagedSource being copied by the prefetch thread
+        self._names = itertools.count(1)
+        self._closed = False
+
+    def prefetch(self, source_path, needed_bytes):
+        """Starts copying source_path in the background unless it is staged already,
+        another prefetch is running or it doesn't fit. Returns True if started."""
+        with self._lock:
+            if self._closed or self._prefetching or source_path in self._staged:
+                return False
+            staged = self._reserve(source_path, needed_bytes)
+            if staged is None:
+                return False
+            self._prefetching = staged
+        threading.Thread(
+            target=self._copy, args=(staged,), name="ScratchPrefetch", daemon=True
+        ).start()
+        return True
+
+    def stage(self, source_path, needed_bytes, should_stop=None):
+        """Returns the StagedSource of source_path, copying it now unless a prefetch
+        did or is doing so. Returns None if it doesn't fit in the limit or
+        should_stop() turned true while copying. Raises OSError if the copy failed."""
+        with self._lock:
+            staged = self._staged.get(source_path)
+            if staged is None:
+                staged = self._reserve(source_path, needed_bytes)
+                if staged is None:
+                    return None
+                copy_now = True
+            else:
+                copy_now = False
+        if copy_now:
+            self._copy(staged, should_stop)
+        else:
+            while not staged.done.wait(0.2):  # The prefetch is still copying
+                if should_stop and should_stop():
+                    return None  # The prefetch finishes on its own; released later
+            try:
+                unchanged = staged.copied and staged.signature == _source_signature(
+                    source_path
+                )
+            except OSError:
+                unchanged = False
+            if not unchanged:  # Failed, or the source was replaced after the prefetch
+                self.release(source_path)
+                return self.stage(source_path, needed_bytes, should_stop)
+        if staged.error:
+            self.release(source_path)
+            raise staged.error
+        if not staged.copied:
+            self.release(source_path)
+            return None
+        return staged
+
+    def release(self, source_path):
+        """Deletes the local copy and output of source_path and frees its reservation.
+        A prefetch still copying it stops at its next chunk."""
+        with self._lock:
+            staged = self._staged.pop(source_path, None)
+            if staged is None:
+                return
+            staged.released = True
+            self._reserved_bytes -= staged.reserved_bytes
+        for path in (staged.local_path, staged.output_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Never written, or the folder is already gone
+
+    def close(self):
+        """Stops a running prefetch and deletes the scratch folder."""
+        with self._lock:
+            self._closed = True
+            self._staged.clear()
+            self._reserved_bytes = 0
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _reserve(self, source_path, needed_bytes):
+        """Called with the lock held. Returns a new StagedSource, or None if it doesn't fit."""
+        if self._reserved_bytes + needed_bytes > self.limit_bytes:
+            return None
+        local_path = os.path.join(
+            self.path, f"{next(self._names)}-{os.path.basename(source_path)}"
+        )
+        staged = StagedSource(source_path, local_path, needed_bytes)
+        self._staged[source_path] = staged
+        self._reserved_bytes += needed_bytes
+        return staged
+
+    def _copy(self, staged, should_stop=None):
+        try:
+            staged.signature = _source_signature(staged.source_path)
+            staged.copied = copy_file(
+                staged.source_path,
+                staged.local_path,
+                lambda: self._closed
+                or staged.released
+                or bool(should_stop and should_stop()),
+                drop_source=self.cache_hints,
+            )
+        except OSError as e:
+            staged.error = e
+        finally:
+            with self._lock:
+                if self._prefetching is staged:
+                    self._prefetching = None
+                released = staged.released
+            if released:  # release() ran while copying, maybe before the file existed
+                try:
+                    os.remove(staged.local_path)
+                except OSError:
+                    pass
+            staged.done.set()
@@ -0,0 +1,185 @@
+"""Verification of finished outputs before they replace, and may delete, the original.
+
+A size threshold can't tell a truncated feature film from a complete short clip.
+verify_output() checks that the MP4 is structurally complete (moov atom, no box
+running past the end of the file), probes it and compares duration and streams
+with the source, and decodes a few sampled frames. The Verdict lists every
+check, and VerdictLog keeps one JSON line per verified file.
+"""
+
+import json
+import logging
+import os
+import struct
+import time
+
+from .logs import CompressingRotatingFileHandler
+from .media import probe_media
+from .preflight import find_damage
+
+VERDICTS_FILE = "mkv_converter_verdicts.jsonl"  # Next to the state file
+# Allowed difference between output and source duration: the larger of the two
+DURATION_TOLERANCE_SECONDS = 2.0
+DURATION_TOLERANCE_RATIO = 0.01
+SAMPLE_WINDOW_SECONDS = 2  # Decoded at the start, middle, end and one random spot
+SAMPLE_RANDOM_WINDOWS = 1
+
+
+def read_mp4_boxes(path):
+    """Types of the top-level boxes of an MP4 file, and whether the last one runs
+    past the end of the file (a truncated write). Raises OSError."""
+    box_types = []
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            box_size, box_type = struct.unpack(">I4s", f.read(8))
+            if box_size == 1:  # 64-bit size follows the type
+                box_size = struct.unpack(">Q", f.read(8))[0]
+            elif box_size == 0:  # Box extends to the end of the file
+                box_size = file_size - offset
+            box_types.append(box_type.decode("latin-1"))
+            if box_size < 8:
+                return box_types, True  # Corrupt header
+            offset += box_size
+        return box_types, offset != file_size
+
+
+class Verdict:
+    """Outcome of verifying one output: the checks that ran, in order."""
+
+    def __init__(self, output_path, source_path):
+        self.output_path = output_path
+        self.source_path = source_path
+        self.checks = []  # (name, passed, detail)
+        self.checked_at = time.time()
+
+    def add(self, name, passed, detail=""):
+        self.checks.append((name, passed, detail))
+        return passed
+
+    @property
+    def passed(self):
+        return bool(self.checks) and all(passed for _, passed, _ in self.checks)
+
+    def failures(self):
+        return [f"{name}: {detail}" for name, passed, detail in self.checks if not passed]
+
+    def summary(self):
+        if self.passed:
+            return "; ".join(
+                f"{name} {detail}".rstrip() for name, _, detail in self.checks
+            )
+        return "; ".join(self.failures())
+
+    def as_dict(self):
+        return {
+            "output": self.output_path,
+            "source": self.source_path,
+            "checked_at": round(self.checked_at, 3),
+            "passed": self.passed,
+            "checks": [
+                {"name": name, "passed": passed, "detail": detail}
+                for name, passed, detail in self.checks
+            ],
+        }
+
+
+def verify_output(
+    ffmpeg_path, ffprobe_path, output_path, source_media_info, source_path
+):
+    """Returns the Verdict of output_path. Stops at the first failed check; the
+    source comparisons are skipped if the source couldn't be probed."""
+    verdict = Verdict(output_path, source_path)
+    try:
+        output_size = os.path.getsize(output_path)
+        if not verdict.add("size", output_size > 0, f"{output_size} bytes"):
+            return verdict
+        box_types, truncated = read_mp4_boxes(output_path)
+    except OSError as e:
+        verdict.add("readable", False, str(e))
+        return verdict
+    if truncated:
+        structure = "truncated"
+    elif "moov" not in box_types:
+        structure = "no moov atom"
+    else:
+        structure = "ok"
+    if not verdict.add("structure", structure == "ok", structure):
+        return verdict
+
+    try:
+        output_info = probe_media(ffprobe_path, output_path)
+    except Exception as e:
+        verdict.add("probe", False, str(e).strip() or type(e).__name__)
+        return verdict
+
+    if source_media_info and source_media_info.duration > 0:
+        source_duration = source_media_info.duration
+        tolerance = max(
+            DURATION_TOLERANCE_SECONDS, source_duration * DURATION_TOLERANCE_RATIO
+        )
+        if not verdict.add(
+            "duration",
+            abs(output_info.duration - source_duration) <= tolerance,
+            f"{output_info.duration:.1f}s of {source_duration:.1f}s",
+        ):
+            return verdict
+    if source_media_info:
+        # Every source with video keeps one video stream. Audio streams may be
+        # dropped (e.g. only the default one without a stream plan), but not all
+        source_audio = len(source_media_info.audio_streams)
+        output_audio = len(output_info.audio_streams)
+        output_video = 1 if output_info.video_stream else 0
+        source_video = 1 if source_media_info.video_stream else 0
+        if not verdict.add(
+            "streams",
+            output_video == source_video
+            and (output_audio >= 1 if source_audio else output_audio == 0)
+            and output_audio <= source_audio,
+            f"video {output_video}/{source_video}, audio {output_audio}/{source_audio}",
+        ):
+            return verdict
+
+    if output_info.duration > 0:
+        damage = find_damage(
+            ffmpeg_path,
+            output_path,
+            output_info.duration,
+            window_seconds=SAMPLE_WINDOW_SECONDS,
+            random_windows=SAMPLE_RANDOM_WINDOWS,
+        )
+        verdict.add(
+            "decode",
+            damage is None,
+            "ok" if damage is None else f"at {damage[0]:g}s: {damage[1]}",
+        )
+    return verdict
+
+
+class _VerdictFileHandler(CompressingRotatingFileHandler):
+    """Raises write errors instead of printing them, as logging handlers do, so a
+    verdict that couldn't be recorded is reported by the caller."""
+
+    def handleError(self, record):
+        raise  # Only called from the except block of emit()
+
+
+class VerdictLog:
+    """Appends verdicts as JSON lines to a size-rotated file. Thread-safe.
+    record() raises OSError if the verdict couldn't be written."""
+
+    def __init__(self, path):
+        self.handler = _VerdictFileHandler(path)
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def record(self, verdict):
+        self.handler.handle(
+            logging.makeLogRecord(
+                {"msg": json.dumps(verdict.as_dict()), "levelno": logging.INFO}
+            )
+        )
+
+    def close(self):
+        self.handler.close()
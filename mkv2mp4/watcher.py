@@ -0,0 +1,146 @@
+"""Recursive folder watching with Linux inotify, used to queue new files within seconds.
+
+Talks to libc through ctypes, so there is no extra dependency. On other systems, or
+when the watches can't be set up (e.g. fs.inotify.max_user_watches is exhausted),
+FolderWatcher raises OSError and monitoring falls back to the periodic scan.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+# Files are reported once their writer closes them (a finished copy) or when they
+# are moved in; IN_CREATE is only used to pick up new directories
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+# struct inotify_event: wd, mask, cookie, len, followed by len bytes of name
+EVENT_HEADER = struct.Struct("iIII")
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_uint32,
+            ]
+        except (OSError, AttributeError) as e:
+            raise OSError(errno.ENOSYS, f"inotify is not available: {e}")
+        _libc = libc
+    return _libc
+
+
+class FolderWatcher:
+    """inotify watches on a folder and all its subfolders, including ones created later.
+
+    read_events() returns the files that were written or moved into the tree. Symlinked
+    folders are not followed, like the periodic scan.
+    """
+
+    def __init__(self, root):
+        self.libc = _load_libc()
+        self.watch_paths = {}  # watch descriptor -> folder path
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+        try:
+            self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory):
+        watch_descriptor = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), WATCH_MASK
+        )
+        if watch_descriptor < 0:
+            error_number = ctypes.get_errno()
+            if error_number == errno.ENOENT:
+                return  # Deleted while the tree was being walked
+            if error_number == errno.ENOSPC:
+                raise OSError(
+                    error_number,
+                    "inotify watch limit reached, raise fs.inotify.max_user_watches",
+                    directory,
+                )
+            raise OSError(error_number, os.strerror(error_number), directory)
+        # A folder moved within the tree keeps its descriptor; this updates its path
+        self.watch_paths[watch_descriptor] = directory
+
+    def _watch_tree(self, root):
+        """Watches root and its subfolders. Returns the files already in them."""
+        file_paths = []
+        for directory, _, file_names in os.walk(root):
+            self._add_watch(directory)
+            file_paths.extend(os.path.join(directory, name) for name in file_names)
+        return file_paths
+
+    def read_events(self, timeout):
+        """Waits up to timeout seconds for events.
+
+        Returns (file_paths, rescan_needed). rescan_needed is True when events were lost
+        (queue overflow) or a new folder could not be watched.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return [], False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return [], False
+
+        file_paths = []
+        rescan_needed = False
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            watch_descriptor, mask, _, name_length = EVENT_HEADER.unpack_from(
+                data, offset
+            )
+            name_start = offset + EVENT_HEADER.size
+            name = data[name_start : name_start + name_length].split(b"\0", 1)[0]
+            offset = name_start + name_length
+
+            if mask & IN_Q_OVERFLOW:
+                rescan_needed = True
+                continue
+            if mask & IN_IGNORED:  # Folder deleted or unmounted
+                self.watch_paths.pop(watch_descriptor, None)
+                continue
+            directory = self.watch_paths.get(watch_descriptor)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        # Files created before the watch was added are reported too
+                        file_paths.extend(self._watch_tree(path))
+                    except OSError:
+                        rescan_needed = True
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                file_paths.append(path)
+        return file_paths, rescan_needed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
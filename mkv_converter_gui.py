@@ -1,24 +1,473 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import subprocess
-import threading
+import tkinter.font as tkfont
+import collections
+import logging
 import os
 import sys
-import re  # For parsing ffmpeg output
-import time
-import psutil  # For process pause/resume
+import threading
 from datetime import datetime  # For log timestamps
-import json  # For saving/loading application state
 
+from mkv2mp4.engine import (
+    OUTPUT_FORMATS,
+    STATE_FILE,
+    ConversionEngine,
+    ConversionEngineListener,
+)
+from mkv2mp4.logs import (
+    LOG_DATE_FORMAT,
+    LOG_FILE,
+    LOG_FORMAT,
+    LOG_LEVELS,
+    MAX_LOG_VIEW_LINES,
+    CompressingRotatingFileHandler,
+    level_number,
+)
+from mkv2mp4.scheduler import SCHEDULING_POLICIES
+from mkv2mp4.staging import DEFAULT_SCRATCH_LIMIT_GB
+
+
+AUTOMATIC_PROFILE = "Automatic"  # Profile chosen by library and retry level
+
+
+def queue_row_text(record):
+    tags = []
+    if record.priority:
+        tags.append(f"priority {record.priority:+d}")
+    if record.profile:
+        tags.append(f"profile {record.profile}")
+    if tags:
+        return f"{record.display_name}  [{', '.join(tags)}]"
+    return record.display_name
+
+
+class JobProgressRow:
+    """One row in the 'Active Conversions' frame: label, progress bar and per-job controls."""
+
+    def __init__(self, parent, app, job):
+        self.frame = tk.Frame(parent)
+        self.frame.pack(fill=tk.X, pady=1)
+        self.status_text = tk.StringVar(value=f"{job.display_name}: Preparing...")
+        tk.Label(
+            self.frame, textvariable=self.status_text, anchor="w", width=40
+        ).pack(side=tk.LEFT, padx=5)
+        self.progress_bar = ttk.Progressbar(
+            self.frame, orient="horizontal", length=200, mode="determinate"
+        )
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.pause_button = tk.Button(
+            self.frame,
+            text="Pause",
+            width=7,
+            command=lambda: app.toggle_job_pause(job.job_id),
+        )
+        self.pause_button.pack(side=tk.LEFT, padx=2)
+        self.cancel_button = tk.Button(
+            self.frame,
+            text="Cancel",
+            width=7,
+            bg="#ffdddd",
+            command=lambda: app.cancel_job(job.job_id),
+        )
+        self.cancel_button.pack(side=tk.LEFT, padx=2)
+
+    def set_progress(self, value, text=None):
+        self.progress_bar["value"] = value
+        if text is not None:
+            self.status_text.set(text)
 
-class ConverterApp:
-    STATE_FILE = "mkv_converter_state.json"
+    def set_paused(self, paused):
+        self.pause_button.config(text="Resume" if paused else "Pause")
+
+    def disable_controls(self):
+        self.pause_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.DISABLED)
+
+    def destroy(self):
+        self.frame.destroy()
+
+
+class RowOrder:
+    """Keys in insertion order, with positions looked up in O(log n).
+
+    Every key gets the next slot number and a Fenwick tree counts the occupied
+    slots: a key's position is the number of occupied slots before its slot, and
+    the key at a position is found by descending the tree. Removing a key only
+    frees its slot; the slots are renumbered once most of them are free.
+    """
+
+    MIN_CAPACITY = 64
+
+    def __init__(self, keys=()):
+        self._renumber(list(keys))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def append(self, key):
+        if key in self.slots:
+            return
+        if len(self.slot_keys) == self.capacity:
+            self._renumber([k for k in self.slot_keys if k is not None])
+        slot = len(self.slot_keys)
+        self.slot_keys.append(key)
+        self.slots[key] = slot
+        self._add(slot, 1)
+
+    def remove(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return
+        self.slot_keys[slot] = None  # Keys are job ids, never None
+        self._add(slot, -1)
+        free_count = len(self.slot_keys) - len(self.slots)
+        if free_count > max(len(self.slots), self.MIN_CAPACITY):
+            self._renumber([k for k in self.slot_keys if k is not None])
+
+    def index(self, key):
+        """Position of key; raises KeyError if it isn't in the order."""
+        index = self.slots[key]  # Slots before it: tree indexes 1..slot
+        position = 0
+        while index:
+            position += self.tree[index]
+            index -= index & -index
+        return position
+
+    def keys_at(self, first_position, count):
+        """Up to count keys, starting at first_position."""
+        last_position = min(first_position + count, len(self.slots))
+        return [
+            self.slot_keys[self._slot_at(position)]
+            for position in range(max(first_position, 0), last_position)
+        ]
+
+    def _slot_at(self, position):
+        # Largest tree index whose prefix count is at most position; the slot
+        # after it (tree index + 1, i.e. that 0-based slot) holds the key
+        index = 0
+        step = self.capacity
+        while step:
+            next_index = index + step
+            if next_index <= self.capacity and self.tree[next_index] <= position:
+                index = next_index
+                position -= self.tree[next_index]
+            step >>= 1
+        return index
+
+    def _add(self, slot, delta):
+        index = slot + 1
+        while index <= self.capacity:
+            self.tree[index] += delta
+            index += index & -index
+
+    def _renumber(self, keys):
+        self.slot_keys = keys  # slot -> key, None once removed
+        self.slots = {key: slot for slot, key in enumerate(keys)}  # key -> slot
+        self.capacity = max(self.MIN_CAPACITY, 1 << (2 * len(keys)).bit_length())
+        self.tree = [0] * (self.capacity + 1)
+        for index in range(1, self.capacity + 1):  # Builds the tree in O(n)
+            if index <= len(keys):
+                self.tree[index] += 1
+            parent = index + (index & -index)
+            if parent <= self.capacity:
+                self.tree[parent] += self.tree[index]
+
+
+class VirtualListView:
+    """Scrollable list that only puts the rows currently in view into its Listbox.
+
+    Rows are keyed (the app uses JobStore job ids) and kept in insertion order by
+    a RowOrder, so adding, removing, highlighting, scrolling to and reading the
+    selection cost at most O(log n), and showing 100k queued files costs about the
+    same as showing ten. Redraws are coalesced into one per idle cycle.
+    """
+
+    def __init__(self, parent, **listbox_options):
+        self.rows = {}  # key -> text
+        self.order = RowOrder()
+        self.row_backgrounds = {}  # key -> background colour of highlighted rows
+        self.first_row = 0  # Position of the row shown at the top
+        self.visible_keys = []  # Keys of the rows currently in the Listbox
+        self.selected_key = None
+        self._render_pending = False
+
+        self.listbox = tk.Listbox(parent, exportselection=False, **listbox_options)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(
+            parent, orient="vertical", command=self._on_scrollbar
+        )
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.line_height = max(
+            1, tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        )
+
+        self.listbox.bind("<Configure>", lambda e: self._schedule_render())
+        self.listbox.bind("<<ListboxSelect>>", self._on_select)
+        self.listbox.bind("<MouseWheel>", self._on_mouse_wheel)  # Windows, macOS
+        self.listbox.bind("<Button-4>", lambda e: self._scroll_by(-3))  # X11
+        self.listbox.bind("<Button-5>", lambda e: self._scroll_by(3))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def insert(self, key, text):
+        self.order.append(key)  # Keeps the place of a key that is already there
+        self.rows[key] = text
+        self._schedule_render()
+
+    def remove(self, key):
+        if self.rows.pop(key, None) is None:
+            return
+        self.row_backgrounds.pop(key, None)
+        if key == self.selected_key:
+            self.selected_key = None
+        self.order.remove(key)
+        self._schedule_render()
+
+    def set_rows(self, entries):
+        """Replaces all rows with (key, text) pairs."""
+        self.rows = dict(entries)
+        self.order = RowOrder(self.rows)
+        self.row_backgrounds.clear()
+        self.selected_key = None
+        self.first_row = 0
+        self._schedule_render()
+
+    def set_background(self, key, colour):
+        """Highlights a row, or clears the highlight with colour None."""
+        if key not in self.rows:
+            return
+        if colour:
+            self.row_backgrounds[key] = colour
+        else:
+            self.row_backgrounds.pop(key, None)
+        self._schedule_render()
+
+    def see(self, key):
+        """Scrolls so the row is in view."""
+        if key not in self.rows:
+            return
+        position = self.order.index(key)
+        visible_count = self._visible_count()
+        if not self.first_row <= position < self.first_row + visible_count:
+            self.first_row = position
+            self._schedule_render()
+
+    def _visible_count(self):
+        return max(1, self.listbox.winfo_height() // self.line_height)
+
+    def _schedule_render(self):
+        if not self._render_pending:
+            self._render_pending = True
+            self.listbox.after_idle(self._render)
+
+    def _render(self):
+        self._render_pending = False
+        row_count = len(self.order)
+        visible_count = self._visible_count()
+        self.first_row = max(0, min(self.first_row, row_count - visible_count))
+        self.visible_keys = self.order.keys_at(self.first_row, visible_count)
+
+        self.listbox.delete(0, tk.END)
+        if self.visible_keys:
+            self.listbox.insert(tk.END, *(self.rows[key] for key in self.visible_keys))
+        for row, key in enumerate(self.visible_keys):
+            background = self.row_backgrounds.get(key)
+            if background:
+                self.listbox.itemconfig(row, background=background)
+            if key == self.selected_key:
+                self.listbox.selection_set(row)
+
+        if row_count:
+            self.scrollbar.set(
+                self.first_row / row_count,
+                (self.first_row + len(self.visible_keys)) / row_count,
+            )
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _scroll_by(self, row_count):
+        self.first_row += row_count
+        self._render()
+        return "break"  # Keep the Listbox from scrolling its own few rows
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.first_row = int(float(amount) * len(self.rows))
+            self._render()
+        elif action == "scroll":
+            step = self._visible_count() if unit == "pages" else 1
+            self._scroll_by(int(amount) * step)
+
+    def _on_mouse_wheel(self, event):
+        return self._scroll_by(-3 if event.delta > 0 else 3)
+
+    def _on_select(self, event):
+        selected_rows = self.listbox.curselection()
+        if selected_rows and selected_rows[0] < len(self.visible_keys):
+            self.selected_key = self.visible_keys[selected_rows[0]]
+        else:
+            self.selected_key = None
+
+
+class TkEngineListener(ConversionEngineListener):
+    """Forwards engine events from worker threads to the ConverterApp on the Tk main loop.
+
+    Events are not scheduled one by one with master.after(0, ...), which floods
+    the Tk event queue during fast remuxes. They are collected in one thread-safe
+    channel that a single periodic pump drains: ordered events are replayed in
+    order, only the latest progress of each job is applied, and all new log lines
+    go into the log in one insert.
+    """
+
+    PUMP_INTERVAL_MS = 66  # About 15 UI updates per second
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.pending_events = collections.deque()  # (callback, args) in order
+        self.pending_progress = {}  # job_id -> (job, value, text), latest only
+        # Ring of lines for the Logs tab; older ones are only kept in the log file
+        self.pending_log_lines = collections.deque(maxlen=MAX_LOG_VIEW_LINES)
+
+        # Everything that reaches the listener also goes to the rotating log file;
+        # the level filter is applied by the engine before messages are built
+        self.file_logger = logging.getLogger("mkv2mp4.gui")
+        self.file_logger.setLevel(logging.DEBUG)
+        self.file_logger.propagate = False
+        log_file_handler = CompressingRotatingFileHandler(
+            os.path.join(os.path.dirname(STATE_FILE), LOG_FILE)
+        )
+        log_file_handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+        self.file_logger.addHandler(log_file_handler)
+
+    def start_pump(self):
+        self.app.master.after(self.PUMP_INTERVAL_MS, self._pump)
+
+    def _pump(self):
+        with self.lock:
+            events = self.pending_events
+            self.pending_events = collections.deque()
+            progress_updates = list(self.pending_progress.values())
+            self.pending_progress.clear()
+            log_lines = list(self.pending_log_lines)
+            self.pending_log_lines.clear()
+        try:
+            if log_lines:
+                self.app._append_log_lines(log_lines)
+            for callback, args in events:
+                try:
+                    callback(*args)
+                except tk.TclError as e:
+                    self.app._append_log_lines(
+                        [self._format_log_line(f"UI update failed: {e}", "DEBUG")]
+                    )
+            # After the ordered events, so rows created by job_started exist
+            for job, value, text in progress_updates:
+                self.app._apply_job_progress(job, value, text)
+        finally:
+            self.start_pump()
+
+    def _schedule(self, callback, *args):
+        with self.lock:
+            self.pending_events.append((callback, args))
 
+    @staticmethod
+    def _format_log_line(message, level):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return f"[{timestamp}] [{level.upper()}] {message}\n"
+
+    def log(self, message, level):
+        self.file_logger.log(level_number(level), message)
+        line = self._format_log_line(message, level)  # Timestamped when it happens
+        with self.lock:
+            self.pending_log_lines.append(line)
+
+    def status_changed(self, text):
+        self._schedule(self.app.conversion_status.set, text)
+
+    # Record fields are copied here, on the engine's thread, because the records
+    # may change again before the Tk loop runs the callbacks
+    def queue_item_added(self, record):
+        self._schedule(self.app._insert_queue_entry, record.job_id, queue_row_text(record))
+
+    def queue_item_removed(self, record):
+        self._schedule(self.app._remove_queue_entry, record.job_id)
+
+    def queue_item_active(self, record, active):
+        if active:
+            self._schedule(self.app._mark_queue_entry_active, record.job_id)
+        else:
+            self._schedule(self.app._mark_queue_entry_idle, record.job_id)
+
+    def queue_item_changed(self, record):
+        # Replaces the row's text in place
+        self._schedule(self.app.queue_view.insert, record.job_id, queue_row_text(record))
+
+    def queue_reset(self, records):
+        self._schedule(
+            self.app._reset_queue_view,
+            [(record.job_id, queue_row_text(record)) for record in records],
+        )
+
+    def failed_item_added(self, record):
+        self._schedule(
+            self.app.failed_view.insert, record.job_id, os.path.basename(record.path)
+        )
+
+    def failed_reset(self, records):
+        self._schedule(
+            self.app._reset_failed_view,
+            [(record.job_id, os.path.basename(record.path)) for record in records],
+        )
+
+    def batch_started(self, total_files):
+        self._schedule(self.app._on_batch_started)
+
+    def batch_progress(self, processed_files, total_files):
+        self._schedule(self.app._on_batch_progress, processed_files, total_files)
+
+    def batch_finished(self, summary_message, cancelled):
+        self._schedule(self.app._on_batch_finished, summary_message)
+
+    def job_started(self, job):
+        self._schedule(self.app._add_job_progress_row, job)
+
+    def job_progress(self, job, value, text=None):
+        with self.lock:
+            if text is None and job.job_id in self.pending_progress:
+                text = self.pending_progress[job.job_id][2]  # Keep the last text
+            self.pending_progress[job.job_id] = (job, value, text)
+
+    def job_paused(self, job, paused):
+        self._schedule(self.app._apply_job_paused, job, paused)
+
+    def job_finished(self, job):
+        self._schedule(self.app._remove_job_progress_row, job)
+
+    def monitoring_status(self, text):
+        self._schedule(self.app.update_plex_monitoring_status, text)
+
+    def error(self, title, message):
+        # Shown outside the pump, so the modal dialog doesn't hold up other updates
+        self._schedule(self.app.master.after_idle, messagebox.showerror, title, message)
+
+
+class ConverterApp:
     def __init__(self, master):
         self.master = master
         master.title("MKV2MP4 Converter (Batch)")
         # Initial geometry, might be adjusted by notebook packing
         master.geometry("620x950")
+        # Collects engine events and log lines for the periodic UI pump
+        self.ui_events = TkEngineListener(self)
+        self.ui_events.start_pump()
+        # Queue, batch workers, monitoring and the state file live in the engine;
+        # its events are handed to the Tk main loop by the TkEngineListener pump
+        self.engine = ConversionEngine(self.ui_events, state_file=STATE_FILE)
 
         # Set application icon
         try:
@@ -59,6 +508,27 @@ class ConverterApp:
             self.logs_tab_frame, text="Application Logs", padx=5, pady=5
         )
         log_text_frame.pack(expand=True, fill="both", padx=5, pady=5)
+        log_options_frame = tk.Frame(log_text_frame)
+        log_options_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        tk.Label(log_options_frame, text="Show messages from level:").pack(
+            side=tk.LEFT
+        )
+        self.log_level = tk.StringVar(value=self.engine.log_level)
+        ttk.Combobox(
+            log_options_frame,
+            textvariable=self.log_level,
+            values=list(LOG_LEVELS),
+            state="readonly",
+            width=8,
+        ).pack(side=tk.LEFT, padx=5)
+        self.log_level.trace_add(
+            "write", lambda *_: setattr(self.engine, "log_level", self.log_level.get())
+        )
+        tk.Label(
+            log_options_frame,
+            text=f"(last {MAX_LOG_VIEW_LINES} lines; full log in {LOG_FILE})",
+            fg="grey",
+        ).pack(side=tk.LEFT)
         self.log_text_area = tk.Text(
             log_text_frame, wrap=tk.WORD, state=tk.DISABLED, height=10
         )  # Start disabled
@@ -68,33 +538,50 @@ class ConverterApp:
         self.log_text_area.config(yscrollcommand=log_scrollbar_y.set)
         log_scrollbar_y.pack(side=tk.RIGHT, fill=tk.Y)
         self.log_text_area.pack(side=tk.LEFT, expand=True, fill="both")
-        # Make log_text_area temporarily normal to add initial message, then disable again
         self.log_message("Application initialized.", "INFO")
 
         # --- All other UI elements will now go into self.converter_tab_frame ---
         # Adjust references from 'master' to 'self.converter_tab_frame' for main UI elements
         main_ui_container = self.converter_tab_frame
 
-        self.file_queue = []
-        self.failed_files_data = []  # Stores (file_path, error_reason_string)
-        self.files_for_retry_level_1 = set()  # Renamed from files_for_recovery_mode
-        self.files_for_retry_level_2 = set()  # For the second, more lax retry attempt
-        self.output_format = tk.StringVar(value="MP4 (H.264 + AAC)")
+        self.job_rows = {}  # job_id -> JobProgressRow of a running job
+        self.output_format = tk.StringVar(value=self.engine.output_format)
         self.conversion_status = tk.StringVar(
             value="Status: Idle. Add files to the queue."
         )
         self.individual_progress_status = tk.StringVar(
-            value="Individual File Progress: N/A"
-        )  # For text next to bar
-        self.ffmpeg_exec_path = None
-        self.is_converting = False
-        self.current_ffmpeg_process = None  # To store the Popen object of ffmpeg
-        self.psutil_process = (
-            None  # To store the psutil.Process object for suspend/resume
-        )
-        self.is_paused = False  # To track pause state
-        self.cancel_requested = False  # To signal cancellation of the batch
-        self.conversion_thread = None  # To store the conversion thread object
+            value="Active Conversions: N/A"
+        )  # Header text of the active conversions frame
+        self.max_parallel_jobs_sv = tk.StringVar(value="1")  # UI for worker count
+        self.scheduling_policy_label = tk.StringVar(
+            value=SCHEDULING_POLICIES[self.engine.scheduling_policy]
+        )
+        self.scheduling_policy_label.trace_add(
+            "write",
+            lambda *_: setattr(
+                self.engine,
+                "scheduling_policy",
+                next(
+                    name
+                    for name, label in SCHEDULING_POLICIES.items()
+                    if label == self.scheduling_policy_label.get()
+                ),
+            ),
+        )
+        self.segment_parallel_jobs_sv = tk.StringVar(
+            value="1"
+        )  # UI for ffmpeg processes per file
+        self.encoding_profile_sv = tk.StringVar(value=AUTOMATIC_PROFILE)
+        self.encoding_profile_sv.trace_add(
+            "write",
+            lambda *_: setattr(
+                self.engine,
+                "encoding_profile",
+                None
+                if self.encoding_profile_sv.get() == AUTOMATIC_PROFILE
+                else self.encoding_profile_sv.get(),
+            ),
+        )
         self.plex_media_directory = tk.StringVar(value="Not Set")  # For Plex media path
         self.auto_delete_verified_originals = tk.BooleanVar(
             value=False
@@ -103,10 +590,46 @@ class ConverterApp:
         self.auto_start_plex_conversions = tk.BooleanVar(
             value=False
         )  # For auto-start toggle
-        self.is_monitoring_plex = False  # True if Plex monitoring is active
-        self.plex_monitoring_thread = None  # Thread for Plex monitoring
-        self.plex_scan_interval_seconds = 600  # e.g., 10 minutes
+        self.use_folder_watch = tk.BooleanVar(
+            value=True
+        )  # Queue new files via inotify between scans
         self.use_gpu_acceleration = tk.BooleanVar(value=False)  # For NVENC
+        self.use_fast_remux = tk.BooleanVar(
+            value=True
+        )  # Copy MP4-compatible streams instead of re-encoding them
+        self.use_resumable_encoding = tk.BooleanVar(
+            value=False
+        )  # Re-encode long files in checkpointed segments
+        self.use_preflight_check = tk.BooleanVar(
+            value=False
+        )  # Decode samples of each source first, convert damaged ones error-tolerantly
+        self.use_adaptive_concurrency = tk.BooleanVar(
+            value=False
+        )  # Parallel Jobs is the ceiling, the engine picks the number in use
+        self.use_scratch_staging = tk.BooleanVar(
+            value=False
+        )  # Copy sources to a local scratch folder and encode there
+        self.scratch_directory_sv = tk.StringVar(value="System temporary folder")
+        self.scratch_limit_gb_sv = tk.StringVar(value=str(DEFAULT_SCRATCH_LIMIT_GB))
+        # Checkboxes take effect immediately, also for scans by the monitoring thread
+        for variable, setting_name in (
+            (self.output_format, "output_format"),
+            (self.auto_delete_verified_originals, "auto_delete_verified_originals"),
+            (self.auto_start_plex_conversions, "auto_start_plex_conversions"),
+            (self.use_folder_watch, "use_folder_watch"),
+            (self.use_gpu_acceleration, "use_gpu_acceleration"),
+            (self.use_fast_remux, "use_fast_remux"),
+            (self.use_resumable_encoding, "use_resumable_encoding"),
+            (self.use_preflight_check, "use_preflight_check"),
+            (self.use_adaptive_concurrency, "use_adaptive_concurrency"),
+            (self.use_scratch_staging, "use_scratch_staging"),
+        ):
+            variable.trace_add(
+                "write",
+                lambda *_, v=variable, name=setting_name: setattr(
+                    self.engine, name, v.get()
+                ),
+            )
 
         # --- UI Elements (now placed in main_ui_container which is converter_tab_frame) ---
         current_row = 0
@@ -121,15 +644,9 @@ class ConverterApp:
         main_ui_container.grid_columnconfigure(0, weight=1)
         current_row += 1
 
-        self.queue_listbox = tk.Listbox(
+        self.queue_view = VirtualListView(
             queue_frame, width=80, height=7, selectmode=tk.SINGLE
-        )  # Adjusted height
-        self.queue_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        queue_scrollbar = tk.Scrollbar(
-            queue_frame, orient="vertical", command=self.queue_listbox.yview
-        )
-        queue_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.queue_listbox.config(yscrollcommand=queue_scrollbar.set)
+        )  # Rows are keyed by JobStore job id
 
         # Buttons for Queue Management Frame
         button_frame = tk.Frame(main_ui_container)
@@ -151,6 +668,24 @@ class ConverterApp:
             button_frame, text="Clear Queue", command=self.clear_queue
         )
         self.clear_queue_button.pack(side=tk.LEFT, padx=5)
+        self.raise_priority_button = tk.Button(
+            button_frame, text="Priority +", command=lambda: self.change_priority(1)
+        )
+        self.raise_priority_button.pack(side=tk.LEFT, padx=5)
+        self.lower_priority_button = tk.Button(
+            button_frame, text="Priority -", command=lambda: self.change_priority(-1)
+        )
+        self.lower_priority_button.pack(side=tk.LEFT, padx=5)
+        # Order of the next batch; priorities also apply to a running one
+        self.scheduling_policy_dropdown = ttk.Combobox(
+            button_frame,
+            textvariable=self.scheduling_policy_label,
+            values=list(SCHEDULING_POLICIES.values()),
+            state="readonly",
+            width=22,
+        )
+        self.scheduling_policy_dropdown.pack(side=tk.RIGHT, padx=5)
+        tk.Label(button_frame, text="Order:").pack(side=tk.RIGHT)
 
         # Failed Files Frame
         failed_frame = tk.LabelFrame(
@@ -162,15 +697,9 @@ class ConverterApp:
         main_ui_container.grid_rowconfigure(current_row, weight=1)
         current_row += 1
 
-        self.failed_listbox = tk.Listbox(
+        self.failed_view = VirtualListView(
             failed_frame, width=80, height=4, selectmode=tk.SINGLE, bg="#ffe0e0"
-        )  # Adjusted height
-        self.failed_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        failed_scrollbar = tk.Scrollbar(
-            failed_frame, orient="vertical", command=self.failed_listbox.yview
         )
-        failed_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.failed_listbox.config(yscrollcommand=failed_scrollbar.set)
 
         # Buttons for Failed Files Frame
         failed_button_frame = tk.Frame(main_ui_container)
@@ -210,7 +739,7 @@ class ConverterApp:
         )
         current_row += 1
         tk.Label(format_frame, text="Output Format:").pack(side=tk.LEFT, padx=5)
-        self.format_options = ["MP4 (H.264 + AAC)"]  # Only MP4
+        self.format_options = OUTPUT_FORMATS
         self.format_dropdown = ttk.Combobox(
             format_frame,
             textvariable=self.output_format,
@@ -222,6 +751,22 @@ class ConverterApp:
         if len(self.format_options) == 1:  # If only one option, disable the dropdown
             self.output_format.set(self.format_options[0])
             self.format_dropdown.config(state=tk.DISABLED)
+        # Encoder settings of first conversions, from mkv_converter_profiles.json
+        tk.Label(format_frame, text="Profile:").pack(side=tk.LEFT, padx=(15, 5))
+        self.profile_dropdown = ttk.Combobox(
+            format_frame,
+            textvariable=self.encoding_profile_sv,
+            values=[AUTOMATIC_PROFILE] + self.engine.profile_registry.names(),
+            state="readonly",
+            width=18,
+        )
+        self.profile_dropdown.pack(side=tk.LEFT, padx=5)
+        self.apply_profile_button = tk.Button(
+            format_frame,
+            text="Use for Selected File",
+            command=self.apply_profile_to_selected,
+        )
+        self.apply_profile_button.pack(side=tk.LEFT, padx=5)
 
         # GPU Acceleration Checkbox
         self.gpu_checkbox = tk.Checkbutton(
@@ -235,6 +780,99 @@ class ConverterApp:
         )
         current_row += 1  # Increment row after adding the checkbox
 
+        self.fast_remux_checkbox = tk.Checkbutton(
+            main_ui_container,
+            text="Copy streams without re-encoding when already MP4-compatible (fast remux)",
+            variable=self.use_fast_remux,
+        )
+        self.fast_remux_checkbox.grid(
+            row=current_row, column=0, columnspan=4, padx=10, pady=(0, 5), sticky="w"
+        )
+        current_row += 1
+
+        self.resumable_checkbox = tk.Checkbutton(
+            main_ui_container,
+            text="Resumable encoding: re-encode in 5-minute segments that survive cancel or exit",
+            variable=self.use_resumable_encoding,
+        )
+        self.resumable_checkbox.grid(
+            row=current_row, column=0, columnspan=4, padx=10, pady=(0, 5), sticky="w"
+        )
+        current_row += 1
+
+        self.preflight_checkbox = tk.Checkbutton(
+            main_ui_container,
+            text="Check sources for damage first and convert damaged ones with Level 1 settings",
+            variable=self.use_preflight_check,
+        )
+        self.preflight_checkbox.grid(
+            row=current_row, column=0, columnspan=4, padx=10, pady=(0, 5), sticky="w"
+        )
+        current_row += 1
+
+        # For libraries on network shares: encode from a local copy of each file
+        scratch_frame = tk.Frame(main_ui_container)
+        scratch_frame.grid(
+            row=current_row, column=0, columnspan=4, padx=10, pady=(0, 5), sticky="w"
+        )
+        current_row += 1
+        self.scratch_checkbox = tk.Checkbutton(
+            scratch_frame,
+            text="Stage files on a local scratch folder:",
+            variable=self.use_scratch_staging,
+        )
+        self.scratch_checkbox.pack(side=tk.LEFT)
+        tk.Label(scratch_frame, textvariable=self.scratch_directory_sv).pack(
+            side=tk.LEFT, padx=5
+        )
+        self.scratch_directory_button = tk.Button(
+            scratch_frame, text="Browse...", command=self.select_scratch_directory
+        )
+        self.scratch_directory_button.pack(side=tk.LEFT, padx=5)
+        tk.Label(scratch_frame, text="Limit (GB):").pack(side=tk.LEFT, padx=(15, 5))
+        self.scratch_limit_spinbox = tk.Spinbox(
+            scratch_frame,
+            from_=1,
+            to=10000,
+            textvariable=self.scratch_limit_gb_sv,
+            width=6,
+        )
+        self.scratch_limit_spinbox.pack(side=tk.LEFT, padx=5)
+
+        # Number of files converted concurrently
+        parallel_frame = tk.Frame(main_ui_container)
+        parallel_frame.grid(
+            row=current_row, column=0, columnspan=4, padx=10, pady=(0, 5), sticky="w"
+        )
+        current_row += 1
+        tk.Label(parallel_frame, text="Parallel Jobs:").pack(side=tk.LEFT, padx=5)
+        self.parallel_jobs_spinbox = tk.Spinbox(
+            parallel_frame,
+            from_=1,
+            to=max(1, os.cpu_count() or 1),
+            textvariable=self.max_parallel_jobs_sv,
+            width=5,
+        )
+        self.parallel_jobs_spinbox.pack(side=tk.LEFT, padx=5)
+        self.adaptive_concurrency_checkbox = tk.Checkbutton(
+            parallel_frame,
+            text="Adapt to system load",
+            variable=self.use_adaptive_concurrency,
+        )
+        self.adaptive_concurrency_checkbox.pack(side=tk.LEFT, padx=5)
+        # Above 1, long re-encodes are split into segments encoded concurrently
+        tk.Label(parallel_frame, text="Processes per File:").pack(
+            side=tk.LEFT, padx=(15, 5)
+        )
+        self.segment_jobs_spinbox = tk.Spinbox(
+            parallel_frame,
+            from_=1,
+            to=max(1, os.cpu_count() or 1),
+            textvariable=self.segment_parallel_jobs_sv,
+            width=5,
+        )
+        self.segment_jobs_spinbox.pack(side=tk.LEFT, padx=5)
+
         # Action Buttons Frame (Start, Pause, Cancel)
         action_frame = tk.Frame(main_ui_container)
         action_frame.grid(
@@ -283,23 +921,20 @@ class ConverterApp:
         )
         self.overall_progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
 
-        # Individual File Progress Bar
+        # Active Conversions (one progress row per running job)
         individual_progress_frame = tk.Frame(main_ui_container)
         individual_progress_frame.grid(
             row=current_row, column=0, columnspan=4, padx=10, pady=5, sticky="ew"
         )
         current_row += 1
         self.individual_progress_label = tk.Label(
-            individual_progress_frame, textvariable=self.individual_progress_status
-        )
-        self.individual_progress_label.pack(side=tk.LEFT, padx=5)
-        self.individual_progress_bar = ttk.Progressbar(
             individual_progress_frame,
-            orient="horizontal",
-            length=400,
-            mode="determinate",
+            textvariable=self.individual_progress_status,
+            anchor="w",
         )
-        self.individual_progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.individual_progress_label.pack(side=tk.TOP, fill=tk.X, padx=5)
+        self.active_jobs_frame = tk.Frame(individual_progress_frame)
+        self.active_jobs_frame.pack(side=tk.TOP, fill=tk.X, expand=True)
 
         # Status Label
         self.status_label = tk.Label(
@@ -384,6 +1019,13 @@ class ConverterApp:
         )
         self.auto_start_conversion_checkbox.pack(pady=(0, 5))
 
+        self.folder_watch_checkbox = tk.Checkbutton(
+            plex_action_frame,
+            text="Watch for new files between scans (Linux, local folders)",
+            variable=self.use_folder_watch,
+        )
+        self.folder_watch_checkbox.pack(pady=(0, 5))
+
         current_row += 1  # Increment after all content of plex_action_frame
 
         # Adjust master window geometry for new section
@@ -411,306 +1053,217 @@ class ConverterApp:
         self.load_state()  # Load previous state at the end of init
 
     def update_status_on_ffmpeg_ready(self):
-        if self.ffmpeg_exec_path == "ffmpeg":
+        if self.engine.ffmpeg_exec_path == "ffmpeg":
             self.conversion_status.set(
                 "Status: Idle (FFmpeg in PATH). Add files to queue."
             )
         else:
             self.conversion_status.set(
-                f"Status: Idle (FFmpeg at {os.path.basename(self.ffmpeg_exec_path)}). Add files to queue."
+                f"Status: Idle (FFmpeg at {os.path.basename(self.engine.ffmpeg_exec_path)}). Add files to queue."
             )
 
+
     def add_files_to_queue(self):
-        if self.is_converting:
+        if self.engine.is_converting:
             return
         file_paths = filedialog.askopenfilenames(
             title="Select MKV Files",
             filetypes=(("MKV files", "*.mkv"), ("All files", "*.*")),
         )
-        added_count = 0
         if file_paths:
-            for file_path in file_paths:
-                if file_path not in self.file_queue and not any(
-                    fp == file_path for fp, _ in self.failed_files_data
-                ):
-                    self.file_queue.append(file_path)
-                    self.queue_listbox.insert(tk.END, os.path.basename(file_path))
-                    added_count += 1
-            if added_count > 0:
+            if self.engine.add_files(file_paths):
                 self.update_status_with_queue_count()
-            elif file_paths:  # Only show if files were selected but none were new
+            else:  # Only show if files were selected but none were new
                 messagebox.showinfo(
                     "No New Files",
                     "Selected file(s) are already in the queue or failed list.",
                 )
 
     def remove_selected_from_queue(self):
-        if self.is_converting:
+        if self.engine.is_converting:
             return
-        selected_indices = self.queue_listbox.curselection()
-        if selected_indices:
-            selected_index = selected_indices[0]
-            del self.file_queue[selected_index]
-            self.queue_listbox.delete(selected_index)
+        selected_job_id = self.queue_view.selected_key
+        if selected_job_id is not None:
+            self.engine.remove_queued(selected_job_id)
             self.update_status_with_queue_count()
         else:
             messagebox.showinfo(
                 "No Selection", "Please select a file from the main queue to remove."
             )
 
-    def clear_queue(self):
-        if self.is_converting:
-            return
-        self.file_queue.clear()
-        self.queue_listbox.delete(0, tk.END)
-        self.update_status_with_queue_count()
-
-    def retry_failed_files(self):
-        if self.is_converting:
-            return
-        if not self.failed_files_data:
+    def change_priority(self, step):
+        selected_job_id = self.queue_view.selected_key
+        record = (
+            self.engine.jobs.get_by_id(selected_job_id)
+            if selected_job_id is not None
+            else None
+        )
+        if not record:
             messagebox.showinfo(
-                "No Failed Files", "There are no files in the failed list to retry."
+                "No Selection", "Please select a file from the main queue first."
             )
             return
-
-        num_retried = 0
-        for file_path, _ in list(
-            self.failed_files_data
-        ):  # Iterate a copy for safe modification
-            if file_path not in self.file_queue:
-                self.file_queue.append(file_path)
-                self.queue_listbox.insert(tk.END, os.path.basename(file_path))
-                # Remove from failed_files_data by finding its index or recreating the list
-                self.failed_files_data = [
-                    (fp, err) for fp, err in self.failed_files_data if fp != file_path
-                ]
-                num_retried += 1
-            else:  # If somehow already back in queue, just remove from failed
-                self.failed_files_data = [
-                    (fp, err) for fp, err in self.failed_files_data if fp != file_path
-                ]
-
-        self.failed_listbox.delete(0, tk.END)  # Clear and re-populate is easier
-        for (
-            fp,
-            _,
-        ) in (
-            self.failed_files_data
-        ):  # Re-populate with any that weren't retried (e.g. duplicates)
-            self.failed_listbox.insert(tk.END, os.path.basename(fp))
-
-        if num_retried > 0:
-            self.update_status_with_queue_count()
+        self.engine.set_queue_priority(selected_job_id, record.priority + step)
+        if self.engine.scheduling_policy != "priority":
             self.conversion_status.set(
-                f"Status: Moved {num_retried} file(s) from failed to queue. Ready to convert."
+                f"Status: Priorities are used when the order is '{SCHEDULING_POLICIES['priority']}'."
             )
-        else:
-            self.conversion_status.set(
-                "Status: No files moved from failed to queue (possibly already present)."
-            )
-        self.update_status_with_queue_count()  # Update button states
 
-    def retry_failed_level_1(self):
-        if self.is_converting:
-            return
-        if not self.failed_files_data:
+    def apply_profile_to_selected(self):
+        selected_job_id = self.queue_view.selected_key
+        if selected_job_id is None or not self.engine.jobs.get_by_id(selected_job_id):
             messagebox.showinfo(
-                "No Failed Files",
-                "There are no files in the failed list to retry with level 1.",
+                "No Selection", "Please select a file from the main queue first."
             )
             return
+        profile_name = self.encoding_profile_sv.get()
+        self.engine.set_queue_profile(
+            selected_job_id, None if profile_name == AUTOMATIC_PROFILE else profile_name
+        )
 
-        num_retried_level_1 = 0
-        for file_path, _ in list(
-            self.failed_files_data
-        ):  # Iterate a copy for safe modification
-            if file_path not in self.file_queue:
-                self.file_queue.append(file_path)
-                self.queue_listbox.insert(
-                    tk.END, os.path.basename(file_path) + " (Level 1)"
-                )  # Mark in listbox
-                self.files_for_retry_level_1.add(file_path)  # Add to level 1 set
-                # Remove from failed_files_data
-                self.failed_files_data = [
-                    (fp, err) for fp, err in self.failed_files_data if fp != file_path
-                ]
-                num_retried_level_1 += 1
-            else:  # If somehow already back in queue, just remove from failed and mark for level 1
-                self.files_for_retry_level_1.add(file_path)
-                # Update listbox entry if possible to show (Level 1) - complex, skip for now or re-add
-                self.failed_files_data = [
-                    (fp, err) for fp, err in self.failed_files_data if fp != file_path
-                ]
-
-        self.failed_listbox.delete(0, tk.END)  # Clear and re-populate is easier
-        for (
-            fp,
-            _,
-        ) in self.failed_files_data:  # Re-populate with any that weren't retried
-            self.failed_listbox.insert(tk.END, os.path.basename(fp))
-
-        if num_retried_level_1 > 0:
-            self.update_status_with_queue_count()
-            self.conversion_status.set(
-                f"Status: Moved {num_retried_level_1} file(s) to queue for level 1 retry. Ready to convert."
-            )
-        else:
-            self.conversion_status.set(
-                "Status: No files moved for level 1 retry (possibly already in queue)."
-            )
-        self.update_status_with_queue_count()  # Update button states
+    def clear_queue(self):
+        if self.engine.is_converting:
+            return
+        self.engine.clear_queue()
+        self.update_status_with_queue_count()
+
+    def retry_failed_files(self):
+        self._requeue_failed_files(retry_level=0)
+
+    def retry_failed_level_1(self):
+        self._requeue_failed_files(retry_level=1)
 
     def retry_failed_level_2(self):
-        if self.is_converting:
+        self._requeue_failed_files(retry_level=2)
+
+    def _requeue_failed_files(self, retry_level):
+        if self.engine.is_converting:
             return
-        if not self.failed_files_data:
+        if not self.engine.jobs.failed_count():
+            level_text = f" with level {retry_level}" if retry_level else ""
             messagebox.showinfo(
                 "No Failed Files",
-                "There are no files in the failed list to retry with level 2.",
+                f"There are no files in the failed list to retry{level_text}.",
             )
             return
 
-        num_retried_level_2 = 0
-        for file_path, _ in list(
-            self.failed_files_data
-        ):  # Iterate a copy for safe modification
-            if file_path not in self.file_queue:
-                self.file_queue.append(file_path)
-                self.queue_listbox.insert(
-                    tk.END, os.path.basename(file_path) + " (Level 2)"
-                )  # Mark in listbox
-                self.files_for_retry_level_2.add(file_path)  # Add to level 2 set
-                # Remove from failed_files_data
-                self.failed_files_data = [
-                    (fp, err) for fp, err in self.failed_files_data if fp != file_path
-                ]
-                num_retried_level_2 += 1
-            else:  # If somehow already back in queue, just remove from failed and mark for level 2
-                self.files_for_retry_level_2.add(file_path)
-                # Update listbox entry if possible to show (Level 2) - complex, skip for now or re-add
-                self.failed_files_data = [
-                    (fp, err) for fp, err in self.failed_files_data if fp != file_path
-                ]
-
-        self.failed_listbox.delete(0, tk.END)  # Clear and re-populate is easier
-        for (
-            fp,
-            _,
-        ) in self.failed_files_data:  # Re-populate with any that weren't retried
-            self.failed_listbox.insert(tk.END, os.path.basename(fp))
-
-        if num_retried_level_2 > 0:
-            self.update_status_with_queue_count()
+        num_retried = self.engine.requeue_failed(retry_level)
+        if num_retried > 0 and retry_level:
+            self.conversion_status.set(
+                f"Status: Moved {num_retried} file(s) to queue for level {retry_level} retry. Ready to convert."
+            )
+        elif num_retried > 0:
+            self.conversion_status.set(
+                f"Status: Moved {num_retried} file(s) from failed to queue. Ready to convert."
+            )
+        elif retry_level:
             self.conversion_status.set(
-                f"Status: Moved {num_retried_level_2} file(s) to queue for level 2 retry. Ready to convert."
+                f"Status: No files moved for level {retry_level} retry (possibly already in queue)."
             )
         else:
             self.conversion_status.set(
-                "Status: No files moved for level 2 retry (possibly already in queue)."
+                "Status: No files moved from failed to queue (possibly already present)."
             )
         self.update_status_with_queue_count()  # Update button states
 
     def clear_failed_list(self):
-        if self.is_converting:
+        if self.engine.is_converting:
             return
-        self.failed_files_data.clear()
-        self.failed_listbox.delete(0, tk.END)
+        self.engine.clear_failed()
         self.conversion_status.set("Status: Failed conversion list cleared.")
         self.update_status_with_queue_count()
 
+    def _insert_queue_entry(self, job_id, display_name):
+        self.queue_view.insert(job_id, display_name)
+        self.update_status_with_queue_count()
+
+    def _remove_queue_entry(self, job_id):
+        self.queue_view.remove(job_id)
+        self.update_status_with_queue_count()
+
+    def _reset_queue_view(self, entries):
+        self.queue_view.set_rows(entries)
+        self.update_status_with_queue_count()
+
+    def _reset_failed_view(self, entries):
+        self.failed_view.set_rows(entries)
+        self.update_status_with_queue_count()
+
     def update_status_with_queue_count(self):
-        queue_count = len(self.file_queue)
+        queue_count = self.engine.jobs.queued_count()
         base_status_parts = self.conversion_status.get().split(" | ")
         current_ffmpeg_status = base_status_parts[0]
 
-        if self.is_converting:
+        if self.engine.is_converting:
             self.conversion_status.set(
                 f"{current_ffmpeg_status} | Files remaining in queue: {queue_count}"
             )
-            self.individual_progress_status.set(
-                "Individual File Progress: Processing..."
-            )
+            self.update_active_jobs_header()
             # UI state for buttons is handled by toggle_ui_state(False)
         else:
             self.conversion_status.set(
                 f"{current_ffmpeg_status} | Queue: {queue_count} file(s)."
             )
-            self.individual_progress_bar["value"] = 0
-            self.individual_progress_status.set("Individual File Progress: N/A")
-            # UI state for buttons is handled by toggle_ui_state(True)
+            self.individual_progress_status.set("Active Conversions: N/A")
             # Call toggle_ui_state to ensure buttons reflect current state (e.g. Convert button if queue populated)
             self.toggle_ui_state(True)
 
-        # This part of toggle_ui_state might be redundant if called above, but good for clarity
-        # if not self.is_converting and self.failed_files_data:
-        #     self.retry_failed_button.config(state=tk.NORMAL)
-        #     self.clear_failed_button.config(state=tk.NORMAL)
-        # else:
-        #     self.retry_failed_button.config(state=tk.DISABLED)
-        #     self.clear_failed_button.config(state=tk.DISABLED)
-
-    def get_ffmpeg_path(self):
-        if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
-            application_path = sys._MEIPASS
-        else:
-            application_path = os.path.dirname(os.path.abspath(__file__))
-        local_ffmpeg_dir = os.path.join(application_path, "ffmpeg")
-        if os.name == "nt":
-            ffmpeg_exe = os.path.join(local_ffmpeg_dir, "bin", "ffmpeg.exe")
-            if not os.path.exists(ffmpeg_exe):
-                ffmpeg_exe = os.path.join(local_ffmpeg_dir, "ffmpeg.exe")
-        else:
-            ffmpeg_exe = os.path.join(local_ffmpeg_dir, "ffmpeg")
-            if not os.path.exists(ffmpeg_exe):
-                ffmpeg_exe_alt = os.path.join(local_ffmpeg_dir, "bin", "ffmpeg")
-                if os.path.exists(ffmpeg_exe_alt):
-                    ffmpeg_exe = ffmpeg_exe_alt
-        if os.path.exists(ffmpeg_exe) and os.access(ffmpeg_exe, os.X_OK):
-            return ffmpeg_exe
-        return "ffmpeg"
-
     def check_ffmpeg(self):
-        self.ffmpeg_exec_path = self.get_ffmpeg_path()
-        try:
-            cmd_to_run = [self.ffmpeg_exec_path, "-version"]
-            subprocess.run(
-                cmd_to_run,
-                check=True,
-                capture_output=True,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
-            )
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            self.ffmpeg_exec_path = None
-            return False
+        return self.engine.check_ffmpeg()
 
     def start_conversion_thread(self):
-        if self.is_converting:
+        if self.engine.is_converting:
             messagebox.showwarning("Busy", "A conversion process is already running.")
             return
-        if not self.file_queue:
+        if not self.engine.jobs.queued_count():
             messagebox.showerror(
                 "Error", "The conversion queue is empty. Please add MKV files."
             )
             return
-        if not self.ffmpeg_exec_path:
+        if not self.engine.ffmpeg_exec_path:
             messagebox.showerror(
                 "FFmpeg Error", "FFmpeg not found. Please check setup."
             )
             self.conversion_status.set("Status: FFmpeg not found!")
             return
 
-        self.is_converting = True
-        self.cancel_requested = False  # Reset cancel flag
-        self.is_paused = False  # Reset pause flag
-        self.toggle_ui_state(False)
-        self.overall_progress_bar["value"] = 0
-        self.individual_progress_bar["value"] = 0
-        self.conversion_status.set("Status: Starting batch conversion...")
-        self.conversion_thread = threading.Thread(target=self.process_batch)
-        self.conversion_thread.daemon = True
-        self.conversion_thread.start()
+        self.engine.max_parallel_jobs = self.get_max_parallel_jobs()
+        self.max_parallel_jobs_sv.set(str(self.engine.max_parallel_jobs))
+        self.engine.segment_parallel_jobs = self.get_segment_parallel_jobs()
+        self.segment_parallel_jobs_sv.set(str(self.engine.segment_parallel_jobs))
+        self.engine.scratch_limit_gb = self.get_scratch_limit_gb()
+        self.scratch_limit_gb_sv.set(f"{self.engine.scratch_limit_gb:g}")
+        error_message = self.engine.start_batch()
+        if error_message:
+            messagebox.showerror("Error", error_message)
+
+    def get_max_parallel_jobs(self):
+        try:
+            requested_jobs = int(self.max_parallel_jobs_sv.get())
+        except ValueError:
+            requested_jobs = 1
+        return max(1, min(requested_jobs, max(1, os.cpu_count() or 1)))
+
+    def get_segment_parallel_jobs(self):
+        try:
+            requested_jobs = int(self.segment_parallel_jobs_sv.get())
+        except ValueError:
+            requested_jobs = 1
+        return max(1, min(requested_jobs, max(1, os.cpu_count() or 1)))
+
+    def get_scratch_limit_gb(self):
+        try:
+            return max(1.0, float(self.scratch_limit_gb_sv.get()))
+        except ValueError:
+            return self.engine.scratch_limit_gb
+
+    def select_scratch_directory(self):
+        directory_path = filedialog.askdirectory(
+            title="Select a Local Scratch Folder (SSD or RAM disk)"
+        )
+        if directory_path:
+            self.engine.scratch_directory = directory_path
+            self.scratch_directory_sv.set(directory_path)
 
     def toggle_ui_state(self, enabled):
         state = tk.NORMAL if enabled else tk.DISABLED
@@ -718,17 +1271,26 @@ class ConverterApp:
         self.remove_selected_button.config(state=state)
         self.clear_queue_button.config(state=state)
         self.format_dropdown.config(state="readonly" if enabled else tk.DISABLED)
+        self.parallel_jobs_spinbox.config(state=state)
+        self.adaptive_concurrency_checkbox.config(state=state)
+        self.scheduling_policy_dropdown.config(
+            state="readonly" if enabled else tk.DISABLED
+        )
+        self.segment_jobs_spinbox.config(state=state)
+        self.scratch_checkbox.config(state=state)
+        self.scratch_directory_button.config(state=state)
+        self.scratch_limit_spinbox.config(state=state)
         # self.convert_button.config(state=state) # Handled separately based on queue and conversion state
 
         if enabled:  # Not converting
             self.convert_button.config(
                 state=tk.NORMAL
-                if self.file_queue and self.ffmpeg_exec_path
+                if self.engine.jobs.queued_count() and self.engine.ffmpeg_exec_path
                 else tk.DISABLED
             )
             self.pause_resume_button.config(state=tk.DISABLED, text="Pause")
             self.cancel_button.config(state=tk.DISABLED)
-            if not self.failed_files_data:
+            if not self.engine.jobs.failed_count():
                 self.retry_failed_button.config(state=tk.DISABLED)
                 self.retry_level_1_button.config(state=tk.DISABLED)
                 self.retry_level_2_button.config(state=tk.DISABLED)
@@ -738,12 +1300,11 @@ class ConverterApp:
                 self.retry_level_1_button.config(state=tk.NORMAL)
                 self.retry_level_2_button.config(state=tk.NORMAL)
                 self.clear_failed_button.config(state=tk.NORMAL)
-            self.individual_progress_bar["value"] = 0
-            self.individual_progress_status.set("Individual File Progress: N/A")
+            self.individual_progress_status.set("Active Conversions: N/A")
         else:  # Is converting
             self.convert_button.config(state=tk.DISABLED)
             self.pause_resume_button.config(
-                state=tk.NORMAL, text="Pause" if not self.is_paused else "Resume"
+                state=tk.NORMAL, text="Pause" if not self.engine.is_paused else "Resume"
             )
             self.cancel_button.config(state=tk.NORMAL)
             self.retry_failed_button.config(state=tk.DISABLED)
@@ -751,306 +1312,68 @@ class ConverterApp:
             self.retry_level_2_button.config(state=tk.DISABLED)
             self.clear_failed_button.config(state=tk.DISABLED)
 
-    def process_batch(self):
-        total_files_in_batch = len(self.file_queue)
-        files_processed_in_batch = 0
-        initial_failed_count = len(self.failed_files_data)
-        current_batch_paths = list(self.file_queue)
-
-        for file_index, current_file_path in enumerate(current_batch_paths):
-            if (
-                self.cancel_requested
-            ):  # Check for cancellation at the start of each file
-                self.master.after(
-                    0,
-                    lambda: self.conversion_status.set(
-                        "Status: Batch cancelled by user."
-                    ),
-                )
-                break
-            if (
-                not self.is_converting
-            ):  # Should not happen if cancel_requested is used, but as a safeguard
-                break
-            if current_file_path not in self.file_queue:
-                continue
-
-            current_file_name = os.path.basename(current_file_path)
-            self.master.after(0, self.individual_progress_bar.config, {"value": 0})
-            self.master.after(
-                0,
-                self.individual_progress_status.set,
-                f"Individual File Progress: Preparing {current_file_name}...",
-            )
-
-            retry_level_to_attempt = 0
-            display_name_in_queue = current_file_name
-            if current_file_path in self.files_for_retry_level_1:
-                retry_level_to_attempt = 1
-                display_name_in_queue += " (Level 1)"
-            elif current_file_path in self.files_for_retry_level_2:
-                retry_level_to_attempt = 2
-                display_name_in_queue += " (Level 2)"
-
-            try:
-                listbox_idx_to_select = -1
-                for i in range(self.queue_listbox.size()):
-                    entry_text = self.queue_listbox.get(i)
-                    matches_basename = os.path.basename(current_file_path) in entry_text
-                    is_level_1_entry = "(Level 1)" in entry_text
-                    is_level_2_entry = "(Level 2)" in entry_text
-
-                    if matches_basename:
-                        if retry_level_to_attempt == 1 and is_level_1_entry:
-                            listbox_idx_to_select = i
-                            break
-                        elif retry_level_to_attempt == 2 and is_level_2_entry:
-                            listbox_idx_to_select = i
-                            break
-                        elif (
-                            retry_level_to_attempt == 0
-                            and not is_level_1_entry
-                            and not is_level_2_entry
-                        ):
-                            listbox_idx_to_select = i
-                            break
-
-                if listbox_idx_to_select != -1:
-                    self.master.after(
-                        0,
-                        lambda i=listbox_idx_to_select: (
-                            self.queue_listbox.selection_clear(0, tk.END),
-                            self.queue_listbox.selection_set(i),
-                            self.queue_listbox.see(i),
-                        ),
-                    )
-            except Exception as e:
-                print(f"Error selecting item in queue listbox: {e}")
-
-            self.master.after(
-                0,
-                lambda cn=display_name_in_queue,
-                fp=files_processed_in_batch,
-                tb=total_files_in_batch: self.conversion_status.set(
-                    f"Status: Converting {cn} ({fp + 1}/{tb})..."
-                ),
-            )
 
-            conversion_result, result_payload = self.convert_file(
-                current_file_path, retry_level=retry_level_to_attempt
-            )
-
-            # Clear from retry sets after attempt
-            if retry_level_to_attempt == 1:
-                self.files_for_retry_level_1.discard(current_file_path)
-            elif retry_level_to_attempt == 2:
-                self.files_for_retry_level_2.discard(current_file_path)
-
-            if self.cancel_requested:
-                self.log_message("Batch cancelled during conversion of a file.", "INFO")
-                self.master.after(
-                    0,
-                    lambda: self.conversion_status.set(
-                        "Status: Batch cancelled during conversion."
-                    ),
-                )
-                break  # Exit the loop immediately
-
-            try:
-                actual_index_in_live_queue = self.file_queue.index(current_file_path)
-                self.master.after(
-                    0,
-                    lambda idx=actual_index_in_live_queue: self.queue_listbox.delete(
-                        idx
-                    ),
-                )
-                self.file_queue.pop(actual_index_in_live_queue)
-            except ValueError:
-                self.log_message(
-                    f"Warning: {current_file_name} not found in live queue for removal after processing.",
-                    "WARN",
-                )
-                # print(
-                #     f"Warning: {current_file_name} not found in live queue for removal after processing."
-                # )
-
-            if not conversion_result:
-                self.master.after(
-                    0,
-                    lambda path=current_file_path, err=result_payload: (
-                        self.failed_files_data.append((path, err)),
-                        self.failed_listbox.insert(tk.END, os.path.basename(path)),
-                    ),
-                )
-                # Error message now shown by convert_file's return or here directly
-                # self.master.after(0, lambda: messagebox.showerror("Conversion Failed", f"Failed to convert: {current_file_name}. Moved to Failed List. Error: {result_payload}"))
-
-            files_processed_in_batch += 1
-            self.master.after(
-                0,
-                lambda fp=files_processed_in_batch,
-                tb=total_files_in_batch: self.overall_progress_bar.config(
-                    value=(fp / tb) * 100 if tb > 0 else 0
-                ),
-            )
-            self.master.after(0, self.update_status_with_queue_count)
-
-            # Post-conversion processing (verification and potential deletion)
-            if conversion_result:  # True if successful
-                output_file_path = (
-                    result_payload  # This is the output_file_path from convert_file
-                )
-                current_file_path_normalized = os.path.normpath(current_file_path)
-
-                verified = False
-                if os.path.exists(output_file_path):
-                    try:
-                        if (
-                            os.path.getsize(output_file_path)
-                            > 10 * 1024 * 1024  # Verify: size > 10MB
-                        ):
-                            verified = True
-                            self.log_message(
-                                f"Successfully converted and verified: {output_file_path}",
-                                "INFO",
-                            )
-                            # print(
-                            #     f"Successfully converted and verified: {output_file_path}"
-                            # )
-                        else:
-                            self.log_message(
-                                f"Verification FAILED for {output_file_path}: File size too small ({os.path.getsize(output_file_path)} bytes).",
-                                "WARN",
-                            )
-                            # print(
-                            #     f"Verification FAILED for {output_file_path}: File size too small ({os.path.getsize(output_file_path)} bytes)."
-                            # )
-                            self.master.after(
-                                0,
-                                lambda op=output_file_path: self.conversion_status.set(
-                                    f"Status: Verified {os.path.basename(op)} - FAILED (size)."
-                                ),
-                            )
-                    except OSError as e:
-                        self.log_message(
-                            f"Error getting size for {output_file_path}: {e}",
-                            "ERROR",
-                        )
-                        # print(f"Error getting size for {output_file_path}: {e}")
-                        self.master.after(
-                            0,
-                            lambda op=output_file_path: self.conversion_status.set(
-                                f"Status: Error verifying {os.path.basename(op)}."
-                            ),
-                        )
-                else:
-                    self.log_message(
-                        f"Verification FAILED for {output_file_path}: Output file does not exist.",
-                        "WARN",
-                    )
-                    # print(
-                    #     f"Verification FAILED for {output_file_path}: Output file does not exist."
-                    # )
-                    self.master.after(
-                        0,
-                        lambda op=output_file_path
-                        if output_file_path
-                        else "unknown output": self.conversion_status.set(
-                            f"Status: Verified {os.path.basename(op) if output_file_path else 'unknown'} - FAILED (missing)."
-                        ),
-                    )
-
-                if verified and self.auto_delete_verified_originals.get():
-                    try:
-                        self.log_message(
-                            f"Attempting to delete original file: {current_file_path_normalized}",
-                            "INFO",
-                        )
-                        os.remove(
-                            current_file_path_normalized
-                        )  # Use normalized path for consistency
-                        self.log_message(
-                            f"Successfully deleted original file: {current_file_path_normalized}",
-                            "INFO",
-                        )
-                        self.master.after(
-                            0,
-                            lambda orig=current_file_path_normalized: self.conversion_status.set(
-                                f"Status: Deleted original {os.path.basename(orig)}."
-                            ),
-                        )
-                    except OSError as e:
-                        self.log_message(
-                            f"Error deleting original file {current_file_path_normalized}: {e}",
-                            "ERROR",
-                        )
-                        # print(
-                        #     f"Error deleting original file {current_file_path_normalized}: {e}"
-                        # )
-                        messagebox.showerror(
-                            "Deletion Error",
-                            f"Could not delete original file: {current_file_path_normalized}\nError: {e}",
-                        )
-                        self.master.after(
-                            0,
-                            lambda orig=current_file_path_normalized: self.conversion_status.set(
-                                f"Status: Error deleting {os.path.basename(orig)}."
-                            ),
-                        )
-                elif verified and not self.auto_delete_verified_originals.get():
-                    self.log_message(
-                        f"Original file not deleted (auto-delete is off): {current_file_path_normalized}",
-                        "INFO",
-                    )
-                    self.master.after(
-                        0,
-                        lambda: self.conversion_status.set(
-                            "Status: Original not deleted (auto-delete off)."
-                        ),
-                    )
-                elif not verified:
-                    self.log_message(
-                        f"Original file not deleted (verification failed): {current_file_path_normalized}",
-                        "WARN",
-                    )
-
-        self.is_converting = False
-        self.current_ffmpeg_process = None  # Clear process reference
-        self.master.after(0, lambda: self.toggle_ui_state(True))
-        final_failed_count = len(self.failed_files_data)
-        newly_failed_count = final_failed_count - initial_failed_count
-
-        if self.cancel_requested:
-            summary_message = "Batch conversion cancelled."
-            if self.file_queue:
-                summary_message += (
-                    f"\n{len(self.file_queue)} file(s) remaining in queue."
-                )
-        else:
-            summary_message = f"Batch processing finished.\nSuccessfully converted: {files_processed_in_batch - newly_failed_count}/{total_files_in_batch}\nFailed this run: {newly_failed_count}"
-            if self.file_queue:
-                summary_message += f"\nRemaining in queue: {len(self.file_queue)}"
-            if self.failed_files_data:
-                summary_message += (
-                    f"\nTotal in failed list: {len(self.failed_files_data)}"
-                )
+    def _on_batch_started(self):
+        self.toggle_ui_state(False)
+        self.overall_progress_bar["value"] = 0
 
-        self.master.after(
-            0,
-            lambda: self.conversion_status.set("Status: Batch finished. Check summary.")
-            if not self.cancel_requested
-            else None,
-        )
-        self.master.after(
-            0, self.individual_progress_status.set, "Individual File Progress: N/A"
+    def _on_batch_progress(self, processed_files, total_files):
+        self.overall_progress_bar.config(
+            value=(processed_files / total_files) * 100 if total_files > 0 else 0
         )
-        self.log_message(
-            summary_message.replace("\\n", " | "), "INFO"
-        )  # Log the summary
-        self.master.after(
-            0, lambda: self.show_timed_messagebox("Batch Status", summary_message, 5000)
+        self.update_status_with_queue_count()
+
+    def _on_batch_finished(self, summary_message):
+        self.toggle_ui_state(True)
+        self.individual_progress_status.set("Active Conversions: N/A")
+        self.show_timed_messagebox("Batch Status", summary_message, 5000)
+
+    def _mark_queue_entry_active(self, job_id):
+        self.queue_view.set_background(job_id, "#d8e8ff")
+        self.queue_view.see(job_id)
+
+    def _mark_queue_entry_idle(self, job_id):
+        self.queue_view.set_background(job_id, None)
+
+    def _add_job_progress_row(self, job):
+        if job.job_id not in self.engine.active_jobs:
+            return  # Job already finished before the UI got to it
+        progress_row = JobProgressRow(self.active_jobs_frame, self, job)
+        if job.is_paused:
+            progress_row.set_paused(True)
+        self.job_rows[job.job_id] = progress_row
+        self.update_active_jobs_header()
+
+    def _remove_job_progress_row(self, job):
+        progress_row = self.job_rows.pop(job.job_id, None)
+        if progress_row:
+            progress_row.destroy()
+        self.update_active_jobs_header()
+
+    def update_active_jobs_header(self):
+        if not self.engine.is_converting:
+            self.individual_progress_status.set("Active Conversions: N/A")
+            return
+        with self.engine.job_lock:
+            active_count = len(self.engine.active_jobs)
+        self.individual_progress_status.set(
+            f"Active Conversions: {active_count} running"
         )
 
+    def _apply_job_progress(self, job, value, text):
+        progress_row = self.job_rows.get(job.job_id)
+        if progress_row:
+            progress_row.set_progress(value, text)
+
+    def _apply_job_paused(self, job, paused):
+        progress_row = self.job_rows.get(job.job_id)
+        if progress_row:
+            progress_row.set_paused(paused)
+            if paused:
+                progress_row.status_text.set(f"{job.display_name} (Paused)")
+            else:
+                progress_row.status_text.set(f"{job.display_name}: Resuming...")
+
     def show_timed_messagebox(self, title, message, duration_ms):
         timed_msg_window = tk.Toplevel(self.master)
         timed_msg_window.title(title)
@@ -1101,876 +1424,102 @@ class ConverterApp:
         except tk.TclError:
             pass  # Window already destroyed
 
-    def convert_file(self, input_mkv, retry_level=0):
-        """Converts a single file. Returns (True, output_path) on success, (False, error_message) on failure."""
-        if not self.ffmpeg_exec_path:
-            return False, "FFmpeg path is not set."
-        if self.cancel_requested:  # Check at the very start of conversion attempt
-            return False, "Conversion cancelled by user."
-
-        # Step 1: Get video duration using ffprobe (part of FFmpeg)
-        duration_seconds = 0
-        try:
-            ffprobe_cmd = [
-                self.ffmpeg_exec_path.replace(
-                    "ffmpeg", "ffprobe"
-                ),  # Basic replacement, might need smarter logic if paths are complex
-                "-v",
-                "error",
-                "-show_entries",
-                "format=duration",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                input_mkv,
-            ]
-            if os.name == "nt" and not self.ffmpeg_exec_path.endswith(".exe"):
-                # if ffmpeg_exec_path is just "ffmpeg" on windows, ffprobe_cmd should be "ffprobe"
-                if self.ffmpeg_exec_path == "ffmpeg":
-                    ffprobe_cmd[0] = "ffprobe"
-                else:
-                    ffprobe_cmd[0] = (
-                        self.ffmpeg_exec_path.replace("ffmpeg", "ffprobe") + ".exe"
-                    )
-            elif self.ffmpeg_exec_path.endswith(".exe"):
-                ffprobe_cmd[0] = self.ffmpeg_exec_path.replace(
-                    "ffmpeg.exe", "ffprobe.exe"
-                )
-
-            self.master.after(
-                0,
-                self.individual_progress_status.set,
-                f"Individual File Progress: Getting duration for {os.path.basename(input_mkv)}...",
-            )
-            duration_process = subprocess.run(
-                ffprobe_cmd,
-                capture_output=True,
-                text=True,
-                check=True,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
-            )
-            duration_seconds = float(duration_process.stdout.strip())
-            if duration_seconds <= 0:
-                self.log_message(
-                    f"Warning: Could not determine valid duration for {input_mkv}. Individual progress may be inaccurate.",
-                    "WARN",
-                )
-                # print(
-                #     f"Warning: Could not determine valid duration for {input_mkv}. Individual progress may be inaccurate."
-                # )
-                duration_seconds = (
-                    0  # Will make progress jump to 100 quickly or stay at 0
-                )
-        except Exception as e:
-            self.log_message(
-                f"Error getting duration for {input_mkv}: {e}. Individual progress may be inaccurate.",
-                "ERROR",
-            )
-            # print(
-            #     f"Error getting duration for {input_mkv}: {e}. Individual progress may be inaccurate."
-            # )
-            # Proceed without duration, progress will be indeterminate or jumpy for this file
-            duration_seconds = 0
-
-        try:
-            output_format_selected = self.output_format.get()
-            output_file_base = os.path.splitext(input_mkv)[0]
-            output_file_path = ""
-            ffmpeg_cmd = [self.ffmpeg_exec_path]
-
-            # Input related flags that can help with problematic files (especially for retries)
-            if retry_level > 0:
-                ffmpeg_cmd.extend(
-                    ["-analyzeduration", "20M", "-probesize", "20M"]
-                )  # Increased values for retries
-            ffmpeg_cmd.extend(["-i", input_mkv])
-
-            error_prefix = ""
-            current_file_label_suffix = ""
-
-            if retry_level == 1:
-                file_suffix = "_retry1"
-                error_prefix = "(Retry Level 1) "
-                current_file_label_suffix = " (Level 1)"
-            elif retry_level == 2:
-                file_suffix = "_retry2"
-                error_prefix = "(Retry Level 2) "
-                current_file_label_suffix = " (Level 2)"
-            else:  # Standard (retry_level == 0)
-                file_suffix = ""  # No suffix, just change extension
-
-            if output_format_selected == "MP4 (H.264 + AAC)":
-                output_file_path = f"{output_file_base}{file_suffix}.mp4"
-
-                if self.use_gpu_acceleration.get():
-                    self.log_message(
-                        f"Using GPU acceleration (h264_nvenc) for {input_mkv}", "INFO"
-                    )
-                    # NVENC specific settings
-                    common_nvenc_settings = [
-                        "-c:v",
-                        "h264_nvenc",
-                        "-pix_fmt",
-                        "yuv420p",
-                    ]
-
-                    if retry_level == 1:  # Level 1 Recovery (Balanced) with GPU
-                        ffmpeg_cmd.extend(common_nvenc_settings)
-                        ffmpeg_cmd.extend(
-                            [
-                                "-preset",
-                                "p4",  # NVENC medium preset
-                                "-cq",
-                                "25",  # NVENC Constant Quality
-                                "-c:a",
-                                "aac",
-                                "-b:a",
-                                "128k",
-                                "-err_detect",
-                                "ignore_err",
-                                "-fflags",
-                                "+genpts+discardcorrupt",
-                                "-y",
-                                output_file_path,
-                            ]
-                        )
-                    elif retry_level == 2:  # Level 2 Recovery (Lax) with GPU
-                        ffmpeg_cmd.extend(common_nvenc_settings)
-                        ffmpeg_cmd.extend(
-                            [
-                                "-preset",
-                                "p1",  # NVENC fastest preset
-                                "-cq",
-                                "28",
-                                "-c:a",
-                                "aac",
-                                "-b:a",
-                                "96k",
-                                "-err_detect",
-                                "ignore_err",
-                                "-fflags",
-                                "+genpts+discardcorrupt",
-                                "-y",
-                                output_file_path,
-                            ]
-                        )
-                    else:  # Standard (Level 0) MP4 conversion with GPU
-                        ffmpeg_cmd.extend(common_nvenc_settings)
-                        ffmpeg_cmd.extend(
-                            [
-                                "-preset",
-                                "p5",  # NVENC good quality preset
-                                "-cq",
-                                "23",
-                                "-c:a",
-                                "aac",
-                                "-b:a",
-                                "192k",
-                                "-y",
-                                output_file_path,
-                            ]
-                        )
-                else:  # CPU-based libx264 commands (existing logic)
-                    self.log_message(f"Using CPU (libx264) for {input_mkv}", "INFO")
-                    if retry_level == 1:  # Level 1 Recovery (Balanced)
-                        ffmpeg_cmd.extend(
-                            [
-                                "-c:v",
-                                "libx264",
-                                "-profile:v",
-                                "main",
-                                "-preset",
-                                "medium",
-                                "-crf",
-                                "23",
-                                "-pix_fmt",
-                                "yuv420p",
-                                "-c:a",
-                                "aac",
-                                "-b:a",
-                                "128k",
-                                "-err_detect",
-                                "ignore_err",
-                                "-fflags",
-                                "+genpts+discardcorrupt",
-                                "-y",
-                                output_file_path,
-                            ]
-                        )
-                    elif retry_level == 2:  # Level 2 Recovery (Lax)
-                        ffmpeg_cmd.extend(
-                            [
-                                "-c:v",
-                                "libx264",
-                                "-profile:v",
-                                "baseline",
-                                "-preset",
-                                "ultrafast",
-                                "-crf",
-                                "28",
-                                "-pix_fmt",
-                                "yuv420p",
-                                "-c:a",
-                                "aac",
-                                "-b:a",
-                                "96k",
-                                "-err_detect",
-                                "ignore_err",
-                                "-fflags",
-                                "+genpts+discardcorrupt",
-                                "-y",
-                                output_file_path,
-                            ]
-                        )
-                    else:  # Standard (Level 0) MP4 conversion - H.264 High Profile, but not PS5 specific level
-                        ffmpeg_cmd.extend(
-                            [
-                                "-c:v",
-                                "libx264",
-                                "-profile:v",
-                                "high",
-                                "-c:a",
-                                "aac",
-                                "-b:a",
-                                "192k",
-                                "-y",
-                                output_file_path,
-                            ]
-                        )
-            else:
-                return (
-                    False,
-                    f"{error_prefix}Invalid output format selected or no format handler for '{output_format_selected}'.",
-                )
-
-            current_file_display_name = (
-                os.path.basename(input_mkv) + current_file_label_suffix
-            )
-
-            self.master.after(
-                0,
-                self.individual_progress_status.set,
-                f"Individual File Progress: Converting {current_file_display_name}...",
-            )
-            self.current_ffmpeg_process = subprocess.Popen(
-                ffmpeg_cmd,
-                stdin=subprocess.PIPE,  # For sending pause/resume commands
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
+    def toggle_job_pause(self, job_id):
+        with self.engine.job_lock:
+            job = self.engine.active_jobs.get(job_id)
+        if job and not self.engine.toggle_job_pause(job_id):
+            messagebox.showwarning(
+                "Pause Info",
+                f"Could not pause {job.display_name}. See the Logs tab for details.",
             )
 
-            time_regex = re.compile(r"time=(\d{2}):(\d{2}):(\d{2})\.(\d{2})")
-            error_output_lines = []
-
-            while True:
-                if self.cancel_requested:
-                    self.log_message(
-                        f"Cancellation requested during active conversion of {input_mkv}.",
-                        "INFO",
-                    )
-                    if self.current_ffmpeg_process:
-                        try:
-                            if (
-                                self.current_ffmpeg_process.poll() is None
-                            ):  # If still running
-                                self.log_message(
-                                    f"Terminating FFmpeg process {self.current_ffmpeg_process.pid} due to cancellation.",
-                                    "INFO",
-                                )
-                                self.current_ffmpeg_process.terminate()
-                                self.current_ffmpeg_process.wait(
-                                    timeout=1
-                                )  # Short wait for terminate
-                                if (
-                                    self.current_ffmpeg_process.poll() is None
-                                ):  # Still running?
-                                    self.log_message(
-                                        f"FFmpeg process {self.current_ffmpeg_process.pid} did not terminate, killing.",
-                                        "WARN",
-                                    )
-                                    self.current_ffmpeg_process.kill()
-                                    self.current_ffmpeg_process.wait(
-                                        timeout=1
-                                    )  # Short wait for kill
-                        except OSError as e:
-                            self.log_message(
-                                f"OSError while terminating/killing FFmpeg on cancel: {e}",
-                                "ERROR",
-                            )
-                        except Exception as e:  # Catch any other potential errors
-                            self.log_message(
-                                f"Exception while terminating/killing FFmpeg on cancel: {e}",
-                                "ERROR",
-                            )
-                    self.current_ffmpeg_process = None
-                    if self.psutil_process:  # Clean up psutil process if it exists
-                        self.psutil_process = None
-                    # Clean up partially converted file if it exists
-                    if output_file_path and os.path.exists(output_file_path):
-                        try:
-                            os.remove(output_file_path)
-                            self.log_message(
-                                f"Deleted partially converted file on cancel: {output_file_path}",
-                                "INFO",
-                            )
-                        except OSError as e:
-                            self.log_message(
-                                f"Error deleting partial file {output_file_path} on cancel: {e}",
-                                "ERROR",
-                            )
-                    return False, "Conversion cancelled by user."
-
-                # This is the GUI-level pause check; psutil pause is handled by toggle_pause_resume
-                # but self.is_paused is set by it.
-                while self.is_paused:
-                    if (
-                        self.cancel_requested
-                    ):  # Re-check cancel during this inner pause loop
-                        self.log_message(
-                            f"Cancellation requested during pause for {input_mkv}.",
-                            "INFO",
-                        )
-                        if self.current_ffmpeg_process:
-                            try:
-                                if self.current_ffmpeg_process.poll() is None:
-                                    self.current_ffmpeg_process.terminate()
-                                    self.current_ffmpeg_process.wait(timeout=1)
-                                if self.current_ffmpeg_process.poll() is None:
-                                    self.current_ffmpeg_process.kill()
-                                    self.current_ffmpeg_process.wait(timeout=1)
-                            except Exception as e:
-                                self.log_message(
-                                    f"Exception during cancel-in-pause for FFmpeg: {e}",
-                                    "ERROR",
-                                )
-                        self.current_ffmpeg_process = None
-                        if self.psutil_process:
-                            self.psutil_process = None
-                        # Clean up partially converted file if it exists (also for cancel during pause)
-                        if output_file_path and os.path.exists(output_file_path):
-                            try:
-                                os.remove(output_file_path)
-                                self.log_message(
-                                    f"Deleted partially converted file on cancel (during pause): {output_file_path}",
-                                    "INFO",
-                                )
-                            except OSError as e:
-                                self.log_message(
-                                    f"Error deleting partial file {output_file_path} on cancel (during pause): {e}",
-                                    "ERROR",
-                                )
-                        return False, "Conversion cancelled during pause."
-                    time.sleep(0.1)
-
-                if self.current_ffmpeg_process and self.current_ffmpeg_process.stderr:
-                    line = self.current_ffmpeg_process.stderr.readline()
-                    if not line:
-                        break
-                    error_output_lines.append(line.strip())
-                    if duration_seconds > 0:
-                        match = time_regex.search(line)
-                        if match:
-                            hours, minutes, seconds, hundredths = map(
-                                int, match.groups()
-                            )
-                            current_time_seconds = (
-                                hours * 3600
-                                + minutes * 60
-                                + seconds
-                                + hundredths / 100.0
-                            )
-                            progress_percent = (
-                                current_time_seconds / duration_seconds
-                            ) * 100
-                            self.master.after(
-                                0,
-                                self.individual_progress_bar.config,
-                                {"value": min(progress_percent, 100)},
-                            )
-                            self.master.after(
-                                0,
-                                self.individual_progress_status.set,
-                                f"Individual File Progress: {current_file_display_name} ({min(progress_percent, 100):.1f}%)",
-                            )
-                else:
-                    break
-                if (
-                    self.current_ffmpeg_process
-                    and self.current_ffmpeg_process.poll() is not None
-                ):
-                    break
-                time.sleep(0.01)  # Prevent tight loop if stderr is quiet
-
-            if (
-                self.current_ffmpeg_process
-            ):  # Check if process exists before waiting/getting return code
-                return_code = self.current_ffmpeg_process.wait()
-                # Read any remaining stderr output
-                if self.current_ffmpeg_process.stderr:
-                    for line in self.current_ffmpeg_process.stderr.readlines():
-                        error_output_lines.append(line.strip())
-                self.current_ffmpeg_process = None  # Clear after it's done
-            elif (
-                self.cancel_requested
-            ):  # If cancelled, it might have been set to None already
-                return False, "Conversion cancelled."
-            else:  # Process was never started or lost for other reasons
-                return_code = (
-                    -1
-                )  # Indicate an abnormal termination if process is None without cancel
-
-            if return_code == 0:
-                self.master.after(
-                    0, self.individual_progress_bar.config, {"value": 100}
-                )
-                self.master.after(
-                    0,
-                    self.individual_progress_status.set,
-                    f"Individual File Progress: {current_file_display_name} (Completed)",
-                )
-                return True, output_file_path
-            else:
-                concise_error = (
-                    "\n".join(error_output_lines[-5:])
-                    if error_output_lines
-                    else "Unknown FFmpeg error"
-                )
-                self.master.after(0, self.individual_progress_bar.config, {"value": 0})
-                self.master.after(
-                    0,
-                    self.individual_progress_status.set,
-                    f"Individual File Progress: {current_file_display_name} (Failed)",
-                )
-                return (
-                    False,
-                    f"{error_prefix}FFmpeg failed (code {return_code}). Error: ...{concise_error}",
-                )
-
-        except Exception as e:
-            self.master.after(0, self.individual_progress_bar.config, {"value": 0})
-            current_file_display_name = (
-                os.path.basename(input_mkv) + current_file_label_suffix
-            )  # Ensure suffix for error message
-            self.master.after(
-                0,
-                self.individual_progress_status.set,
-                f"Individual File Progress: {current_file_display_name} (Error)",
-            )
-            return False, f"{error_prefix}Exception during conversion: {str(e)}"
-        finally:
-            if self.current_ffmpeg_process:  # Ensure Popen process is cleaned up
-                try:
-                    if (
-                        self.current_ffmpeg_process.poll() is None
-                    ):  # Check if still running
-                        self.log_message(
-                            f"Terminating Popen process {self.current_ffmpeg_process.pid} in finally block for {input_mkv}",
-                            "DEBUG",
-                        )
-                        self.current_ffmpeg_process.terminate()
-                        self.current_ffmpeg_process.wait(timeout=2)  # Brief wait
-                except OSError as e:
-                    self.log_message(
-                        f"Error in finally terminating Popen for {input_mkv}: {e}",
-                        "ERROR",
-                    )
-                    # print(f"Error in finally terminating Popen: {e}")
-                except subprocess.TimeoutExpired:
-                    self.log_message(
-                        f"Timeout in finally terminating Popen for {input_mkv}, trying kill.",
-                        "WARN",
-                    )
-                    # print("Timeout in finally terminating Popen, trying kill.")
-                    try:
-                        self.current_ffmpeg_process.kill()
-                        self.log_message(
-                            f"Killed Popen process {self.current_ffmpeg_process.pid} for {input_mkv}",
-                            "DEBUG",
-                        )
-                    except OSError as e:
-                        self.log_message(
-                            f"Error in finally killing Popen for {input_mkv}: {e}",
-                            "ERROR",
-                        )
-                        # print(f"Error in finally killing Popen: {e}")
-                except Exception as e:  # Catch any other psutil/subprocess issues
-                    self.log_message(
-                        f"Generic error in Popen cleanup for {input_mkv}: {e}", "ERROR"
-                    )
-                    # print(f"Generic error in Popen cleanup: {e}")
-                self.current_ffmpeg_process = None
-                if self.psutil_process:  # Ensure psutil reference is also cleared
-                    try:
-                        # Check if the process still exists and is suspended, try to resume it
-                        # This is a best-effort cleanup, primarily for the *next* file if not batch cancelling
-                        if (
-                            self.psutil_process.is_running()
-                            and self.psutil_process.status() == psutil.STATUS_STOPPED
-                        ):
-                            self.log_message(
-                                f"Found suspended psutil process {self.psutil_process.pid} in convert_file finally for {input_mkv}, attempting resume.",
-                                "DEBUG",
-                            )
-                            # print(
-                            #     f"Found suspended process {self.psutil_process.pid} in convert_file finally, attempting resume."
-                            # )
-                            self.psutil_process.resume()
-                    except psutil.NoSuchProcess:
-                        self.log_message(
-                            f"psutil.NoSuchProcess for {self.psutil_process.pid if self.psutil_process else 'unknown'} in convert_file finally for {input_mkv}.",
-                            "DEBUG",
-                        )
-                        pass  # Process already gone
-                    except Exception as e:
-                        self.log_message(
-                            f"Error handling psutil_process in convert_file finally for {input_mkv}: {e}",
-                            "ERROR",
-                        )
-                        # print(f"Error handling psutil_process in convert_file finally: {e}")
-                self.psutil_process = None
+    def cancel_job(self, job_id):
+        with self.engine.job_lock:
+            job = self.engine.active_jobs.get(job_id)
+        if not job:
+            return
+        if not messagebox.askyesno(
+            "Cancel File",
+            f"Cancel the conversion of {job.display_name}?\nThe file will stay in the queue.",
+        ):
+            return
+        if not self.engine.cancel_job(job_id):
+            return  # Finished while the dialog was open
+        progress_row = self.job_rows.get(job_id)
+        if progress_row:
+            progress_row.disable_controls()
+            progress_row.status_text.set(f"{job.display_name}: Cancelling...")
 
     def toggle_pause_resume(self):
-        if not self.is_converting:
+        if not self.engine.is_converting:
             messagebox.showinfo(
                 "Not Converting",
                 "No conversion is currently running to pause or resume.",
             )
             return
 
-        if not self.is_paused:  # Attempting to PAUSE
-            if self.current_ffmpeg_process and self.current_ffmpeg_process.pid:
-                try:
-                    if (
-                        not self.psutil_process
-                    ):  # Create if it doesn't exist or was cleared
-                        self.psutil_process = psutil.Process(
-                            self.current_ffmpeg_process.pid
-                        )
-
-                    if (
-                        self.psutil_process.status() == psutil.STATUS_RUNNING
-                        or self.psutil_process.status() == psutil.STATUS_SLEEPING
-                    ):
-                        self.psutil_process.suspend()
-                        self.is_paused = True
-                        self.pause_resume_button.config(text="Resume")
-                        self.conversion_status.set(
-                            f"Status: PAUSED (FFmpeg process suspended) | {self.conversion_status.get().split('|')[-1].strip() if '|' in self.conversion_status.get() else ''}"
-                        )
-                        current_individual_text = self.individual_progress_status.get()
-                        if not any(
-                            term in current_individual_text
-                            for term in [
-                                "N/A",
-                                "Completed",
-                                "Failed",
-                                "Error",
-                                "PAUSED",
-                            ]
-                        ):
-                            self.master.after(
-                                0,
-                                self.individual_progress_status.set,
-                                f"{current_individual_text.split(' (')[0].strip()} (Paused)",
-                            )
-                        elif "N/A" in current_individual_text:
-                            self.master.after(
-                                0,
-                                self.individual_progress_status.set,
-                                "Individual File Progress: PAUSED",
-                            )
-                        self.log_message(
-                            f"FFmpeg process {self.current_ffmpeg_process.pid} suspended.",
-                            "INFO",
-                        )
-                        # print(
-                        #     f"FFmpeg process {self.current_ffmpeg_process.pid} suspended."
-                        # )
-                    else:
-                        messagebox.showwarning(
-                            "Pause Info",
-                            f"FFmpeg process is not in a running/suspendable state ({self.psutil_process.status()}).",
-                        )
-                except psutil.NoSuchProcess:
-                    messagebox.showerror(
-                        "Pause Error",
-                        "FFmpeg process not found. It might have finished or crashed.",
-                    )
-                    self.current_ffmpeg_process = None
-                    self.psutil_process = None
-                    self.is_converting = (
-                        False  # If process is gone, not converting anymore
-                    )
-                    self.toggle_ui_state(True)
-                except Exception as e:
-                    messagebox.showerror(
-                        "Pause Error", f"Could not suspend FFmpeg process: {e}"
-                    )
-                    self.log_message(f"Error suspending process: {e}", "ERROR")
-                    # print(f"Error suspending process: {e}")
-            else:
-                messagebox.showwarning(
-                    "Pause Info", "No active FFmpeg process to pause."
-                )
+        status_suffix = (
+            self.conversion_status.get().split("|")[-1].strip()
+            if "|" in self.conversion_status.get()
+            else ""
+        )
+        if not self.engine.is_paused:  # Attempting to PAUSE
+            suspended_count = self.engine.pause_batch()
+            self.pause_resume_button.config(text="Resume")
+            self.conversion_status.set(
+                f"Status: PAUSED ({suspended_count} FFmpeg process(es) suspended) | {status_suffix}"
+            )
         else:  # Attempting to RESUME
-            if self.psutil_process:
-                try:
-                    if (
-                        self.psutil_process.status() == psutil.STATUS_STOPPED
-                    ):  # STATUS_STOPPED is what psutil uses for suspended
-                        self.psutil_process.resume()
-                        self.is_paused = False
-                        self.pause_resume_button.config(text="Pause")
-                        self.conversion_status.set(
-                            f"Status: Resuming conversion... | {self.conversion_status.get().split('|')[-1].strip() if '|' in self.conversion_status.get() else ''}"
-                        )
-                        current_individual_text = self.individual_progress_status.get()
-                        if "(Paused)" in current_individual_text:
-                            self.master.after(
-                                0,
-                                self.individual_progress_status.set,
-                                current_individual_text.replace("(Paused)", "").strip(),
-                            )
-                        elif (
-                            "Individual File Progress: PAUSED"
-                            == current_individual_text
-                        ):
-                            self.master.after(
-                                0,
-                                self.individual_progress_status.set,
-                                "Individual File Progress: Resuming...",
-                            )
-                        self.log_message(
-                            f"FFmpeg process {self.psutil_process.pid} resumed.", "INFO"
-                        )
-                        # print(f"FFmpeg process {self.psutil_process.pid} resumed.")
-                    else:
-                        messagebox.showwarning(
-                            "Resume Info",
-                            f"FFmpeg process is not in a suspended state ({self.psutil_process.status()}). Already resumed or finished?",
-                        )
-                        self.is_paused = False  # Assume it's not paused anymore
-                        self.pause_resume_button.config(text="Pause")
-                except psutil.NoSuchProcess:
-                    messagebox.showerror(
-                        "Resume Error",
-                        "FFmpeg process not found. It might have finished or crashed.",
-                    )
-                    self.current_ffmpeg_process = None
-                    self.psutil_process = None
-                    self.is_converting = False
-                    self.toggle_ui_state(True)
-                except Exception as e:
-                    messagebox.showerror(
-                        "Resume Error", f"Could not resume FFmpeg process: {e}"
-                    )
-                    self.log_message(f"Error resuming process: {e}", "ERROR")
-                    # print(f"Error resuming process: {e}")
-            else:
-                # If psutil_process is None, but we thought we were paused.
-                messagebox.showwarning(
-                    "Resume Info",
-                    "No FFmpeg process reference to resume. Forcing resume state.",
-                )
-                self.is_paused = False
-                self.pause_resume_button.config(text="Pause")
-                self.toggle_ui_state(False)  # Refresh UI based on is_converting
-
-        # The GUI update pausing in convert_file (while self.is_paused) is still a good secondary measure.
+            self.engine.resume_batch()
+            self.pause_resume_button.config(text="Pause")
+            self.conversion_status.set(
+                f"Status: Resuming conversion... | {status_suffix}"
+            )
 
     def cancel_batch_conversion(self):
-        if self.is_converting:
+        if self.engine.is_converting:
             response = messagebox.askyesno(
                 "Cancel Batch",
                 "Are you sure you want to cancel the current batch conversion?",
             )
             if response:
-                self.cancel_requested = True
-                if (
-                    self.is_paused and self.psutil_process
-                ):  # If paused by psutil, resume first
-                    try:
-                        if self.psutil_process.status() == psutil.STATUS_STOPPED:
-                            self.psutil_process.resume()
-                        self.log_message(
-                            "Resumed FFmpeg process before cancelling.", "INFO"
-                        )
-                        # print("Resumed FFmpeg process before cancelling.")
-                    except psutil.NoSuchProcess:
-                        self.log_message(
-                            "FFmpeg process for resume-before-cancel (batch) not found.",
-                            "WARN",
-                        )
-                        # print("FFmpeg process for resume-before-cancel not found.")
-                    except Exception as e:
-                        self.log_message(
-                            f"Error resuming FFmpeg before batch cancel: {e}", "ERROR"
-                        )
-                        # print(f"Error resuming FFmpeg before cancel: {e}")
-                self.is_paused = (
-                    False  # Ensure not stuck in a paused state for UI logic
-                )
-                # The convert_file loop will check cancel_requested and terminate the Popen process.
+                self.engine.cancel_batch()
+                for progress_row in self.job_rows.values():
+                    progress_row.disable_controls()
                 self.conversion_status.set("Status: Batch cancellation requested...")
                 self.pause_resume_button.config(state=tk.DISABLED, text="Pause")
                 self.cancel_button.config(state=tk.DISABLED)
-                # UI will be fully re-enabled by process_batch when it exits.
-                # self.psutil_process will be cleared when current_ffmpeg_process is cleared or in convert_file's finally block indirectly.
+                # UI will be fully re-enabled when the engine reports the batch finished.
         else:
             messagebox.showinfo(
                 "Not Converting", "No conversion is currently running to cancel."
             )
 
     def on_closing(self):
-        if self.is_converting:
+        if self.engine.is_converting:
             if messagebox.askyesno(
                 "Exit Confirmation",
                 "A conversion is in progress. Are you sure you want to exit? This will cancel the current batch.",
             ):
-                self.cancel_requested = True
-                self.is_monitoring_plex = False  # Stop monitoring thread as well
-
-                if (
-                    self.is_paused and self.psutil_process
-                ):  # If paused by psutil, resume first
-                    try:
-                        self.log_message(
-                            "Attempting to resume FFmpeg process before closing app.",
-                            "INFO",
-                        )
-                        # print("Attempting to resume FFmpeg process before closing...")
-                        if self.psutil_process.status() == psutil.STATUS_STOPPED:
-                            self.psutil_process.resume()
-                        self.log_message(
-                            "FFmpeg process resumed for closing app.", "INFO"
-                        )
-                        # print("FFmpeg process resumed for closing.")
-                    except psutil.NoSuchProcess:
-                        self.log_message(
-                            "FFmpeg process for resume-before-closing (app) not found.",
-                            "WARN",
-                        )
-                        # print("FFmpeg process for resume-before-closing not found.")
-                    except Exception as e:
-                        self.log_message(
-                            f"Error resuming FFmpeg before closing app: {e}", "ERROR"
-                        )
-                        # print(f"Error resuming FFmpeg before closing: {e}")
-                self.is_paused = False  # Ensure not stuck paused
-
-                if self.current_ffmpeg_process:  # This is the subprocess.Popen object
-                    try:
-                        self.log_message(
-                            f"Attempting to terminate FFmpeg process {self.current_ffmpeg_process.pid} on closing app.",
-                            "INFO",
-                        )
-                        # print("Attempting to terminate FFmpeg process on closing...")
-                        self.current_ffmpeg_process.terminate()  # Send SIGTERM
-                        self.current_ffmpeg_process.wait(
-                            timeout=5
-                        )  # Wait for it to die
-                        self.log_message(
-                            f"FFmpeg process {self.current_ffmpeg_process.pid} terminated or timed out on closing.",
-                            "INFO",
-                        )
-                        # print("FFmpeg process terminated or timed out.")
-                    except subprocess.TimeoutExpired:
-                        self.log_message(
-                            f"FFmpeg process {self.current_ffmpeg_process.pid} did not terminate in time, attempting to kill...",
-                            "WARN",
-                        )
-                        # print(
-                        #     "FFmpeg process did not terminate in time, attempting to kill..."
-                        # )
-                        self.current_ffmpeg_process.kill()  # Force kill if terminate fails
-                        self.current_ffmpeg_process.wait(timeout=2)
-                        self.log_message(
-                            f"FFmpeg process {self.current_ffmpeg_process.pid} kill attempt finished on closing.",
-                            "INFO",
-                        )
-                        # print("FFmpeg process kill attempt finished.")
-                    except OSError as e:
-                        self.log_message(
-                            f"Error terminating/killing FFmpeg process {self.current_ffmpeg_process.pid} on closing: {e}",
-                            "ERROR",
-                        )
-                        # print(f"Error terminating/killing FFmpeg process: {e}")
-                    finally:
-                        self.current_ffmpeg_process = None
-                        self.psutil_process = (
-                            None  # Clear psutil process reference as well
-                        )
-                else:  # If no Popen object, ensure psutil_process is also cleared
-                    self.psutil_process = None
-
-                if self.conversion_thread and self.conversion_thread.is_alive():
-                    self.log_message(
-                        "Waiting for conversion thread to join on closing app.", "INFO"
-                    )
-                    # print("Waiting for conversion thread to join...")
-                    self.conversion_thread.join(timeout=5)  # Wait for thread to finish
-                    if self.conversion_thread.is_alive():
-                        self.log_message(
-                            "Conversion thread did not join in time on closing app.",
-                            "WARN",
-                        )
-                        # print("Conversion thread did not join in time.")
-
-                if (
-                    self.plex_monitoring_thread
-                    and self.plex_monitoring_thread.is_alive()
-                ):
-                    self.log_message(
-                        "Waiting for Plex monitoring thread to join on closing app.",
-                        "INFO",
-                    )
-                    # print("Waiting for Plex monitoring thread to join...")
-                    self.plex_monitoring_thread.join(
-                        timeout=5
-                    )  # Wait for thread to finish
-                    if self.plex_monitoring_thread.is_alive():
-                        self.log_message(
-                            "Plex monitoring thread did not join in time on closing app.",
-                            "WARN",
-                        )
-                        # print("Plex monitoring thread did not join in time.")
-
+                self.engine.shutdown()
                 self.master.destroy()
-            else:
-                return  # Do not close if user cancels exit during conversion
+            # Otherwise do not close, the user cancelled exit during conversion
         else:
             if messagebox.askyesno(
                 "Exit", "Are you sure you want to exit the application?"
             ):
-                self.is_monitoring_plex = False  # Stop monitoring thread before exit
-                if (
-                    self.plex_monitoring_thread
-                    and self.plex_monitoring_thread.is_alive()
-                ):
-                    self.log_message(
-                        "Waiting for Plex monitoring thread to join on exit (no conversion).",
-                        "INFO",
-                    )
-                    # print("Waiting for Plex monitoring thread to join on exit...")
-                    self.plex_monitoring_thread.join(timeout=5)
-                    if self.plex_monitoring_thread.is_alive():
-                        self.log_message(
-                            "Plex monitoring thread did not join in time on exit (no conversion).",
-                            "WARN",
-                        )
-                        # print("Plex monitoring thread did not join in time on exit.")
+                self.engine.shutdown()
                 self.save_state()  # Save state before destroying
                 self.master.destroy()
 
     def select_plex_directory(self):
-        if self.is_converting:
+        if self.engine.is_converting:
             messagebox.showwarning(
                 "Busy", "Cannot change directory while conversion is in progress."
             )
             return
 
-        if self.is_monitoring_plex:
+        if self.engine.is_monitoring_plex:
             messagebox.showinfo(
                 "Plex Monitoring",
                 "Plex monitoring will be stopped to change the directory.",
@@ -1981,6 +1530,7 @@ class ConverterApp:
         directory_path = filedialog.askdirectory(title="Select Your Main Media Folder")
         if directory_path:
             self.plex_media_directory.set(directory_path)
+            self.engine.plex_media_directory = directory_path
             self.scan_plex_dir_button.config(
                 state=tk.NORMAL
             )  # Enable monitoring button
@@ -1988,282 +1538,63 @@ class ConverterApp:
                 f"Status: Media folder set to: {directory_path}. Ready to scan or monitor."
             )
         else:
-            # self.plex_media_directory.set("Not Set") # Keep old if cancelled, or clear
             if (
                 self.plex_media_directory.get() == "Not Set"
                 or not self.plex_media_directory.get()
             ):
                 self.scan_plex_dir_button.config(state=tk.DISABLED)
 
-    def scan_plex_directory_and_add(self, called_from_thread=False):
-        if (
-            self.is_converting and not called_from_thread
-        ):  # Allow scan if called from thread even if converting other files
-            messagebox.showwarning(
-                "Busy", "Cannot start scan while conversion is in progress."
-            )
-            return
-
-        target_dir_display = self.plex_media_directory.get()
-        # Get the actual path for os functions by removing the display suffix
-        actual_target_dir = target_dir_display.replace(
-            " (Monitoring Active)", ""
-        ).strip()
-
-        if (
-            not actual_target_dir
-            or actual_target_dir == "Not Set"
-            or not os.path.isdir(actual_target_dir)
-        ):
-            if not called_from_thread:
-                messagebox.showerror(
-                    "Error",
-                    f"Please select a valid media folder first. Path checked: '{actual_target_dir}'",
-                )
-            else:
-                self.log_message(
-                    f"Scan Plex Dir Error: Invalid or inaccessible media folder. Path checked: '{actual_target_dir}'",
-                    "ERROR",
-                )
-                # print(f"Scan Plex Dir Error: Invalid or inaccessible media folder. Path checked: '{actual_target_dir}'") # Log for thread
-            return
-
-        # Status update before scan is now handled by plex_monitoring_loop
-        # self.master.after(0, lambda: self.conversion_status.set(
-        # f"Status: Scanning {target_dir} for non-MP4 files..."
-        # ))
-        # if not called_from_thread:
-        # self.master.update_idletasks()
-
-        video_extensions_to_scan = (
-            ".mkv",
-            ".avi",
-            ".mov",
-            ".flv",
-            ".wmv",
-            ".mpeg",
-            ".mpg",
-            ".ts",
-            ".m2ts",
-        )
-        files_found_to_convert = []
-
-        for root, _, files in os.walk(
-            actual_target_dir
-        ):  # Use actual_target_dir for os.walk
-            for file in files:
-                file_path = os.path.join(root, file)
-                if file_path.lower().endswith(video_extensions_to_scan):
-                    # Check if an MP4 version already exists (same base name)
-                    base_name, _ = os.path.splitext(file_path)
-                    mp4_equivalent = base_name + ".mp4"
-                    mp4_retry1_equivalent = base_name + "_retry1.mp4"
-                    mp4_retry2_equivalent = base_name + "_retry2.mp4"
-
-                    if not (
-                        os.path.exists(mp4_equivalent)
-                        or os.path.exists(mp4_retry1_equivalent)
-                        or os.path.exists(mp4_retry2_equivalent)
-                    ):
-                        files_found_to_convert.append(file_path)
-                    else:
-                        self.log_message(
-                            f"Plex Scan: Skipping '{file_path}', MP4 version already exists.",
-                            "DEBUG",
-                        )
-                        # print(f"Skipping {file_path}, MP4 version already exists.")
-
-        added_to_queue_count = 0
-        if files_found_to_convert:
-            for file_path in files_found_to_convert:
-                if file_path not in self.file_queue and not any(
-                    fp == file_path for fp, _ in self.failed_files_data
-                ):
-                    self.file_queue.append(file_path)
-                    self.queue_listbox.insert(tk.END, os.path.basename(file_path))
-                    added_to_queue_count += 1
-
-            if added_to_queue_count > 0:
-                final_message = f"Plex Scan: Added {added_to_queue_count} file(s) to queue from {os.path.basename(actual_target_dir)}."
-                if not called_from_thread:
-                    messagebox.showinfo("Scan Complete", final_message)
-                    self.master.after(
-                        0,
-                        lambda: self.conversion_status.set(
-                            f"Status: {final_message} | Queue: {len(self.file_queue)} file(s)."
-                        ),
-                    )
-                else:
-                    self.log_message(final_message, "INFO")
-                    # print(final_message)  # Log for thread
-                    # Status update for "Next scan in..." will be set by the loop after this returns
-                self.master.after(0, self.update_status_with_queue_count)
-            else:
-                final_message = f"Plex Scan: No new files to add from {os.path.basename(actual_target_dir)}."
-                if not called_from_thread:
-                    messagebox.showinfo("Scan Complete", final_message)
-                    self.master.after(
-                        0,
-                        lambda: self.conversion_status.set(
-                            f"Status: {final_message} | Queue: {len(self.file_queue)} file(s)."
-                        ),
-                    )
-                else:
-                    self.log_message(final_message, "INFO")
-                    # print(final_message)  # Log for thread
-        else:  # files_found_to_convert was empty
-            final_message = f"Plex Scan: No non-MP4 files found in {os.path.basename(actual_target_dir)}."
-            if not called_from_thread:
-                messagebox.showinfo("Scan Complete", final_message)
-                self.master.after(
-                    0,
-                    lambda: self.conversion_status.set(
-                        f"Status: {final_message} | Queue: {len(self.file_queue)} file(s)."
-                    ),
-                )
-            else:
-                self.log_message(final_message, "INFO")
-                # print(final_message)  # Log for thread
-
-        # Auto-start conversion if enabled and files were added
-        if (
-            called_from_thread
-            and added_to_queue_count > 0
-            and self.auto_start_plex_conversions.get()
-        ):
-            self.log_message(
-                f"Plex Scan: {added_to_queue_count} file(s) added. Auto-starting conversion.",
-                "INFO",
-            )
-            # Ensure this runs on the main thread and doesn't interfere if already converting
-            self.master.after(0, self._check_and_start_conversion_after_scan)
-
-    def _check_and_start_conversion_after_scan(self):
-        if not self.is_converting and self.file_queue:
-            self.log_message("Auto-starting batch conversion from Plex scan.", "INFO")
-            self.start_conversion_thread()
-        elif self.is_converting:
-            self.log_message(
-                "Auto-start skipped: Conversion already in progress.", "INFO"
-            )
-        elif not self.file_queue:
-            self.log_message(
-                "Auto-start skipped: Queue is empty after Plex scan (unexpected).",
-                "WARN",
-            )
-
     def save_state(self):
-        state_data = {
-            "file_queue": self.file_queue,
-            "failed_files_data": self.failed_files_data,
-            "files_for_retry_level_1": list(self.files_for_retry_level_1),
-            "files_for_retry_level_2": list(self.files_for_retry_level_2),
-            "plex_media_directory": self.plex_media_directory.get(),
-            "auto_delete_verified_originals": self.auto_delete_verified_originals.get(),
-            "plex_scan_interval_minutes": self.plex_scan_interval_minutes_sv.get(),
-            "auto_start_plex_conversions": self.auto_start_plex_conversions.get(),
-            "use_gpu_acceleration": self.use_gpu_acceleration.get(),  # Save GPU setting
-        }
+        # Entries are only validated when used, so keep the engine's value if they are invalid
         try:
-            with open(self.STATE_FILE, "w") as f:
-                json.dump(state_data, f, indent=4)
-            self.log_message(f"Application state saved to {self.STATE_FILE}", "INFO")
-        except IOError as e:
-            self.log_message(
-                f"Error saving application state to {self.STATE_FILE}: {e}", "ERROR"
-            )
-        except Exception as e:
-            self.log_message(
-                f"An unexpected error occurred while saving state: {e}", "ERROR"
+            self.engine.plex_scan_interval_minutes = int(
+                self.plex_scan_interval_minutes_sv.get()
             )
+        except ValueError:
+            pass
+        self.engine.max_parallel_jobs = self.get_max_parallel_jobs()
+        self.engine.segment_parallel_jobs = self.get_segment_parallel_jobs()
+        self.engine.scratch_limit_gb = self.get_scratch_limit_gb()
+        self.engine.save_state()
 
     def load_state(self):
-        try:
-            if os.path.exists(self.STATE_FILE):
-                with open(self.STATE_FILE, "r") as f:
-                    state_data = json.load(f)
-
-                self.file_queue = state_data.get("file_queue", [])
-                self.failed_files_data = state_data.get("failed_files_data", [])
-                self.files_for_retry_level_1 = set(
-                    state_data.get("files_for_retry_level_1", [])
-                )
-                self.files_for_retry_level_2 = set(
-                    state_data.get("files_for_retry_level_2", [])
-                )
-
-                plex_dir = state_data.get("plex_media_directory", "Not Set")
-                # Ensure we don't load " (Monitoring Active)" into the actual variable if app was closed while monitoring
-                self.plex_media_directory.set(
-                    plex_dir.replace(" (Monitoring Active)", "").strip()
-                )
-                if (
-                    self.plex_media_directory.get()
-                    and self.plex_media_directory.get() != "Not Set"
-                    and os.path.isdir(self.plex_media_directory.get())
-                ):
-                    self.scan_plex_dir_button.config(state=tk.NORMAL)
-                else:
-                    self.plex_media_directory.set(
-                        "Not Set"
-                    )  # Ensure it's clean if loaded path is invalid
-                    self.scan_plex_dir_button.config(state=tk.DISABLED)
-
-                self.auto_delete_verified_originals.set(
-                    state_data.get("auto_delete_verified_originals", False)
-                )
-                self.plex_scan_interval_minutes_sv.set(
-                    state_data.get("plex_scan_interval_minutes", "10")
-                )
-                self.auto_start_plex_conversions.set(
-                    state_data.get("auto_start_plex_conversions", False)
-                )
-                self.use_gpu_acceleration.set(
-                    state_data.get(
-                        "use_gpu_acceleration", False
-                    )  # Load GPU setting, default to False
-                )
-
-                # Repopulate listboxes
-                self.queue_listbox.delete(0, tk.END)
-                for item in self.file_queue:
-                    # Determine if it's a retry item to display correctly
-                    display_name = os.path.basename(item)
-                    if item in self.files_for_retry_level_1:
-                        display_name += " (Level 1)"
-                    elif item in self.files_for_retry_level_2:
-                        display_name += " (Level 2)"
-                    self.queue_listbox.insert(tk.END, display_name)
-
-                self.failed_listbox.delete(0, tk.END)
-                for path, reason in self.failed_files_data:
-                    self.failed_listbox.insert(tk.END, os.path.basename(path))
-
-                self.update_status_with_queue_count()  # Update buttons and status
-                self.log_message(
-                    f"Application state loaded from {self.STATE_FILE}", "INFO"
-                )
-            else:
-                self.log_message("No previous application state file found.", "INFO")
-        except IOError as e:
-            self.log_message(
-                f"Error loading application state from {self.STATE_FILE}: {e}", "ERROR"
-            )
-            # Don't halt app, just start fresh
-        except json.JSONDecodeError as e:
-            self.log_message(
-                f"Error decoding state file {self.STATE_FILE}: {e}. Starting fresh.",
-                "ERROR",
-            )
-        except Exception as e:
-            self.log_message(
-                f"An unexpected error occurred while loading state: {e}. Starting fresh.",
-                "ERROR",
-            )
+        if not self.engine.load_state():
+            return
+        # Queue and failed listboxes are repopulated by the engine's reset events
+        if self.engine.plex_media_directory:
+            self.plex_media_directory.set(self.engine.plex_media_directory)
+            self.scan_plex_dir_button.config(state=tk.NORMAL)
+        else:
+            self.plex_media_directory.set(
+                "Not Set"
+            )  # Ensure it's clean if loaded path is invalid
+            self.scan_plex_dir_button.config(state=tk.DISABLED)
+        self.auto_delete_verified_originals.set(
+            self.engine.auto_delete_verified_originals
+        )
+        self.plex_scan_interval_minutes_sv.set(
+            str(self.engine.plex_scan_interval_minutes)
+        )
+        self.auto_start_plex_conversions.set(self.engine.auto_start_plex_conversions)
+        self.use_folder_watch.set(self.engine.use_folder_watch)
+        self.use_gpu_acceleration.set(self.engine.use_gpu_acceleration)
+        self.max_parallel_jobs_sv.set(str(self.engine.max_parallel_jobs))
+        self.scheduling_policy_label.set(SCHEDULING_POLICIES[self.engine.scheduling_policy])
+        self.segment_parallel_jobs_sv.set(str(self.engine.segment_parallel_jobs))
+        self.use_fast_remux.set(self.engine.use_fast_remux)
+        self.use_resumable_encoding.set(self.engine.use_resumable_encoding)
+        self.use_preflight_check.set(self.engine.use_preflight_check)
+        self.use_adaptive_concurrency.set(self.engine.use_adaptive_concurrency)
+        self.use_scratch_staging.set(self.engine.use_scratch_staging)
+        self.encoding_profile_sv.set(self.engine.encoding_profile or AUTOMATIC_PROFILE)
+        if self.engine.scratch_directory:
+            self.scratch_directory_sv.set(self.engine.scratch_directory)
+        self.scratch_limit_gb_sv.set(f"{self.engine.scratch_limit_gb:g}")
+        self.log_level.set(self.engine.log_level)
 
     def toggle_plex_monitoring(self):
         if (
-            self.is_converting and not self.is_monitoring_plex
+            self.engine.is_converting and not self.engine.is_monitoring_plex
         ):  # Allow stopping monitoring even if converting
             messagebox.showwarning(
                 "Busy",
@@ -2271,13 +1602,14 @@ class ConverterApp:
             )
             return
 
-        if self.is_monitoring_plex:
+        if self.engine.is_monitoring_plex:
             # Stop monitoring
-            self.is_monitoring_plex = False
+            self.engine.stop_monitoring()
             self.scan_plex_dir_button.config(text="Start Plex Monitoring")
             self.plex_interval_entry.config(
                 state=tk.NORMAL
             )  # Re-enable entry when stopping
+            self.folder_watch_checkbox.config(state=tk.NORMAL)
 
             current_plex_path = self.plex_media_directory.get()
             if current_plex_path.endswith(" (Monitoring Active)"):
@@ -2311,42 +1643,35 @@ class ConverterApp:
                     self.conversion_status.set,
                     f"Status: Plex monitoring stopped. {status_parts[-1].strip() if len(status_parts) > 1 else ''}",
                 )
-
-            self.log_message("Plex monitoring stopping...", "INFO")
-            # print("Plex monitoring stopping...")
-            if self.plex_monitoring_thread and self.plex_monitoring_thread.is_alive():
-                pass
         else:
             # Start monitoring
-            plex_dir = self.plex_media_directory.get()
-            if not plex_dir or plex_dir == "Not Set" or not os.path.isdir(plex_dir):
-                messagebox.showerror(
-                    "Error",
-                    "Please select a valid media folder before starting monitoring.",
-                )
-                return
-
             try:
                 interval_minutes_val = int(self.plex_scan_interval_minutes_sv.get())
-                if interval_minutes_val <= 0:
-                    messagebox.showerror(
-                        "Error", "Scan interval must be a positive number of minutes."
-                    )
-                    return
-                self.plex_scan_interval_seconds = interval_minutes_val * 60
             except ValueError:
                 messagebox.showerror(
                     "Error", "Invalid scan interval. Please enter a number."
                 )
                 return
+            plex_dir = self.plex_media_directory.get()
+            self.engine.plex_media_directory = (
+                plex_dir if plex_dir and plex_dir != "Not Set" else None
+            )
+            self.engine.plex_scan_interval_minutes = interval_minutes_val
+            try:
+                self.engine.start_monitoring()
+            except ValueError as e:  # No valid folder or interval
+                messagebox.showerror("Error", str(e))
+                return
 
-            self.is_monitoring_plex = True
             self.scan_plex_dir_button.config(
                 text="Stop Plex Monitoring", state=tk.NORMAL
             )
             self.plex_interval_entry.config(
                 state=tk.DISABLED
             )  # Disable entry when monitoring starts
+            self.folder_watch_checkbox.config(
+                state=tk.DISABLED
+            )  # The watch is set up when monitoring starts
 
             current_plex_path = self.plex_media_directory.get()
             if current_plex_path != "Not Set" and not current_plex_path.endswith(
@@ -2357,7 +1682,7 @@ class ConverterApp:
                 )
 
             # Clear previous "Next scan in..." message when starting
-            # Let the plex_monitoring_loop handle the new status
+            # Let the monitoring loop handle the new status
             base_status_parts = self.conversion_status.get().split("|")
             current_action_status = "Plex monitoring started."
             queue_info = (
@@ -2367,7 +1692,7 @@ class ConverterApp:
                     "Queue:" in base_status_parts[-1]
                     or "Files remaining:" in base_status_parts[-1]
                 )
-                else f"Queue: {len(self.file_queue)} file(s)."
+                else f"Queue: {self.engine.jobs.queued_count()} file(s)."
             )
             self.master.after(
                 0,
@@ -2375,100 +1700,6 @@ class ConverterApp:
                 f"Status: {current_action_status} | {queue_info}",
             )
 
-            if self.plex_monitoring_thread and self.plex_monitoring_thread.is_alive():
-                self.log_message(
-                    "Plex monitoring thread already active. Interval possibly updated.",
-                    "INFO",
-                )
-                # print("Monitoring thread already active. Interval possibly updated.")
-            else:
-                self.plex_monitoring_thread = threading.Thread(
-                    target=self.plex_monitoring_loop
-                )
-                self.plex_monitoring_thread.daemon = True
-                self.plex_monitoring_thread.start()
-                self.log_message("Plex monitoring thread started.", "INFO")
-                # print("Plex monitoring thread started.")
-
-    def plex_monitoring_loop(self):
-        self.log_message(
-            f"Plex monitoring loop started. Interval: {self.plex_scan_interval_seconds}s",
-            "INFO",
-        )
-        # print(f"Plex monitoring loop started. Interval: {self.plex_scan_interval_seconds}s")
-        # Initial short delay before first scan to allow UI to update
-        time.sleep(2)
-
-        while self.is_monitoring_plex:
-            current_scan_interval = (
-                self.plex_scan_interval_seconds
-            )  # Use the potentially updated value
-            if self.is_converting:
-                status_msg = "Plex scan paused (conversion active)."
-                self.log_message(status_msg, "DEBUG")
-                # print(status_msg)
-                self.master.after(
-                    0, lambda sm=status_msg: self.update_plex_monitoring_status(sm)
-                )
-                # Wait a shorter time if converting, then re-check
-                wait_interval = min(60, current_scan_interval)
-            elif (
-                not self.plex_media_directory.get()
-                or self.plex_media_directory.get() == "Not Set"
-            ):
-                status_msg = "Plex scan paused (directory not set)."
-                self.log_message(status_msg, "DEBUG")
-                # print(status_msg)
-                self.master.after(
-                    0, lambda sm=status_msg: self.update_plex_monitoring_status(sm)
-                )
-                wait_interval = min(60, current_scan_interval)
-            else:
-                scan_status_msg = f"Plex: Scanning {os.path.basename(self.plex_media_directory.get().replace(' (Monitoring Active)', ''))}..."  # Clean name for log
-                self.log_message(scan_status_msg, "INFO")
-                # print(scan_status_msg)
-                self.master.after(
-                    0, lambda sm=scan_status_msg: self.update_plex_monitoring_status(sm)
-                )
-                self.scan_plex_directory_and_add(called_from_thread=True)
-                # After scan, immediately start countdown for next scan
-                wait_interval = current_scan_interval
-
-            # Countdown loop for the wait_interval or until monitoring is stopped
-            for i in range(wait_interval):
-                if not self.is_monitoring_plex:
-                    break
-                remaining_time = wait_interval - i
-                minutes, seconds = divmod(remaining_time, 60)
-                countdown_msg = f"Plex: Next scan in {minutes}m {seconds}s."
-                # Log less frequently for countdown to avoid spamming logs
-                if (
-                    i % 30 == 0 or i == wait_interval - 1
-                ):  # Log every 30s or last second before new state
-                    self.log_message(
-                        f"Plex monitoring countdown: {remaining_time}s remaining.",
-                        "DEBUG",
-                    )
-
-                if self.is_converting:
-                    countdown_msg = f"Plex: Monitoring paused (conversion active). Next check in {minutes}m {seconds}s."
-                elif (
-                    not self.plex_media_directory.get()
-                    or self.plex_media_directory.get() == "Not Set"
-                ):
-                    countdown_msg = f"Plex: Monitoring paused (directory not set). Next check in {minutes}m {seconds}s."
-
-                self.master.after(
-                    0, lambda cm=countdown_msg: self.update_plex_monitoring_status(cm)
-                )
-                time.sleep(1)
-
-        self.log_message("Plex monitoring loop finished.", "INFO")
-        # print("Plex monitoring loop finished.")
-        self.master.after(
-            0, lambda: self.update_plex_monitoring_status("Plex monitoring stopped.")
-        )
-
     def update_plex_monitoring_status(self, plex_status_text):
         current_status = self.conversion_status.get()
         parts = current_status.split("|")
@@ -2485,7 +1716,7 @@ class ConverterApp:
                 parts[-1].strip()
                 if len(parts) > 1
                 and ("Queue:" in parts[-1] or "Files remaining:" in parts[-1])
-                else f"Queue: {len(self.file_queue)} file(s)."
+                else f"Queue: {self.engine.jobs.queued_count()} file(s)."
             )
             self.conversion_status.set(f"Status: {new_main_status} | {queue_info}")
         elif (
@@ -2519,7 +1750,7 @@ class ConverterApp:
                     parts[-1].strip()
                     if len(parts) > 1
                     and ("Queue:" in parts[-1] or "Files remaining:" in parts[-1])
-                    else f"Queue: {len(self.file_queue)} file(s)."
+                    else f"Queue: {self.engine.jobs.queued_count()} file(s)."
                 )
                 if main_action_status.startswith("Status:"):
                     main_action_status = main_action_status.replace(
@@ -2531,27 +1762,27 @@ class ConverterApp:
         else:  # General status update not specifically from Plex monitoring loop countdown
             # This case might not be hit often if plex_status_text is always specific
             self.conversion_status.set(
-                f"Status: {plex_status_text} | Queue: {len(self.file_queue)} file(s)."
+                f"Status: {plex_status_text} | Queue: {self.engine.jobs.queued_count()} file(s)."
             )
 
     def log_message(self, message, level="INFO"):
-        # Ensure UI updates happen on the main thread
-        self.master.after(0, self._do_log_message, message, level)
-
-    def _do_log_message(self, message, level):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_message = f"[{timestamp}] [{level.upper()}] {message}\n"
+        # Safe from any thread; the UI pump writes the line on the main thread
+        self.engine.log_message(message, level)
 
+    def _append_log_lines(self, log_lines):
         current_state = self.log_text_area.cget("state")
         self.log_text_area.config(state=tk.NORMAL)
-        self.log_text_area.insert(tk.END, formatted_message)
+        self.log_text_area.insert(tk.END, "".join(log_lines))
+        # Keep only the newest lines; the log file has the rest
+        line_count = int(self.log_text_area.index("end-1c").split(".")[0]) - 1
+        if line_count > MAX_LOG_VIEW_LINES:
+            self.log_text_area.delete(
+                "1.0", f"{line_count - MAX_LOG_VIEW_LINES + 1}.0"
+            )
         self.log_text_area.see(tk.END)  # Scroll to the end
         self.log_text_area.config(
             state=current_state
         )  # Restore original state (usually DISABLED)
-        # If starting disabled, we should enable, write, then disable.
-        if current_state == tk.DISABLED:
-            self.log_text_area.config(state=tk.DISABLED)
 
 
 if __name__ == "__main__":